@@ -1,10 +1,17 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
-from collections import Counter
 import time
-from contextlib import contextmanager
+import uuid
+from employia_formulaire import DIPLOMES_FORMULAIRE, PAUSE_SOUMISSION, get_all_competences, get_secteurs
+from employia_historique import JournalUtilisation
+from employia_analytique import AnalytiqueUtilisation
+from employia_archetypes import CacheArchetypes
+from employia_pagination import ClassementsPagines
+from employia_profilage import ProfilageMemoire, profilage_demande
+from employia_regions import PoolCatalogues, REGION_DEFAUT, charger_regions, preparer_matching
+from employia_matching import EmployiaMatching as EmployiaMatchingBase, creer_profil_utilisateur, manquantes_affichees
+from employia_scoring import TYPE_HARD, TYPE_OUTIL, TYPE_SOFT
 
 # ============================================
 # CONFIGURATION DE LA PAGE
@@ -19,169 +26,62 @@ st.set_page_config(
 # ============================================
 # FONCTIONS DE GESTION DE BASE DE DONNÉES
 # ============================================
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect("employia.db", check_same_thread=False)
-    try:
-        yield conn
-    finally:
-        conn.close()
+@st.cache_resource
+def get_analytique():
+    return AnalytiqueUtilisation("employia_historique.db")
 
-def get_secteurs():
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT nom FROM secteurs ORDER BY nom")
-        return [s[0] for s in cursor.fetchall()]
+@st.cache_resource
+def get_journal():
+    return JournalUtilisation("employia_historique.db", agregateurs=[get_analytique()])
 
-def get_all_competences():
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT nom, type FROM competences ORDER BY nom")
-        return cursor.fetchall()
+@st.cache_resource
+def get_profilage():
+    # Actif dès le lancement avec EMPLOYIA_PROFILAGE=1, ou depuis le panneau ?debug=memoire
+    return ProfilageMemoire(actif=profilage_demande())
 
 # ============================================
 # CLASSE DE MATCHING
 # ============================================
-class EmployiaMatching:
-    def __init__(self):
-        pass
+class EmployiaMatching(EmployiaMatchingBase):
+    TYPES_MANQUANTES = {TYPE_HARD: ('Technique', 'Haute'), TYPE_SOFT: ('Comportemental', 'Basse'),
+                        TYPE_OUTIL: ('Outil', 'Moyenne')}
     
-    def get_all_metiers_with_competences(self):
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT m.id, m.nom, m.secteur_id, s.nom as secteur_nom,
-                       m.diplome_minimum, m.demande_afrique, m.reconversion_facile
-                FROM metiers m
-                JOIN secteurs s ON m.secteur_id = s.id
-            """)
-            metiers = cursor.fetchall()
-            
-            metiers_complets = []
-            for m in metiers:
-                cursor.execute("""
-                    SELECT c.nom, c.type
-                    FROM competences c
-                    JOIN metier_competences mc ON c.id = mc.competence_id
-                    WHERE mc.metier_id = ?
-                """, (m[0],))
-                competences = cursor.fetchall()
-                
-                hard_skills = [c[0] for c in competences if c[1] == 'Hard Skill']
-                soft_skills = [c[0] for c in competences if c[1] == 'Soft Skill']
-                tools = [c[0] for c in competences if c[1] == 'Tools']
-                
-                metiers_complets.append({
-                    'id': m[0],
-                    'nom': m[1],
-                    'secteur': m[3],
-                    'diplome_minimum': m[4],
-                    'demande_afrique': m[5],
-                    'reconversion_facile': m[6],
-                    'hard_skills': hard_skills,
-                    'soft_skills': soft_skills,
-                    'tools': tools
-                })
-            
-            return metiers_complets
-    
-    def check_diplome_compatible(self, diplome_utilisateur, diplome_requis):
-        niveaux = {
-            'Bac': 2, 'BTS': 3, 'Licence': 4, 
-            'Master': 5, 'Doctorat': 6, 'Autre': 2
-        }
-        diplome_requis_min = diplome_requis.split(' / ')[0]
-        niveau_user = niveaux.get(diplome_utilisateur, 2)
-        niveau_requis = niveaux.get(diplome_requis_min, 2)
-        return 1 if niveau_user >= niveau_requis else 0
-    
-    def calculer_score_metier(self, utilisateur, metier):
-        competences_user = set(utilisateur.get('competences', []))
-        logiciels_user = set(utilisateur.get('logiciels', []))
-        
-        competences_metier = set(metier['hard_skills'] + metier['soft_skills'])
-        logiciels_metier = set(metier['tools'])
-        
-        # Score Compétences (50%)
-        if competences_metier:
-            competences_communes = competences_user & competences_metier
-            score_competences = (len(competences_communes) / len(competences_metier)) * 50
-        else:
-            score_competences = 25
-        
-        # Bonus pour compétences clés
-        competences_cles = ['Python', 'SQL', 'JavaScript', 'Excel']
-        for comp_cle in competences_cles:
-            if comp_cle in competences_communes:
-                score_competences += 2
-        score_competences = min(score_competences, 50)
-        
-        # Score Diplôme (30%)
-        diplome_compatible = self.check_diplome_compatible(
-            utilisateur.get('diplome', ''), 
-            metier['diplome_minimum']
-        )
-        score_diplome = diplome_compatible * 30
-        
-        # Score Logiciels (20%)
-        if logiciels_metier:
-            logiciels_communs = logiciels_user & logiciels_metier
-            score_logiciels = (len(logiciels_communs) / len(logiciels_metier)) * 20
-        else:
-            score_logiciels = 10
-        
-        return round(score_competences + score_diplome + score_logiciels, 2)
+    def __init__(self, db_path="employia.db", archetypes=None):
+        super().__init__(db_path, archetypes=archetypes)
     
-    def get_competences_manquantes(self, utilisateur, metier):
-        competences_user = set(utilisateur.get('competences', []))
-        logiciels_user = set(utilisateur.get('logiciels', []))
-        
-        competences_manquantes = set(metier['hard_skills']) - competences_user
-        logiciels_manquants = set(metier['tools']) - logiciels_user
-        soft_skills_manquants = set(metier['soft_skills']) - competences_user
-        
-        result = []
-        for comp in list(competences_manquantes)[:3]:
-            result.append({'nom': comp, 'type': 'Technique', 'priorite': 'Haute'})
-        for comp in list(logiciels_manquants)[:2]:
-            result.append({'nom': comp, 'type': 'Outil', 'priorite': 'Moyenne'})
-        for comp in list(soft_skills_manquants)[:2]:
-            result.append({'nom': comp, 'type': 'Comportemental', 'priorite': 'Basse'})
-        
-        return result
-    
-    def recommander_metiers(self, utilisateur, top_n=10):
-        metiers = self.get_all_metiers_with_competences()
-        scores_metiers = []
-        
-        for metier in metiers:
-            score = self.calculer_score_metier(utilisateur, metier)
-            scores_metiers.append((metier, score))
-        
-        scores_metiers.sort(key=lambda x: x[1], reverse=True)
-        
-        recommandations = []
-        for metier, score in scores_metiers[:top_n]:
-            recommandations.append({
-                'metier': metier['nom'],
-                'secteur': metier['secteur'],
-                'score': score,
-                'diplome_requis': metier['diplome_minimum'],
-                'demande_afrique': metier['demande_afrique'],
-                'reconversion_facile': metier['reconversion_facile'],
-                'competences_requises': metier['hard_skills'][:5],
-                'competences_manquantes': self.get_competences_manquantes(utilisateur, metier)
-            })
-        
-        return recommandations
+    def recommander_metiers(self, utilisateur, top_n=10, eligibilite_stricte=False,
+                            diversite=0.0, max_par_secteur=None):
+        return super().recommander_metiers(utilisateur, top_n, eligibilite_stricte,
+                                           diversite, max_par_secteur)
+
+@st.cache_resource
+def get_archetypes(_matching):
+    # Profils fréquents précalculés au premier chargement (seuls les métiers modifiés sont rescorés)
+    cache = CacheArchetypes("employia_archetypes.db")
+    cache.preparer(_matching, get_journal())
+    return cache
+
+def creer_matching(region, db_path):
+    with get_profilage().mesurer(f"chargement_catalogue:{region}"):
+        matching = preparer_matching(EmployiaMatching(db_path))
+    if region == REGION_DEFAUT:
+        with get_profilage().mesurer("chargement_archetypes"):
+            matching.archetypes = get_archetypes(matching)
+    return get_profilage().instrumenter(matching, 'recommander_metiers')
+
+@st.cache_resource
+def get_pool():
+    # Catalogues régionaux chargés à la demande, les moins utilisés libérés au-delà du budget
+    return PoolCatalogues(charger_regions(), fabrique=creer_matching)
+
+def get_matching():
+    return get_pool().obtenir(st.session_state.region)
+
+@st.cache_resource
+def get_classements():
+    # Classements complets partagés entre sessions, servis page par page
+    return get_profilage().instrumenter(ClassementsPagines(), 'page')
 
-def creer_profil_utilisateur(diplome, competences, logiciels, interets=None):
-    return {
-        'diplome': diplome,
-        'competences': competences,
-        'logiciels': logiciels,
-        'interets': interets or []
-    }
 st.markdown("""
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Plus+Jakarta+Sans:wght@300;400;500;600;700;800&display=swap');
@@ -358,14 +258,18 @@ st.markdown("""
 # ============================================
 # INITIALISATION DE LA SESSION
 # ============================================
-if 'matching' not in st.session_state:
-    st.session_state.matching = EmployiaMatching()
+if 'region' not in st.session_state:
+    st.session_state.region = REGION_DEFAUT if REGION_DEFAUT in get_pool().regions else next(iter(get_pool().regions))
 if 'show_profile' not in st.session_state:
     st.session_state.show_profile = False
 if 'recommandations' not in st.session_state:
     st.session_state.recommandations = None
 if 'profil' not in st.session_state:
     st.session_state.profil = None
+if 'curseur' not in st.session_state:
+    st.session_state.curseur = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # ============================================
 # HEADER
@@ -394,14 +298,18 @@ if st.session_state.show_profile:
         st.markdown("Renseignez votre parcours pour obtenir des recommandations personnalisées.")
         st.divider()
         
+        regions = list(get_pool().regions)
+        if len(regions) > 1:
+            st.selectbox("Région", regions, key="region")
+        
         with st.form("profil_form"):
             diplome = st.selectbox(
                 "Niveau d'études",
-                ["Bac", "BTS", "Licence", "Master", "Doctorat", "Autre"],
+                DIPLOMES_FORMULAIRE,
                 index=2
             )
             
-            all_competences = get_all_competences()
+            all_competences = get_all_competences(get_pool().regions[st.session_state.region])
             hard_skills = [c[0] for c in all_competences if c[1] == 'Hard Skill']
             soft_skills = [c[0] for c in all_competences if c[1] == 'Soft Skill']
             tools = [c[0] for c in all_competences if c[1] == 'Tools']
@@ -421,16 +329,35 @@ if st.session_state.show_profile:
                 options=tools
             )
             
-            secteurs = get_secteurs()
+            texte_cv = st.text_area(
+                "Ou collez votre CV (optionnel)",
+                placeholder="Les compétences et outils cités seront ajoutés à votre profil"
+            )
+            
+            secteurs = get_secteurs(get_pool().regions[st.session_state.region])
             interets = st.multiselect(
                 "Secteurs d'intérêt (optionnel)",
                 options=secteurs
             )
             
+            eligibilite_stricte = st.checkbox(
+                "Uniquement les métiers accessibles avec mon diplôme",
+                value=False
+            )
+            
+            varier_secteurs = st.checkbox(
+                "Varier les secteurs proposés",
+                value=False
+            )
+            
             submitted = st.form_submit_button("Obtenir mes recommandations", use_container_width=True)
             
             if submitted:
                 toutes_competences = competences_tech + competences_soft
+                if texte_cv.strip():
+                    profil_cv = get_matching().profil_depuis_cv(texte_cv, diplome=diplome)
+                    toutes_competences += [c for c in profil_cv['competences'] if c not in toutes_competences]
+                    logiciels = logiciels + [l for l in profil_cv['logiciels'] if l not in logiciels]
                 st.session_state.profil = creer_profil_utilisateur(
                     diplome=diplome,
                     competences=toutes_competences,
@@ -438,11 +365,26 @@ if st.session_state.show_profile:
                     interets=interets
                 )
                 
+                st.session_state.eligibilite_stricte = eligibilite_stricte
                 with st.spinner("Analyse de votre profil en cours..."):
-                    time.sleep(1)
-                    st.session_state.recommandations = st.session_state.matching.recommander_metiers(
-                        st.session_state.profil, top_n=10
-                    )
+                    time.sleep(PAUSE_SOUMISSION)
+                    if varier_secteurs:
+                        st.session_state.recommandations = get_matching().recommander_metiers(
+                            st.session_state.profil, top_n=10,
+                            eligibilite_stricte=eligibilite_stricte,
+                            diversite=0.3, max_par_secteur=3
+                        )
+                        st.session_state.curseur = None
+                    else:
+                        page = get_classements().page(get_matching(), st.session_state.profil,
+                                                      taille_page=10, eligibilite_stricte=eligibilite_stricte)
+                        st.session_state.recommandations = page['recommandations']
+                        st.session_state.curseur = page['curseur_suivant']
+                get_journal().enregistrer_recommandations(
+                    st.session_state.profil,
+                    st.session_state.recommandations,
+                    session=st.session_state.session_id
+                )
                 st.rerun()
 
 # ============================================
@@ -541,6 +483,33 @@ else:
     
     st.divider()
     
+    # Recherche d'un métier précis
+    recherche = st.text_input("Rechercher un métier", placeholder="Ex. Data Analyst, Développeur Web...")
+    if recherche:
+        resultats_recherche = get_matching().rechercher_metiers(recherche, limite=10)
+        if resultats_recherche:
+            choix = st.selectbox(
+                "Métiers trouvés",
+                resultats_recherche,
+                format_func=lambda m: f"{m['nom']} ({m['secteur']})"
+            )
+            evaluation = get_matching().evaluer_metier(st.session_state.profil, choix['id'])
+            st.markdown(f"""
+            <div class="metier-card">
+                <div style="display: flex; justify-content: space-between; align-items: center;">
+                    <span class="metier-title">{evaluation['metier']}</span>
+                    <span class="metier-score">{evaluation['score']}%</span>
+                </div>
+                <div style="color: #64748b;">{evaluation['secteur']} · {evaluation['diplome_requis']}</div>
+            </div>
+            """, unsafe_allow_html=True)
+            for comp in manquantes_affichees(evaluation['competences_manquantes']):
+                st.markdown(f"• **{comp['nom']}** - {comp['type']} (priorité {comp['priorite'].lower()})")
+        else:
+            st.info("Aucun métier ne correspond à cette recherche.")
+    
+    st.divider()
+    
     # Tabs
     tab1, tab2, tab3 = st.tabs(["Métiers recommandés", "Analyse", "Plan de formation"])
     
@@ -577,7 +546,7 @@ else:
             # Compétences manquantes
             if rec['competences_manquantes']:
                 st.markdown("<div style='margin-top: 1rem;'><strong>Compétences à développer:</strong></div>", unsafe_allow_html=True)
-                for comp in rec['competences_manquantes']:
+                for comp in manquantes_affichees(rec['competences_manquantes']):
                     priority_class = {
                         'Haute': 'priority-high',
                         'Moyenne': 'priority-medium',
@@ -592,15 +561,37 @@ else:
                     """, unsafe_allow_html=True)
             
             st.markdown("</div>", unsafe_allow_html=True)
+        
+        if st.session_state.curseur is not None:
+            if st.button("Voir plus de métiers", use_container_width=True):
+                try:
+                    page = get_classements().page(get_matching(), st.session_state.profil,
+                                                  st.session_state.curseur, taille_page=10,
+                                                  eligibilite_stricte=st.session_state.eligibilite_stricte)
+                    st.session_state.recommandations = st.session_state.recommandations + page['recommandations']
+                    st.session_state.curseur = page['curseur_suivant']
+                except ValueError:
+                    # Catalogue mis à jour (ou région changée) depuis la première page
+                    st.session_state.curseur = None
+                    st.warning("Les résultats ne correspondent plus au catalogue actuel : relancez l'analyse de votre profil.")
+                else:
+                    st.rerun()
     
     with tab2:
         st.markdown("### Scores de compatibilité")
         
-        # Graphique des scores
-        scores_data = [{"Métier": r['metier'][:20] + "...", "Score": r['score']} 
-                      for r in st.session_state.recommandations[:5]]
-        df_scores = pd.DataFrame(scores_data)
+        composantes = [('competences', 'Compétences'), ('bonus', 'Compétences clés'),
+                       ('diplome', 'Diplôme'), ('logiciels', 'Logiciels')]
+        with get_profilage().mesurer("preparation_affichage"):
+            scores_data = [{"Métier": r['metier'][:20] + "...", "Score": r['score']} 
+                          for r in st.session_state.recommandations[:5]]
+            df_scores = pd.DataFrame(scores_data)
+            detail_data = [{"Métier": r['metier'], "Composante": libelle, "Points": r['detail'][cle]}
+                           for r in st.session_state.recommandations[:5] if r.get('detail')
+                           for cle, libelle in composantes]
+            df_detail = pd.DataFrame(detail_data)
         
+        # Graphique des scores
         fig = px.bar(df_scores, x='Métier', y='Score', 
                      title="Top 5 des scores",
                      color='Score',
@@ -612,24 +603,58 @@ else:
         )
         st.plotly_chart(fig, use_container_width=True)
         
-        # Compétences les plus demandées
-        st.markdown("### Compétences les plus recherchées")
-        all_skills = []
-        for rec in st.session_state.recommandations:
-            all_skills.extend(rec['competences_requises'])
+        # Décomposition des scores par composante
+        st.markdown("### Détail des scores")
+        if detail_data:
+            fig_detail = px.bar(df_detail, x='Points', y='Métier', color='Composante',
+                                orientation='h', title="Origine des points (top 5)",
+                                hover_data={'Points': ':.2f'})
+            fig_detail.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
+                                     barmode='stack', yaxis={'categoryorder': 'total ascending'})
+            st.plotly_chart(fig_detail, use_container_width=True)
+        
+        # Compétences les plus demandées dans le secteur du meilleur métier
+        secteur_principal = st.session_state.recommandations[0]['secteur']
+        st.markdown(f"### Compétences les plus recherchées ({secteur_principal})")
+        skills_count = get_matching().catalogue.demande.top(5, secteur=secteur_principal, types=['Hard Skill'])
         
-        if all_skills:
-            skills_count = Counter(all_skills).most_common(5)
-            df_skills = pd.DataFrame(skills_count, columns=['Compétence', 'Occurrences'])
+        if skills_count:
+            df_skills = pd.DataFrame(skills_count, columns=['Compétence', 'Demande'])
             
-            fig2 = px.bar(df_skills, x='Compétence', y='Occurrences',
-                         color='Occurrences', color_continuous_scale='blues')
+            fig2 = px.bar(df_skills, x='Compétence', y='Demande',
+                         color='Demande', color_continuous_scale='blues')
             fig2.update_layout(
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)',
                 showlegend=False
             )
             st.plotly_chart(fig2, use_container_width=True)
+        
+        # Tendances de la plateforme (30 derniers jours)
+        st.markdown("### Tendances de la plateforme (30 jours)")
+        analytique = get_analytique()
+        debut_fenetre = time.time() - 30 * 86400
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            top_metiers = analytique.metiers_plus_recommandes(debut=debut_fenetre, limite=10)
+            if top_metiers:
+                df_metiers = pd.DataFrame(top_metiers, columns=['Secteur', 'Métier', 'Recommandations'])
+                fig3 = px.bar(df_metiers, x='Recommandations', y='Métier', color='Secteur',
+                              orientation='h', title="Métiers les plus recommandés")
+                fig3.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+                st.plotly_chart(fig3, use_container_width=True)
+        
+        with col2:
+            top_manquantes = analytique.competences_plus_manquantes(debut=debut_fenetre, limite=10)
+            if top_manquantes:
+                df_manquantes = pd.DataFrame(top_manquantes, columns=['Compétence', 'Occurrences'])
+                fig4 = px.bar(df_manquantes, x='Occurrences', y='Compétence', orientation='h',
+                              title="Compétences les plus souvent manquantes",
+                              color='Occurrences', color_continuous_scale='blues')
+                fig4.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
+                                   showlegend=False)
+                st.plotly_chart(fig4, use_container_width=True)
     
     with tab3:
         if st.session_state.recommandations:
@@ -643,10 +668,11 @@ else:
             """, unsafe_allow_html=True)
             
             # Regrouper les compétences par phase
+            manquantes = manquantes_affichees(meilleur['competences_manquantes'])
             phases = [
-                ("Fondamentaux", [c for c in meilleur['competences_manquantes'] if c['priorite'] == 'Haute']),
-                ("Outils", [c for c in meilleur['competences_manquantes'] if c['type'] == 'Outil']),
-                ("Perfectionnement", [c for c in meilleur['competences_manquantes'] if c['type'] == 'Comportemental'])
+                ("Fondamentaux", [c for c in manquantes if c['priorite'] == 'Haute']),
+                ("Outils", [c for c in manquantes if c['type'] == 'Outil']),
+                ("Perfectionnement", [c for c in manquantes if c['type'] == 'Comportemental'])
             ]
             
             for titre, comps in phases:
@@ -659,6 +685,36 @@ else:
                 st.balloons()
                 st.success("Plan de formation généré avec succès !")
 
+# ============================================
+# PROFILAGE MÉMOIRE (panneau caché : ?debug=memoire)
+# ============================================
+get_profilage().enregistrer_session(st.session_state.session_id, st.session_state.to_dict())
+if st.query_params.get("debug") == "memoire":
+    profilage = get_profilage()
+    with st.expander("Profilage mémoire", expanded=True):
+        st.caption("Profilage actif : tracemalloc ralentit chaque allocation et les instantanés "
+                   "périodiques bloquent brièvement les autres étapes mesurées ; les requêtes "
+                   "simultanées se mêlent dans les mesures. À n'activer que pour un diagnostic.")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if profilage.actif:
+                if st.button("Arrêter le profilage"):
+                    profilage.desactiver()
+                    st.rerun()
+            elif st.button("Démarrer le profilage"):
+                profilage.activer()
+                st.rerun()
+        with col2:
+            if st.button("Effacer les mesures"):
+                profilage.reinitialiser()
+        rapport = profilage.rapport(get_pool(), get_classements())
+        with col3:
+            if st.button("Enregistrer le rapport"):
+                chemin = f"employia_profilage_{time.strftime('%Y%m%d_%H%M%S')}.json"
+                profilage.sauvegarder(chemin, get_pool(), get_classements())
+                st.success(f"Rapport enregistré : {chemin}")
+        st.json(rapport, expanded=False)
+
 # ============================================
 # FOOTER
 # ============================================
@@ -0,0 +1,196 @@
+import json
+import math
+import sqlite3
+import time
+from collections import Counter
+
+HEURE = 3600
+JOUR = 86400
+
+_TABLES = {
+    'rollup_metiers': ('secteur', 'metier'),
+    'rollup_competences_manquantes': ('competence',),
+    'rollup_scores': ('diplome', 'tranche'),
+}
+
+
+def _buckets(horodatage):
+    """Renvoie les débuts de l'heure et du jour (UTC) contenant l'horodatage"""
+    return (('h', int(horodatage // HEURE) * HEURE),
+            ('j', int(horodatage // JOUR) * JOUR))
+
+
+def _tranche_score(score):
+    """Tranche de 10 points contenant le score (90 pour 90-100)"""
+    return min(int(score // 10), 9) * 10
+
+
+def _resultats(donnees):
+    """Résultats [(metier, secteur, score)] d'un événement 'recommandations_affichees', ou None s'il est malformé"""
+    if not isinstance(donnees, dict) or not isinstance(donnees.get('resultats', []), (list, tuple)):
+        return None
+    resultats = []
+    for resultat in donnees.get('resultats', []):
+        if not isinstance(resultat, (list, tuple)) or len(resultat) != 3:
+            return None
+        metier, secteur, score = resultat
+        if not isinstance(metier, str) or not isinstance(secteur, str) \
+                or not isinstance(score, (int, float)) or isinstance(score, bool):
+            return None
+        resultats.append((metier, secteur, score))
+    return resultats
+
+
+def _intervalles(debut, fin):
+    """Découpe [debut, fin) en heures de bord et jours complets"""
+    debut_h = int(debut // HEURE) * HEURE
+    fin_h = int(math.ceil(fin / HEURE)) * HEURE
+    premier_jour = int(math.ceil(debut_h / JOUR)) * JOUR
+    dernier_jour = int(fin_h // JOUR) * JOUR
+    if premier_jour < dernier_jour:
+        return [('h', debut_h, premier_jour), ('j', premier_jour, dernier_jour),
+                ('h', dernier_jour, fin_h)]
+    return [('h', debut_h, fin_h)]
+
+
+class AnalytiqueUtilisation:
+    def __init__(self, db_path="employia_historique.db"):
+        """
+        Agrégats d'utilisation par heure et par jour, tenus à jour à l'ingestion.
+        Les événements malformés sont ignorés (comptés dans `evenements_ignores`).
+        """
+        self.db_path = db_path
+        self.evenements_ignores = 0
+
+    def installer(self, conn):
+        """Crée les tables d'agrégats si elles n'existent pas"""
+        for table, colonnes in _TABLES.items():
+            definition = ", ".join(f"{c} TEXT NOT NULL" for c in colonnes)
+            cle = ", ".join(colonnes)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    granularite TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    {definition},
+                    n INTEGER NOT NULL,
+                    PRIMARY KEY (granularite, bucket, {cle})
+                )
+            """)
+        conn.commit()
+
+    def mettre_a_jour(self, conn, evenements):
+        """
+        Incrémente les agrégats avec un lot d'événements (horodatage, session, type, donnees).
+        Appelé dans la transaction d'écriture du journal.
+        """
+        compteurs = {table: Counter() for table in _TABLES}
+
+        for horodatage, _, type_evenement, donnees in evenements:
+            buckets = _buckets(horodatage)
+            if type_evenement == 'recommandations_affichees':
+                resultats = _resultats(donnees)
+                if resultats is None:
+                    self.evenements_ignores += 1
+                    continue
+                for bucket in buckets:
+                    for metier, secteur, _ in resultats:
+                        compteurs['rollup_metiers'][bucket + (secteur, metier)] += 1
+                    if resultats:
+                        meilleur = max(score for _, _, score in resultats)
+                        compteurs['rollup_scores'][
+                            bucket + (str(donnees.get('diplome') or ''), str(_tranche_score(meilleur)))
+                        ] += 1
+            elif type_evenement == 'competences_manquantes':
+                if not isinstance(donnees, (list, tuple)) or not all(isinstance(c, str) for c in donnees):
+                    self.evenements_ignores += 1
+                    continue
+                for bucket in buckets:
+                    for competence in donnees:
+                        compteurs['rollup_competences_manquantes'][bucket + (competence,)] += 1
+
+        for table, compteur in compteurs.items():
+            if not compteur:
+                continue
+            colonnes = ("granularite", "bucket") + _TABLES[table]
+            conn.executemany(f"""
+                INSERT INTO {table} ({", ".join(colonnes)}, n)
+                VALUES ({", ".join("?" * (len(colonnes) + 1))})
+                ON CONFLICT({", ".join(colonnes)}) DO UPDATE SET n = n + excluded.n
+            """, [cle + (n,) for cle, n in compteur.items()])
+
+    def reconstruire(self):
+        """Recalcule tous les agrégats à partir des événements bruts"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.installer(conn)
+            with conn:
+                for table in _TABLES:
+                    conn.execute(f"DELETE FROM {table}")
+                curseur = conn.execute("""
+                    SELECT horodatage, session, type, donnees FROM evenements
+                    WHERE type IN ('recommandations_affichees', 'competences_manquantes')
+                    ORDER BY id
+                """)
+                while True:
+                    lignes = curseur.fetchmany(10000)
+                    if not lignes:
+                        break
+                    self.mettre_a_jour(conn, [
+                        (h, s, t, json.loads(d)) for h, s, t, d in lignes
+                    ])
+        finally:
+            conn.close()
+
+    def _agreger(self, table, colonnes, debut, fin, filtres=None, limite=None):
+        """Somme les agrégats d'une table sur la fenêtre [debut, fin)"""
+        if debut is None:
+            debut = 0
+        if fin is None:
+            fin = time.time()
+
+        conditions = []
+        params = []
+        for granularite, borne_min, borne_max in _intervalles(debut, fin):
+            conditions.append("(granularite = ? AND bucket >= ? AND bucket < ?)")
+            params.extend([granularite, borne_min, borne_max])
+        requete = f"SELECT {', '.join(colonnes)}, SUM(n) AS total FROM {table} WHERE ({' OR '.join(conditions)})"
+        for colonne, valeur in (filtres or {}).items():
+            requete += f" AND {colonne} = ?"
+            params.append(valeur)
+        requete += f" GROUP BY {', '.join(colonnes)} ORDER BY total DESC"
+        if limite is not None:
+            requete += " LIMIT ?"
+            params.append(limite)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(requete, params).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            conn.close()
+
+    def metiers_plus_recommandes(self, debut=None, fin=None, secteur=None, limite=10):
+        """Métiers les plus recommandés sur la fenêtre : [(secteur, metier, n), ...]"""
+        filtres = {'secteur': secteur} if secteur else None
+        return self._agreger('rollup_metiers', ('secteur', 'metier'), debut, fin, filtres, limite)
+
+    def metiers_plus_recommandes_par_secteur(self, debut=None, fin=None, limite=5):
+        """Métiers les plus recommandés, regroupés par secteur"""
+        par_secteur = {}
+        for secteur, metier, n in self._agreger('rollup_metiers', ('secteur', 'metier'), debut, fin):
+            top = par_secteur.setdefault(secteur, [])
+            if len(top) < limite:
+                top.append((metier, n))
+        return par_secteur
+
+    def competences_plus_manquantes(self, debut=None, fin=None, limite=10):
+        """Compétences le plus souvent manquantes : [(competence, n), ...]"""
+        return self._agreger('rollup_competences_manquantes', ('competence',), debut, fin, limite=limite)
+
+    def distribution_scores(self, debut=None, fin=None):
+        """Distribution du meilleur score par niveau de diplôme : {diplome: {tranche: n}}"""
+        distribution = {}
+        for diplome, tranche, n in self._agreger('rollup_scores', ('diplome', 'tranche'), debut, fin):
+            distribution.setdefault(diplome, {})[int(tranche)] = n
+        return {d: dict(sorted(t.items())) for d, t in distribution.items()}
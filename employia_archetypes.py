@@ -0,0 +1,338 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+
+import numpy as np
+
+from employia_matching import repartager
+from employia_scoring import TYPE_OUTIL, classer, detail_metier
+
+ARCHETYPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archetypes.json")
+# À incrémenter quand le format des recommandations enregistrées change
+FORMAT_RECOMMANDATIONS = 3
+
+
+def profil_canonique(utilisateur):
+    """Partie d'un profil qui détermine le classement : diplôme, compétences et logiciels triés"""
+    return {
+        'diplome': utilisateur.get('diplome', '') or '',
+        'competences': sorted(set(utilisateur.get('competences', []))),
+        'logiciels': sorted(set(utilisateur.get('logiciels', [])))
+    }
+
+
+def cle_profil(utilisateur):
+    """Clé texte du profil canonique"""
+    return json.dumps(profil_canonique(utilisateur), ensure_ascii=False, sort_keys=True)
+
+
+def charger_archetypes(path=ARCHETYPES_PATH):
+    """Charge la liste configurée de profils types"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def archetypes_frequents(journal, nombre=100, minimum=2, depuis=None):
+    """Profils canoniques les plus soumis d'après le journal : [(profil, occurrences)]"""
+    compteur = Counter(
+        cle_profil(donnees) for _, _, _, donnees in journal.evenements('profil_soumis', depuis=depuis)
+    )
+    return [(json.loads(cle), n) for cle, n in compteur.most_common(nombre) if n >= minimum]
+
+
+def _empreinte_profil(profil):
+    """Empreinte des paramètres d'un profil de scoring"""
+    parametres = {k: v for k, v in vars(profil).items() if not k.startswith('_')}
+    return hashlib.sha1(json.dumps(parametres, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _variante(matching):
+    """Classe de matching, qui détermine la mise en forme des résultats"""
+    return f"{type(matching).__module__}.{type(matching).__qualname__}"
+
+
+class CacheArchetypes:
+    def __init__(self, db_path="employia_archetypes.db", profondeur=20):
+        """
+        Classements précalculés des profils les plus fréquents.
+
+        Pour chaque profil canonique sont conservés les scores de tout le
+        catalogue (en centièmes) et les `profondeur` premières recommandations,
+        compétences manquantes comprises, en mode normal et strict. Les
+        entrées sont liées à la version du catalogue et du profil de scoring ;
+        après un changement du catalogue, seuls les métiers modifiés sont
+        rescorés.
+        """
+        self.db_path = db_path
+        self.profondeur = profondeur
+        self.trouves = 0
+        self.manques = 0
+        self._entrees = {}
+        self._cle_chargee = None
+
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS archetypes (
+                    cle TEXT NOT NULL,
+                    profil_scoring TEXT NOT NULL,
+                    variante TEXT NOT NULL,
+                    occurrences INTEGER NOT NULL,
+                    version TEXT NOT NULL,
+                    profondeur INTEGER NOT NULL,
+                    scores BLOB NOT NULL,
+                    recommandations TEXT NOT NULL,
+                    PRIMARY KEY (cle, profil_scoring, variante)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS versions_catalogue (
+                    version TEXT PRIMARY KEY,
+                    ids BLOB NOT NULL,
+                    empreintes TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _version(matching):
+        """Version du catalogue et du profil de scoring d'une instance de matching"""
+        return (f"{FORMAT_RECOMMANDATIONS}:{matching.catalogue.version}"
+                f"/{_empreinte_profil(matching.profil_scoring)}")
+
+    def preparer(self, matching, journal=None, nombre=100, minimum=2, archetypes=None):
+        """
+        Précalcule les profils configurés et les plus fréquents du journal,
+        puis charge les classements en mémoire. Renvoie les statistiques.
+        """
+        profils = [(p, 0) for p in (archetypes if archetypes is not None else charger_archetypes())]
+        if journal is not None:
+            profils += archetypes_frequents(journal, nombre, minimum)
+        stats = self.precalculer(matching, profils)
+        self.charger(matching)
+        return stats
+
+    def precalculer(self, matching, archetypes):
+        """
+        Calcule et enregistre les classements de `archetypes` [(profil, occurrences)].
+        Les entrées déjà à jour ne sont pas recalculées ; les autres profils du
+        même couple (profil de scoring, variante) sont supprimés.
+        """
+        catalogue = matching.catalogue
+        profil = matching.profil_scoring.nom
+        variante = _variante(matching)
+        version = self._version(matching)
+        ids = np.array([m['id'] for m in catalogue.metiers], dtype=np.int64)
+        empreintes = catalogue.empreintes_metiers()
+        stats = {'inchanges': 0, 'partiels': 0, 'complets': 0, 'metiers_rescores': 0}
+
+        occurrences = {}
+        profils = {}
+        for utilisateur, n in archetypes:
+            cle = cle_profil(utilisateur)
+            profils.setdefault(cle, profil_canonique(utilisateur))
+            occurrences[cle] = max(occurrences.get(cle, 0), n)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            existants = {
+                cle: (version_ligne, profondeur, scores)
+                for cle, version_ligne, profondeur, scores in conn.execute("""
+                    SELECT cle, version, profondeur, scores FROM archetypes
+                    WHERE profil_scoring = ? AND variante = ?
+                """, (profil, variante))
+            }
+            reprises = {}
+            lignes = []
+            for cle, utilisateur in profils.items():
+                existant = existants.get(cle)
+                if existant is not None and existant[0] == version and existant[1] >= self.profondeur:
+                    conn.execute("""
+                        UPDATE archetypes SET occurrences = ?
+                        WHERE cle = ? AND profil_scoring = ? AND variante = ?
+                    """, (occurrences[cle], cle, profil, variante))
+                    stats['inchanges'] += 1
+                    continue
+
+                scores = None
+                if existant is not None:
+                    if existant[0] not in reprises:
+                        reprises[existant[0]] = self._reprise(conn, existant[0], version, ids, empreintes)
+                    reprise = reprises[existant[0]]
+                    if reprise is not None:
+                        nouveaux, anciens, a_rescorer = reprise
+                        scores = np.empty(len(ids))
+                        scores[nouveaux] = np.frombuffer(existant[2], dtype=np.uint16)[anciens] / 100
+                        if len(a_rescorer):
+                            scores[a_rescorer] = matching.moteur.scorer(utilisateur, profil, a_rescorer)
+                        stats['partiels'] += 1
+                        stats['metiers_rescores'] += len(a_rescorer)
+                if scores is None:
+                    scores = matching.moteur.scorer(utilisateur, profil)
+                    stats['complets'] += 1
+                    stats['metiers_rescores'] += len(ids)
+
+                lignes.append((
+                    cle, profil, variante, occurrences[cle], version, self.profondeur,
+                    np.rint(scores * 100).astype(np.uint16).tobytes(),
+                    json.dumps(self._recommandations(matching, utilisateur, scores), ensure_ascii=False)
+                ))
+
+            with conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO archetypes
+                        (cle, profil_scoring, variante, occurrences, version, profondeur, scores, recommandations)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, lignes)
+                conn.executemany("""
+                    DELETE FROM archetypes WHERE cle = ? AND profil_scoring = ? AND variante = ?
+                """, [(cle, profil, variante) for cle in existants if cle not in profils])
+                conn.execute("""
+                    INSERT OR IGNORE INTO versions_catalogue (version, ids, empreintes) VALUES (?, ?, ?)
+                """, (version, ids.tobytes(), json.dumps(empreintes)))
+                conn.execute("""
+                    DELETE FROM versions_catalogue
+                    WHERE version NOT IN (SELECT DISTINCT version FROM archetypes)
+                """)
+        finally:
+            conn.close()
+        return stats
+
+    @staticmethod
+    def _reprise(conn, ancienne_version, version, ids, empreintes):
+        """
+        Correspondance avec une version précédente du catalogue :
+        (indices actuels inchangés, indices anciens correspondants, indices à rescorer),
+        ou None si cette version n'est plus connue ou si le profil de scoring a changé.
+        """
+        if ancienne_version.rsplit('/', 1)[-1] != version.rsplit('/', 1)[-1]:
+            return None
+        ligne = conn.execute("SELECT ids, empreintes FROM versions_catalogue WHERE version = ?",
+                             (ancienne_version,)).fetchone()
+        if ligne is None:
+            return None
+        anciens_ids = np.frombuffer(ligne[0], dtype=np.int64)
+        anciennes_empreintes = json.loads(ligne[1])
+        position = {metier_id: i for i, metier_id in enumerate(anciens_ids.tolist())}
+
+        nouveaux, anciens, a_rescorer = [], [], []
+        for j, (metier_id, empreinte) in enumerate(zip(ids.tolist(), empreintes)):
+            i = position.get(metier_id)
+            if i is not None and anciennes_empreintes[i] == empreinte:
+                nouveaux.append(j)
+                anciens.append(i)
+            else:
+                a_rescorer.append(j)
+        return (np.array(nouveaux, dtype=np.intp), np.array(anciens, dtype=np.intp),
+                np.array(a_rescorer, dtype=np.intp))
+
+    def _recommandations(self, matching, utilisateur, scores):
+        """Premières recommandations, en mode normal et strict"""
+        metiers = matching.catalogue.metiers
+        profil = matching.profil_scoring.nom
+        eligibles = matching.moteur.metiers_eligibles(utilisateur, profil)
+        ordres = {
+            'normal': classer(scores, self.profondeur),
+            'strict': eligibles[classer(scores[eligibles], self.profondeur)]
+        }
+        # Composantes du score des seuls métiers retenus
+        retenus = np.unique(np.concatenate(list(ordres.values())))
+        _, details = matching.moteur.scorer(utilisateur, profil, retenus, detail=True)
+        position = {j: i for i, j in enumerate(retenus.tolist())}
+        return {
+            mode: [matching._recommandation(utilisateur, metiers[j], float(scores[j]),
+                                            detail_metier(details, position[j]), manques)
+                   for j, manques in zip(ordre.tolist(), matching.competences_manquantes_lot(utilisateur, ordre))]
+            for mode, ordre in ordres.items()
+        }
+
+    def charger(self, matching):
+        """Charge en mémoire les classements à jour pour cette instance de matching"""
+        cle_chargee = (self._version(matching), matching.profil_scoring.nom, _variante(matching))
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self._entrees = {
+                cle: json.loads(recommandations)
+                for cle, recommandations in conn.execute("""
+                    SELECT cle, recommandations FROM archetypes
+                    WHERE version = ? AND profil_scoring = ? AND variante = ? AND profondeur >= ?
+                """, cle_chargee + (self.profondeur,))
+            }
+        finally:
+            conn.close()
+        self._cle_chargee = cle_chargee
+        return len(self._entrees)
+
+    def scores(self, matching, utilisateur):
+        """
+        Scores précalculés de tout le catalogue pour ce profil (ordre du
+        catalogue), ou None s'il n'est pas en cache ; servent à classer sans
+        rescorer, avec un autre départage que `trouver`
+        """
+        cle = cle_profil(utilisateur)
+        cle_chargee = (self._version(matching), matching.profil_scoring.nom, _variante(matching))
+        if cle not in self._entrees or self._cle_chargee != cle_chargee:
+            self.manques += 1
+            return None
+        conn = sqlite3.connect(self.db_path)
+        try:
+            ligne = conn.execute("""
+                SELECT scores FROM archetypes
+                WHERE cle = ? AND version = ? AND profil_scoring = ? AND variante = ?
+            """, (cle,) + cle_chargee).fetchone()
+        finally:
+            conn.close()
+        if ligne is None:
+            self.manques += 1
+            return None
+        self.trouves += 1
+        return np.frombuffer(ligne[0], dtype=np.uint16) / 100
+
+    def trouver(self, matching, utilisateur, top_n=5, eligibilite_stricte=False):
+        """Recommandations précalculées pour ce profil, ou None s'il n'est pas en cache"""
+        entree = self._entrees.get(cle_profil(utilisateur)) if top_n <= self.profondeur else None
+        if entree is None or self._cle_chargee != (self._version(matching), matching.profil_scoring.nom,
+                                                   _variante(matching)):
+            self.manques += 1
+            return None
+        self.trouves += 1
+        recommandations = [
+            {**r, 'competences_requises': list(r['competences_requises']),
+             'competences_manquantes': [dict(c) for c in r['competences_manquantes']],
+             'detail': dict(r['detail'])}
+            for r in entree['strict' if eligibilite_stricte else 'normal'][:top_n]
+        ]
+        # 'partage' est enregistré sur `profondeur` métiers : recompté sur les `top_n` renvoyés
+        for r in recommandations:
+            matching.ordonner_manquantes(matching.catalogue.get_metier(r['id']), r['competences_manquantes'])
+        repartager([r['competences_manquantes'] for r in recommandations], matching.TYPES_MANQUANTES[TYPE_OUTIL][0])
+        return recommandations
+
+
+if __name__ == "__main__":
+    from employia_historique import JournalUtilisation
+    from employia_matching import EmployiaMatching
+
+    parser = argparse.ArgumentParser(description="Précalcul des classements des profils fréquents")
+    parser.add_argument("--db", default="employia.db", help="Base du catalogue")
+    parser.add_argument("--historique", default="employia_historique.db", help="Journal d'utilisation")
+    parser.add_argument("--cache", default="employia_archetypes.db", help="Base des classements")
+    parser.add_argument("--nombre", type=int, default=100, help="Nombre de profils fréquents retenus")
+    parser.add_argument("--minimum", type=int, default=2, help="Occurrences minimum d'un profil")
+    args = parser.parse_args()
+
+    journal = JournalUtilisation(args.historique) if os.path.exists(args.historique) else None
+    try:
+        resultat = CacheArchetypes(args.cache).preparer(EmployiaMatching(args.db), journal,
+                                                        args.nombre, args.minimum)
+    finally:
+        if journal is not None:
+            journal.fermer()
+    print(json.dumps(resultat, indent=2))
@@ -0,0 +1,150 @@
+import hashlib
+import sqlite3
+
+from employia_demande import DemandeCompetences
+
+
+class Catalogue:
+    def __init__(self, metiers, competences, secteurs, version=None):
+        """
+        Catalogue des métiers chargé une fois en mémoire.
+
+        `metiers` a le format de `get_all_metiers_with_competences`,
+        `competences` est une liste de (id, nom, type) et `secteurs` un
+        dict id -> nom.
+        """
+        self.metiers = metiers
+        self.competences = competences
+        self.secteurs = secteurs
+        self.index_metiers = {m['id']: i for i, m in enumerate(metiers)}
+        self.version = version or self._empreinte()
+        self.demande = DemandeCompetences(metiers)
+        self._recherche = None
+        self._normaliseur = None
+        self._extracteur = None
+
+    @classmethod
+    def depuis_base(cls, db_path="employia.db", partition=None):
+        """
+        Charge le catalogue en deux requêtes (métiers, puis toutes les associations).
+        `partition` = (numero, nb_parts, 'hash' | 'secteur') ne charge qu'une part.
+        """
+        filtre, params = "", []
+        if partition is not None:
+            numero, nb_parts, par = partition
+            if par == 'secteur':
+                filtre = "WHERE m.secteur_id % ? = ?"
+            elif par == 'hash':
+                filtre = "WHERE (m.id * 2654435761) % 4294967296 % ? = ?"
+            else:
+                raise ValueError(f"Partition inconnue : {par}")
+            params = [nb_parts, numero]
+
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT m.id, m.nom, m.secteur_id, s.nom as secteur_nom,
+                       m.diplome_minimum, m.niveau_math, m.niveau_info,
+                       m.demande_afrique, m.reconversion_facile
+                FROM metiers m
+                JOIN secteurs s ON m.secteur_id = s.id
+                {filtre}
+                ORDER BY m.id
+            """, params)
+            lignes_metiers = cursor.fetchall()
+
+            cursor.execute(f"""
+                SELECT mc.metier_id, c.nom, c.type
+                FROM metier_competences mc
+                JOIN competences c ON c.id = mc.competence_id
+                WHERE mc.metier_id IN (SELECT m.id FROM metiers m {filtre})
+                ORDER BY mc.rowid
+            """, params)
+            competences_par_metier = {}
+            for metier_id, nom, type_comp in cursor.fetchall():
+                competences_par_metier.setdefault(metier_id, []).append((nom, type_comp))
+
+            cursor.execute("SELECT id, nom, type FROM competences ORDER BY id")
+            competences = cursor.fetchall()
+            cursor.execute("SELECT id, nom FROM secteurs ORDER BY id")
+            secteurs = dict(cursor.fetchall())
+            user_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+
+        metiers = []
+        for m in lignes_metiers:
+            associees = competences_par_metier.get(m[0], [])
+            hard_skills = [c[0] for c in associees if c[1] == 'Hard Skill']
+            soft_skills = [c[0] for c in associees if c[1] == 'Soft Skill']
+            tools = [c[0] for c in associees if c[1] == 'Tools']
+
+            metiers.append({
+                'id': m[0],
+                'nom': m[1],
+                'secteur_id': m[2],
+                'secteur': m[3],
+                'diplome_minimum': m[4],
+                'niveau_math': m[5],
+                'niveau_info': m[6],
+                'demande_afrique': m[7],
+                'reconversion_facile': m[8],
+                'hard_skills': hard_skills,
+                'soft_skills': soft_skills,
+                'tools': tools,
+                'toutes_competences': hard_skills + soft_skills + tools
+            })
+
+        catalogue = cls(metiers, competences, secteurs)
+        catalogue.version = f"{user_version}-{catalogue.version}"
+        return catalogue
+
+    @staticmethod
+    def _contenu(metier):
+        """Champs d'un métier pris en compte par les empreintes"""
+        return repr((metier['id'], metier['nom'], metier['secteur'], metier['diplome_minimum'],
+                     metier['demande_afrique'], metier['reconversion_facile'],
+                     metier['hard_skills'], metier['soft_skills'], metier['tools'])).encode()
+
+    def _empreinte(self):
+        """Empreinte du contenu, qui change dès qu'un métier ou une association change"""
+        h = hashlib.sha1()
+        for m in self.metiers:
+            h.update(self._contenu(m))
+        return h.hexdigest()[:12]
+
+    def empreintes_metiers(self):
+        """Empreinte de chaque métier, dans l'ordre du catalogue"""
+        return [hashlib.sha1(self._contenu(m)).hexdigest()[:12] for m in self.metiers]
+
+    @property
+    def recherche(self):
+        """Index de recherche par nom, construit à la première utilisation"""
+        if self._recherche is None:
+            from employia_recherche import IndexRechercheMetiers
+            self._recherche = IndexRechercheMetiers(self.metiers)
+        return self._recherche
+
+    @property
+    def normaliseur(self):
+        """Normaliseur des compétences saisies librement, construit à la première utilisation"""
+        if self._normaliseur is None:
+            from employia_normalisation import NormaliseurCompetences
+            self._normaliseur = NormaliseurCompetences(self.competences)
+        return self._normaliseur
+
+    @property
+    def extracteur(self):
+        """Automate d'extraction des compétences d'un texte, compilé une fois par version"""
+        if self._extracteur is None:
+            from employia_extraction import AutomateCompetences
+            self._extracteur = AutomateCompetences(self.competences)
+        return self._extracteur
+
+    def get_metier(self, metier_id):
+        """Renvoie le métier d'identifiant donné"""
+        return self.metiers[self.index_metiers[metier_id]]
+
+    def __len__(self):
+        return len(self.metiers)
@@ -0,0 +1,308 @@
+import argparse
+import importlib
+import json
+import os
+import queue
+import random
+import resource
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from employia_formulaire import DIPLOMES_FORMULAIRE, PAUSE_SOUMISSION, get_all_competences, get_secteurs
+from employia_matching import creer_profil_utilisateur
+
+
+def rss_octets():
+    """Mémoire résidente du processus, en octets (pic de RSS si /proc n'est pas disponible)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def centile(valeurs_triees, q):
+    """Centile `q` (0 à 100) d'une liste triée, par rang le plus proche"""
+    if not valeurs_triees:
+        return None
+    rang = max(0, min(len(valeurs_triees) - 1, int(round(q / 100 * len(valeurs_triees))) - 1))
+    return valeurs_triees[rang]
+
+
+def soumissions_journal(journal, nombre=None, depuis=None):
+    """Soumissions réelles rejouées depuis le journal d'utilisation (événements 'profil_soumis')"""
+    soumissions = []
+    for _, _, _, profil in journal.evenements('profil_soumis', depuis=depuis):
+        soumissions.append({'profil': profil, 'texte_cv': '', 'eligibilite_stricte': False, 'varier': False})
+        if nombre is not None and len(soumissions) >= nombre:
+            break
+    return soumissions
+
+
+def soumissions_synthetiques(catalogue, nombre=1000, graine=0, part_cv=0.1, part_stricte=0.2, part_varier=0.2):
+    """
+    Soumissions tirées au hasard comme les remplit le formulaire : diplôme,
+    quelques compétences techniques et comportementales, outils, secteurs
+    d'intérêt, parfois un CV collé et les cases à cocher
+    """
+    rnd = random.Random(graine)
+    par_type = {'Hard Skill': [], 'Soft Skill': [], 'Tools': []}
+    for _, nom, type_comp in catalogue.competences:
+        par_type.setdefault(type_comp, []).append(nom)
+    secteurs = sorted(catalogue.secteurs.values())
+
+    def tirer(noms, maximum):
+        return rnd.sample(noms, min(len(noms), rnd.randint(0, maximum)))
+
+    soumissions = []
+    for _ in range(nombre):
+        competences = tirer(par_type['Hard Skill'], 6) + tirer(par_type['Soft Skill'], 3)
+        logiciels = tirer(par_type['Tools'], 3)
+        texte_cv = ''
+        if rnd.random() < part_cv:
+            texte_cv = "Expérience : " + ", ".join(tirer(par_type['Hard Skill'], 8) + tirer(par_type['Tools'], 4))
+        soumissions.append({
+            'profil': creer_profil_utilisateur(rnd.choice(DIPLOMES_FORMULAIRE), competences, logiciels,
+                                               tirer(secteurs, 2)),
+            'texte_cv': texte_cv,
+            'eligibilite_stricte': rnd.random() < part_stricte,
+            'varier': rnd.random() < part_varier
+        })
+    return soumissions
+
+
+class ParcoursFormulaire:
+    def __init__(self, pool, classements, journal=None, region=None, pause=PAUSE_SOUMISSION):
+        """
+        Chemin d'une soumission du formulaire de l'application : lecture des
+        listes du formulaire (mêmes fonctions que l'application), extraction du
+        CV, pause d'attente (PAUSE_SOUMISSION par défaut, comme l'application ;
+        0 pour la retirer), recommandations (pages ou classement diversifié) et
+        journalisation.
+        """
+        self.pool = pool
+        self.classements = classements
+        self.journal = journal
+        self.region = region or next(iter(pool.regions))
+        self.pause = pause
+
+    def __call__(self, soumission):
+        matching = self.pool.obtenir(self.region)
+        get_all_competences(self.pool.regions[self.region])
+        get_secteurs(self.pool.regions[self.region])
+
+        profil = dict(soumission['profil'])
+        if soumission.get('texte_cv', '').strip():
+            profil_cv = matching.profil_depuis_cv(soumission['texte_cv'], diplome=profil.get('diplome'))
+            profil['competences'] = profil['competences'] + [
+                c for c in profil_cv['competences'] if c not in profil['competences']]
+            profil['logiciels'] = profil['logiciels'] + [
+                l for l in profil_cv['logiciels'] if l not in profil['logiciels']]
+
+        if self.pause:
+            time.sleep(self.pause)
+        if soumission.get('varier'):
+            recommandations = matching.recommander_metiers(
+                profil, top_n=10, eligibilite_stricte=soumission.get('eligibilite_stricte', False),
+                diversite=0.3, max_par_secteur=3)
+        else:
+            recommandations = self.classements.page(
+                matching, profil, taille_page=10,
+                eligibilite_stricte=soumission.get('eligibilite_stricte', False))['recommandations']
+
+        if self.journal is not None:
+            self.journal.enregistrer_recommandations(profil, recommandations)
+        return recommandations
+
+
+def cible_service(nom, matching):
+    """
+    Point d'entrée à charger : 'module:fonction' (appelée avec le profil) ou
+    nom d'une méthode d'EmployiaMatching (par exemple recommander_metiers_delai)
+    """
+    if ':' in nom:
+        module, attribut = nom.split(':', 1)
+        fonction = getattr(importlib.import_module(module), attribut)
+    else:
+        fonction = getattr(matching, nom)
+    return lambda soumission: fonction(soumission['profil'])
+
+
+class TestCharge:
+    def __init__(self, cible, soumissions, concurrence=8, debit=None, duree=30.0,
+                 nombre=None, intervalle=1.0, graine=0):
+        """
+        Générateur de charge local.
+
+        `concurrence` fils d'exécution appellent `cible(soumission)`. Avec
+        `debit` (soumissions par seconde), les arrivées suivent un processus de
+        Poisson et la latence est mesurée depuis l'arrivée prévue (attente
+        comprise) ; sans, chaque fil enchaîne les soumissions. Le test s'arrête
+        après `duree` secondes ou `nombre` soumissions. Toutes les `intervalle`
+        secondes, le débit, les erreurs et la RSS du processus sont relevés.
+        """
+        self.cible = cible
+        self.soumissions = list(soumissions)
+        self.concurrence = concurrence
+        self.debit = debit
+        self.duree = duree
+        self.nombre = nombre
+        self.intervalle = intervalle
+        self.graine = graine
+
+    def lancer(self):
+        """Exécute le test et renvoie le rapport"""
+        if not self.soumissions:
+            raise ValueError("Aucune soumission à rejouer")
+        latences = []
+        erreurs = Counter()
+        verrou = threading.Lock()
+        compteur = iter(range(self.nombre)) if self.nombre is not None else None
+        tirage = random.Random(self.graine)
+        file = queue.Queue()
+        debut = time.perf_counter()
+        fin_prevue = debut + self.duree if self.duree else float('inf')
+
+        def executer(soumission, arrivee):
+            try:
+                self.cible(soumission)
+                erreur = None
+            except Exception as e:
+                erreur = type(e).__name__
+            latence = time.perf_counter() - arrivee
+            with verrou:
+                if erreur is None:
+                    latences.append(latence)
+                else:
+                    erreurs[erreur] += 1
+
+        def prochaine():
+            """Réserve une soumission ; None quand le test est terminé"""
+            if time.perf_counter() >= fin_prevue:
+                return None
+            if compteur is not None and next(compteur, None) is None:
+                return None
+            return tirage.choice(self.soumissions)
+
+        def fil_ferme():
+            while True:
+                with verrou:
+                    soumission = prochaine()
+                if soumission is None:
+                    return
+                executer(soumission, time.perf_counter())
+
+        def fil_ouvert():
+            while True:
+                element = file.get()
+                if element is None:
+                    return
+                executer(*element)
+
+        def arrivees():
+            rnd = random.Random(self.graine)
+            prevue = time.perf_counter()
+            while True:
+                prevue += rnd.expovariate(self.debit)
+                attente = prevue - time.perf_counter()
+                if attente > 0:
+                    time.sleep(attente)
+                with verrou:
+                    soumission = prochaine()
+                if soumission is None:
+                    break
+                file.put((soumission, prevue))
+            for _ in range(self.concurrence):
+                file.put(None)
+
+        fils = [threading.Thread(target=fil_ferme if self.debit is None else fil_ouvert, daemon=True)
+                for _ in range(self.concurrence)]
+        if self.debit is not None:
+            fils.append(threading.Thread(target=arrivees, daemon=True))
+        for fil in fils:
+            fil.start()
+
+        # Relevés périodiques pendant le test
+        serie = []
+        precedent = (0, 0)
+        releve = debut
+        while any(fil.is_alive() for fil in fils):
+            releve += self.intervalle
+            for fil in fils:
+                fil.join(timeout=max(0.0, releve - time.perf_counter()))
+            with verrou:
+                terminees, nb_erreurs = len(latences), sum(erreurs.values())
+            serie.append({
+                't': round(time.perf_counter() - debut, 2),
+                'soumissions': terminees - precedent[0],
+                'erreurs': nb_erreurs - precedent[1],
+                'attente': file.qsize(),
+                'rss': rss_octets()
+            })
+            precedent = (terminees, nb_erreurs)
+        duree = time.perf_counter() - debut
+
+        latences.sort()
+        total = len(latences) + sum(erreurs.values())
+        return {
+            'soumissions': total,
+            'erreurs': dict(erreurs),
+            'taux_erreur': round(sum(erreurs.values()) / total, 4) if total else 0.0,
+            'duree': round(duree, 3),
+            'debit': round(len(latences) / duree, 2) if duree else 0.0,
+            'latence_ms': {
+                nom: round(valeur * 1000, 2) if valeur is not None else None
+                for nom, valeur in (('p50', centile(latences, 50)), ('p95', centile(latences, 95)),
+                                    ('p99', centile(latences, 99)),
+                                    ('max', latences[-1] if latences else None))
+            },
+            'rss_max': max(point['rss'] for point in serie) if serie else rss_octets(),
+            'serie': serie
+        }
+
+
+if __name__ == "__main__":
+    from employia_historique import JournalUtilisation
+    from employia_pagination import ClassementsPagines
+    from employia_regions import PoolCatalogues
+
+    parser = argparse.ArgumentParser(description="Test de charge du parcours de recommandation")
+    parser.add_argument("--concurrence", type=int, default=8, help="Utilisateurs simultanés (fils d'exécution)")
+    parser.add_argument("--debit", type=float, default=None,
+                        help="Arrivées par seconde (Poisson) ; sans, chaque utilisateur enchaîne les soumissions")
+    parser.add_argument("--duree", type=float, default=30.0, help="Durée du test en secondes")
+    parser.add_argument("--nombre", type=int, default=None, help="Nombre maximal de soumissions")
+    parser.add_argument("--pause", type=float, default=PAUSE_SOUMISSION,
+                        help="Attente simulée par soumission, comme l'application (0 pour la retirer)")
+    parser.add_argument("--historique", default=None,
+                        help="Journal dont rejouer les profils soumis (sinon profils synthétiques)")
+    parser.add_argument("--cible", default=None,
+                        help="Point d'entrée sans interface : 'module:fonction' ou méthode d'EmployiaMatching")
+    parser.add_argument("--intervalle", type=float, default=1.0, help="Période des relevés, en secondes")
+    args = parser.parse_args()
+
+    pool = PoolCatalogues()
+    matching = pool.obtenir(next(iter(pool.regions)))
+    if args.historique:
+        historique = JournalUtilisation(args.historique)
+        try:
+            soumissions = soumissions_journal(historique)
+        finally:
+            historique.fermer()
+    else:
+        soumissions = soumissions_synthetiques(matching.catalogue)
+
+    # Journal de test séparé : le journal de production n'est pas pollué
+    journal = JournalUtilisation(os.path.join(tempfile.mkdtemp(), "charge.db"))
+    try:
+        if args.cible:
+            cible = cible_service(args.cible, matching)
+        else:
+            cible = ParcoursFormulaire(pool, ClassementsPagines(), journal, pause=args.pause)
+        rapport = TestCharge(cible, soumissions, args.concurrence, args.debit, args.duree,
+                             args.nombre, args.intervalle).lancer()
+    finally:
+        journal.fermer()
+    print(json.dumps(rapport, indent=2, ensure_ascii=False))
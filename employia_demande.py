@@ -0,0 +1,85 @@
+from collections import defaultdict
+
+SEUIL_FORTE_DEMANDE = 4
+
+_TYPES = (('hard_skills', 'Hard Skill'), ('soft_skills', 'Soft Skill'), ('tools', 'Tools'))
+
+
+class DemandeCompetences:
+    def __init__(self, metiers):
+        """
+        Statistiques de demande des compétences sur tout le catalogue.
+
+        Construites en une passe : nombre de métiers et poids (somme de
+        `demande_afrique`) par compétence, au global, par secteur, par
+        diplôme minimum et pour les métiers à forte demande.
+        """
+        self.types = defaultdict(set)
+        self._nombre = defaultdict(lambda: defaultdict(int))
+        self._poids = defaultdict(lambda: defaultdict(int))
+
+        for metier in metiers:
+            demande = metier['demande_afrique'] or 0
+            groupes = [('tous', None), ('secteur', metier['secteur']),
+                       ('diplome', metier['diplome_minimum'])]
+            if demande >= SEUIL_FORTE_DEMANDE:
+                groupes.append(('forte_demande', None))
+
+            vues = set()
+            for cle, type_comp in _TYPES:
+                for comp in metier[cle]:
+                    self.types[comp].add(type_comp)
+                    if comp in vues:
+                        continue
+                    vues.add(comp)
+                    for groupe in groupes:
+                        self._nombre[groupe][comp] += 1
+                        self._poids[groupe][comp] += demande
+
+        self._classements = {}
+        for mesure, table in (('nombre', self._nombre), ('poids', self._poids)):
+            for groupe, compteur in table.items():
+                self._classements[(mesure, groupe)] = sorted(
+                    compteur.items(), key=lambda x: (-x[1], x[0])
+                )
+
+    @staticmethod
+    def _groupe(secteur=None, diplome=None):
+        """Clé de groupe correspondant aux filtres demandés"""
+        if secteur is not None and diplome is not None:
+            raise ValueError("Filtrer par secteur ou par diplôme, pas les deux")
+        if secteur is not None:
+            return ('secteur', secteur)
+        if diplome is not None:
+            return ('diplome', diplome)
+        return ('tous', None)
+
+    def nombre_metiers(self, competence, secteur=None, diplome=None):
+        """Nombre de métiers qui requièrent la compétence"""
+        return self._nombre.get(self._groupe(secteur, diplome), {}).get(competence, 0)
+
+    def poids(self, competence, secteur=None, diplome=None):
+        """Somme de `demande_afrique` des métiers qui requièrent la compétence"""
+        return self._poids.get(self._groupe(secteur, diplome), {}).get(competence, 0)
+
+    def _top(self, groupe, n, pondere, types):
+        """Premiers éléments d'un classement précalculé, filtrés par type"""
+        classement = self._classements.get(('poids' if pondere else 'nombre', groupe), [])
+        if types is None:
+            return classement[:n]
+        types = set(types)
+        resultat = []
+        for comp, valeur in classement:
+            if self.types[comp] & types:
+                resultat.append((comp, valeur))
+                if len(resultat) >= n:
+                    break
+        return resultat
+
+    def top(self, n=5, secteur=None, diplome=None, pondere=True, types=None):
+        """Compétences les plus demandées : [(competence, valeur), ...]"""
+        return self._top(self._groupe(secteur, diplome), n, pondere, types)
+
+    def competences_forte_demande(self, n=5, types=None):
+        """Compétences qui ouvrent le plus de métiers à forte demande"""
+        return self._top(('forte_demande', None), n, False, types)
@@ -0,0 +1,402 @@
+import argparse
+import copy
+import json
+import os
+import random
+import sqlite3
+import tempfile
+
+from employia_archetypes import CacheArchetypes, profil_canonique
+from employia_catalogue import Catalogue
+from employia_matching import EmployiaMatching
+from employia_pagination import ClassementsPagines
+from employia_scoring import charger_profils_scoring
+from employia_shards import CoordinateurShards
+
+# Vocabulaire volontairement petit : recouvrements et ex aequo fréquents.
+# 'Excel' est à la fois compétence clé et logiciel ; 'Inconnu' n'est dans aucun métier.
+COMPETENCES_TEST = ['Python', 'SQL', 'Excel', 'JavaScript', 'Gestion de Projet', 'C1', 'C2', 'C3', 'C4', 'C5']
+SOFT_SKILLS_TEST = ['Communication', 'Rigueur', 'S1']
+LOGICIELS_TEST = ['Excel', 'Git', 'T1', 'T2', 'T3']
+DIPLOMES_TEST = ['CAP', 'Bac', 'BTS', 'Licence', 'Master', 'Doctorat', 'Autre', '', 'Inconnu']
+DIPLOMES_REQUIS_TEST = ['Bac', 'BTS / Licence', 'Licence', 'Master', 'Doctorat', 'CAP / BEP', 'Inconnu', '', None]
+
+
+def generer_cas(rnd, nb_metiers_max=12):
+    """
+    Cas aléatoire : catalogue (listes vides, doublons de noms de métiers et
+    de compétences, diplômes inconnus), profil, taille du classement, filtre
+    d'éligibilité et profil de scoring
+    """
+    def tirer(noms, maximum):
+        tires = rnd.sample(noms, rnd.randint(0, min(maximum, len(noms))))
+        if tires and rnd.random() < 0.1:
+            tires.append(rnd.choice(tires))
+        return tires
+
+    metiers = []
+    for i in range(rnd.randint(0, nb_metiers_max)):
+        metiers.append({
+            'id': i + 1,
+            'nom': f"Métier {rnd.randint(1, max(1, nb_metiers_max // 2))}",
+            'secteur_id': rnd.randint(1, 3),
+            'diplome_minimum': rnd.choice(DIPLOMES_REQUIS_TEST),
+            'demande_afrique': rnd.choice([None, 1, 2, 3, 4, 5]),
+            'reconversion_facile': rnd.randint(1, 5),
+            'hard_skills': tirer(COMPETENCES_TEST, 6),
+            'soft_skills': tirer(SOFT_SKILLS_TEST, 2),
+            'tools': tirer(LOGICIELS_TEST, 3)
+        })
+    return {
+        'metiers': metiers,
+        'utilisateur': {
+            'diplome': rnd.choice(DIPLOMES_TEST),
+            'competences': tirer(COMPETENCES_TEST + SOFT_SKILLS_TEST + ['Inconnu'], 6),
+            'logiciels': tirer(LOGICIELS_TEST + ['Inconnu'], 3)
+        },
+        'top_n': rnd.choice([1, 3, 5, 10, 20]),
+        'eligibilite_stricte': rnd.random() < 0.3,
+        'profil_scoring': rnd.choice(sorted(charger_profils_scoring()))
+    }
+
+
+def construire_matching(cas):
+    """Matching sur le catalogue du cas (en mémoire)"""
+    metiers, competences, vus = [], [], {}
+    for m in cas['metiers']:
+        for cle, type_comp in (('hard_skills', 'Hard Skill'), ('soft_skills', 'Soft Skill'), ('tools', 'Tools')):
+            for nom in m[cle]:
+                if (nom, type_comp) not in vus:
+                    vus[(nom, type_comp)] = len(vus) + 1
+                    competences.append((vus[(nom, type_comp)], nom, type_comp))
+        metiers.append({
+            **copy.deepcopy(m),
+            'secteur': f"Secteur {m['secteur_id']}",
+            'niveau_math': None,
+            'niveau_info': None,
+            'toutes_competences': m['hard_skills'] + m['soft_skills'] + m['tools']
+        })
+    secteurs = {m['secteur_id']: m['secteur'] for m in metiers}
+    return EmployiaMatching(":memory:", cas['profil_scoring'], Catalogue(metiers, competences, secteurs))
+
+
+# ---------------------------------------------------------------------------
+# Référence : formule en Python pur, sans moteur, index ni cache
+# ---------------------------------------------------------------------------
+
+def classement_reference(matching, cas, departage='catalogue'):
+    """Indices des métiers classés par score décroissant (ex aequo : ordre du catalogue ou demande puis id)"""
+    utilisateur = cas['utilisateur']
+    metiers = matching.catalogue.metiers
+    indices = [j for j, m in enumerate(metiers)
+               if not cas['eligibilite_stricte']
+               or matching.check_diplome_compatible(utilisateur.get('diplome', ''), m['diplome_minimum'])]
+    scores = {j: matching.calculer_score_metier(utilisateur, metiers[j]) for j in indices}
+    if departage == 'demande':
+        indices.sort(key=lambda j: (-scores[j], -(metiers[j]['demande_afrique'] or 0), metiers[j]['id']))
+    else:
+        indices.sort(key=lambda j: -scores[j])
+    return indices[:cas['top_n']]
+
+
+def _score_parties(matching, utilisateur, metier):
+    """Parts compétences (bonus et plafond compris) et logiciels du score, non arrondies"""
+    profil = matching.profil_scoring
+    competences_metier = set(metier['hard_skills'] + metier['soft_skills'])
+    logiciels_metier = set(metier['tools'])
+    if competences_metier:
+        communes = set(utilisateur['competences']) & competences_metier
+        competences = len(communes) / len(competences_metier) * profil.poids_competences
+        competences += profil.bonus_competence_cle * sum(1 for c in profil.competences_cles if c in communes)
+        competences = min(competences, profil.poids_competences)
+    else:
+        competences = profil.score_competences_vide
+    if logiciels_metier:
+        logiciels = len(set(utilisateur['logiciels']) & logiciels_metier) / len(logiciels_metier) * profil.poids_logiciels
+    else:
+        logiciels = profil.score_logiciels_vide
+    return competences, logiciels
+
+
+def ecarts_reference(matching, utilisateur, metiers):
+    """
+    Manques de chaque métier, au format de `competences_manquantes_lot` :
+    gain = hausse du score si l'élément est acquis ; partage = nombre de ces
+    métiers où il manque aussi ; tri par gain, partage puis ordre du métier
+    """
+    utilisateur = {'competences': list(utilisateur.get('competences', [])),
+                   'logiciels': list(utilisateur.get('logiciels', []))}
+    manques = []
+    for metier in metiers:
+        elements = {}
+        for cle, type_element in (('hard_skills', 'Hard Skill'), ('soft_skills', 'Soft Skill')):
+            for nom in metier[cle]:
+                elements.setdefault((nom, False), type_element)
+        for nom in metier['tools']:
+            elements.setdefault((nom, True), 'Outil')
+        base = sum(_score_parties(matching, utilisateur, metier))
+        liste = []
+        for (nom, outil), type_element in elements.items():
+            if nom in (utilisateur['logiciels'] if outil else utilisateur['competences']):
+                continue
+            acquis = {**utilisateur, ('logiciels' if outil else 'competences'):
+                      utilisateur['logiciels' if outil else 'competences'] + [nom]}
+            gain = round(sum(_score_parties(matching, acquis, metier)) - base, 2)
+            liste.append({'nom': nom, 'outil': outil, 'type': type_element, 'gain': gain})
+        manques.append(liste)
+
+    partages = {}
+    for liste in manques:
+        for c in liste:
+            partages[(c['nom'], c['outil'])] = partages.get((c['nom'], c['outil']), 0) + 1
+    for liste in manques:
+        for c in liste:
+            c['partage'] = partages[(c['nom'], c['outil'])]
+        liste.sort(key=lambda c: (-c['gain'], -c['partage']))
+    return manques
+
+
+# ---------------------------------------------------------------------------
+# Moteurs optimisés comparés à la référence : (fonction, départage des ex aequo)
+# ---------------------------------------------------------------------------
+
+def _vectoriel(matching, cas):
+    return matching.recommander_metiers(cas['utilisateur'], cas['top_n'], cas['eligibilite_stricte'])
+
+
+def _progressif(matching, cas):
+    etats = list(matching.recommander_metiers_progressif(cas['utilisateur'], cas['top_n'], cas['eligibilite_stricte']))
+    return etats[-1]['recommandations']
+
+
+def _delai(matching, cas):
+    return matching.recommander_metiers_delai(cas['utilisateur'], cas['top_n'], 60.0,
+                                              cas['eligibilite_stricte'])['recommandations']
+
+
+def _archetypes(matching, cas):
+    """Cache à la profondeur de production : les classements servis sont plus courts que ceux enregistrés"""
+    with tempfile.TemporaryDirectory() as dossier:
+        cache = CacheArchetypes(os.path.join(dossier, "archetypes.db"))
+        cache.precalculer(matching, [(profil_canonique(cas['utilisateur']), 1)])
+        cache.charger(matching)
+        recommandations = cache.trouver(matching, cas['utilisateur'], cas['top_n'], cas['eligibilite_stricte'])
+    if recommandations is None:
+        raise AssertionError("profil absent du cache")
+    return recommandations
+
+
+def _pagination(matching, cas):
+    return ClassementsPagines().page(matching, cas['utilisateur'], taille_page=cas['top_n'],
+                                     eligibilite_stricte=cas['eligibilite_stricte'])['recommandations']
+
+
+def ecrire_base(cas, chemin):
+    """Écrit le catalogue d'un cas dans une base SQLite au schéma de employia.db"""
+    conn = sqlite3.connect(chemin)
+    try:
+        with conn:
+            conn.executescript("""
+                CREATE TABLE secteurs (id INTEGER PRIMARY KEY AUTOINCREMENT, nom TEXT NOT NULL);
+                CREATE TABLE metiers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, nom TEXT NOT NULL, secteur_id INTEGER,
+                    diplome_minimum TEXT, niveau_math INTEGER, niveau_info INTEGER,
+                    demande_afrique INTEGER, reconversion_facile INTEGER,
+                    FOREIGN KEY (secteur_id) REFERENCES secteurs(id)
+                );
+                CREATE TABLE competences (id INTEGER PRIMARY KEY AUTOINCREMENT, nom TEXT NOT NULL, type TEXT NOT NULL);
+                CREATE TABLE metier_competences (
+                    metier_id INTEGER, competence_id INTEGER,
+                    FOREIGN KEY (metier_id) REFERENCES metiers(id),
+                    FOREIGN KEY (competence_id) REFERENCES competences(id)
+                );
+            """)
+            catalogue = construire_matching(cas)
+            conn.executemany("INSERT INTO secteurs (id, nom) VALUES (?, ?)", catalogue.catalogue.secteurs.items())
+            conn.executemany("INSERT INTO competences (id, nom, type) VALUES (?, ?, ?)",
+                             catalogue.catalogue.competences)
+            ids_competences = {(nom, type_comp): i for i, nom, type_comp in catalogue.catalogue.competences}
+            catalogue.fermer_connexion()
+            for m in cas['metiers']:
+                conn.execute("""
+                    INSERT INTO metiers (id, nom, secteur_id, diplome_minimum, demande_afrique, reconversion_facile)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (m['id'], m['nom'], m['secteur_id'], m['diplome_minimum'], m['demande_afrique'],
+                      m['reconversion_facile']))
+                conn.executemany(
+                    "INSERT INTO metier_competences (metier_id, competence_id) VALUES (?, ?)",
+                    [(m['id'], ids_competences[(nom, type_comp)])
+                     for cle, type_comp in (('hard_skills', 'Hard Skill'), ('soft_skills', 'Soft Skill'),
+                                            ('tools', 'Tools'))
+                     for nom in m[cle]]
+                )
+    finally:
+        conn.close()
+
+
+def _shards(par):
+    """Coordinateur de shards (processus) sur le catalogue du cas écrit dans une base temporaire"""
+    def moteur(matching, cas):
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, "employia.db")
+            ecrire_base(cas, chemin)
+            with CoordinateurShards(chemin, nb_shards=3, par=par, timeout=30,
+                                    profil_scoring=cas['profil_scoring']) as coordinateur:
+                resultat = coordinateur.recommander_metiers(cas['utilisateur'], cas['top_n'],
+                                                            cas['eligibilite_stricte'])
+        if not resultat['complet']:
+            raise AssertionError(f"shards sans réponse : {resultat['shards_manquants']}")
+        return resultat['recommandations']
+    return moteur
+
+
+def _scorer_lot(matching, cas):
+    """Classement tiré de la matrice de `scorer_lot` (une ligne)"""
+    utilisateur = cas['utilisateur']
+    scores = matching.moteur.scorer_lot([utilisateur], matching.profil_scoring.nom)[0]
+    metiers = matching.catalogue.metiers
+    indices = [j for j in range(len(metiers))
+               if not cas['eligibilite_stricte']
+               or matching.check_diplome_compatible(utilisateur.get('diplome', ''), metiers[j]['diplome_minimum'])]
+    indices.sort(key=lambda j: -scores[j])
+    return [{'id': metiers[j]['id'], 'score': float(scores[j])} for j in indices[:cas['top_n']]]
+
+
+MOTEURS = {
+    'vectoriel': (_vectoriel, 'catalogue'),
+    'progressif': (_progressif, 'catalogue'),
+    'delai': (_delai, 'catalogue'),
+    'archetypes': (_archetypes, 'catalogue'),
+    'pagination': (_pagination, 'demande'),
+    'scorer_lot': (_scorer_lot, 'catalogue'),
+    'shards_hash': (_shards('hash'), 'catalogue'),
+    'shards_secteur': (_shards('secteur'), 'catalogue'),
+}
+
+
+def divergences(cas, moteur):
+    """Écarts entre un moteur et la référence sur un cas (liste vide si équivalents)"""
+    fonction, departage = MOTEURS[moteur]
+    matching = construire_matching(cas)
+    try:
+        obtenues = fonction(matching, cas)
+    except Exception as e:
+        return [f"exception {type(e).__name__}: {e}"]
+    finally:
+        matching.fermer_connexion()
+
+    matching = construire_matching(cas)
+    metiers = matching.catalogue.metiers
+    attendus = classement_reference(matching, cas, departage)
+    ecarts = []
+    ids_attendus = [metiers[j]['id'] for j in attendus]
+    ids_obtenus = [r['id'] for r in obtenues]
+    if ids_obtenus != ids_attendus:
+        ecarts.append(f"classement {ids_obtenus} au lieu de {ids_attendus}")
+        return ecarts
+
+    manques = ecarts_reference(matching, cas['utilisateur'], [metiers[j] for j in attendus])
+    for j, recommandation, manques_attendus in zip(attendus, obtenues, manques):
+        metier = metiers[j]
+        score, detail = matching.calculer_score_metier(cas['utilisateur'], metier, detail=True)
+        if recommandation['score'] != score:
+            ecarts.append(f"métier {metier['id']} : score {recommandation['score']} au lieu de {score}")
+        if recommandation.get('detail') is not None and recommandation['detail'] != detail:
+            ecarts.append(f"métier {metier['id']} : détail {recommandation['detail']} au lieu de {detail}")
+        if 'competences_manquantes' not in recommandation:
+            continue
+        obtenus = [(c['nom'], c['type'] == 'Outil', c['gain'], c['partage'])
+                   for c in recommandation['competences_manquantes']]
+        references = [(c['nom'], c['outil'], c['gain'], c['partage']) for c in manques_attendus]
+        # Les gains sont arrondis au centième : un écart d'un centième vient de l'ordre des additions
+        if sorted((n, o) for n, o, _, _ in obtenus) != sorted((n, o) for n, o, _, _ in references):
+            ecarts.append(f"métier {metier['id']} : manques {obtenus} au lieu de {references}")
+        elif any(abs(g - rg) > 0.0101 or p != rp for (_, _, g, p), (_, _, rg, rp) in
+                 zip(sorted(obtenus), sorted(references))):
+            ecarts.append(f"métier {metier['id']} : gains {obtenus} au lieu de {references}")
+        elif all(g == rg for (_, _, g, _), (_, _, rg, _) in zip(sorted(obtenus), sorted(references))) \
+                and obtenus != references:
+            ecarts.append(f"métier {metier['id']} : ordre des manques {obtenus} au lieu de {references}")
+    matching.fermer_connexion()
+    return ecarts
+
+
+def _taille(cas):
+    return (len(cas['metiers']) + sum(len(m['hard_skills']) + len(m['soft_skills']) + len(m['tools'])
+                                      for m in cas['metiers'])
+            + len(cas['utilisateur']['competences']) + len(cas['utilisateur']['logiciels']) + cas['top_n'])
+
+
+def _reductions(cas):
+    """Cas plus petits d'un cran : un métier, un élément ou un paramètre en moins"""
+    for i in range(len(cas['metiers'])):
+        reduit = copy.deepcopy(cas)
+        del reduit['metiers'][i]
+        yield reduit
+    for i, metier in enumerate(cas['metiers']):
+        for cle in ('hard_skills', 'soft_skills', 'tools'):
+            for k in range(len(metier[cle])):
+                reduit = copy.deepcopy(cas)
+                del reduit['metiers'][i][cle][k]
+                yield reduit
+    for cle in ('competences', 'logiciels'):
+        for k in range(len(cas['utilisateur'][cle])):
+            reduit = copy.deepcopy(cas)
+            del reduit['utilisateur'][cle][k]
+            yield reduit
+    if cas['top_n'] > 1:
+        reduit = copy.deepcopy(cas)
+        reduit['top_n'] = max(1, min(cas['top_n'] - 1, len(cas['metiers'])))
+        yield reduit
+    if cas['eligibilite_stricte']:
+        yield {**copy.deepcopy(cas), 'eligibilite_stricte': False}
+
+
+def reduire(cas, moteur):
+    """Réduit un cas défaillant tant qu'il reste défaillant (plus petit cas trouvé)"""
+    ameliore = True
+    while ameliore:
+        ameliore = False
+        for reduit in _reductions(cas):
+            if _taille(reduit) < _taille(cas) and divergences(reduit, moteur):
+                cas = reduit
+                ameliore = True
+                break
+    return cas
+
+
+def tester(nb_cas=200, graine=0, moteurs=None, nb_metiers_max=12):
+    """
+    Compare chaque moteur à la référence sur `nb_cas` cas aléatoires.
+    Renvoie, par moteur, le nombre d'échecs et le plus petit cas défaillant.
+    """
+    rnd = random.Random(graine)
+    moteurs = list(moteurs or MOTEURS)
+    rapport = {moteur: {'cas': 0, 'echecs': 0, 'plus_petit': None} for moteur in moteurs}
+    for _ in range(nb_cas):
+        cas = generer_cas(rnd, nb_metiers_max)
+        for moteur in moteurs:
+            rapport[moteur]['cas'] += 1
+            if not divergences(cas, moteur):
+                continue
+            rapport[moteur]['echecs'] += 1
+            actuel = rapport[moteur]['plus_petit']
+            if actuel is None or _taille(cas) < _taille(actuel['cas']):
+                reduit = reduire(cas, moteur)
+                if actuel is None or _taille(reduit) < _taille(actuel['cas']):
+                    rapport[moteur]['plus_petit'] = {'cas': reduit, 'divergences': divergences(reduit, moteur)}
+    return rapport
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test différentiel des moteurs de recommandation")
+    parser.add_argument("--cas", type=int, default=200, help="Nombre de cas aléatoires")
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--moteurs", nargs="*", choices=sorted(MOTEURS), default=None,
+                        help="Moteurs à comparer (tous par défaut ; les shards démarrent des processus à chaque cas)")
+    parser.add_argument("--metiers-max", type=int, default=12, help="Taille maximale des catalogues générés")
+    args = parser.parse_args()
+
+    rapport = tester(args.cas, args.graine, args.moteurs, args.metiers_max)
+    print(json.dumps(rapport, indent=2, ensure_ascii=False))
+    raise SystemExit(1 if any(r['echecs'] for r in rapport.values()) else 0)
@@ -0,0 +1,95 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from employia_scoring import PROFIL_DEFAUT, TYPE_HARD, TYPE_OUTIL, TYPE_SOFT
+
+CHAMPS_METIER = ('id', 'nom', 'secteur_id', 'secteur', 'diplome_minimum', 'niveau_math',
+                 'niveau_info', 'demande_afrique', 'reconversion_facile')
+# Libellés des types d'éléments, dans l'ordre des codes TYPE_*
+TYPES_ELEMENTS = [nom for _, nom in sorted({TYPE_HARD: 'Hard Skill', TYPE_SOFT: 'Soft Skill',
+                                            TYPE_OUTIL: 'Tools'}.items())]
+
+
+def catalogue_en_dataframe(moteur):
+    """
+    Une ligne par métier, dans l'ordre du catalogue, avec le nombre de
+    compétences et de logiciels (comptes du moteur, stockés en flottants pour
+    le calcul des scores, exportés en entiers)
+    """
+    metiers = moteur.catalogue.metiers
+    colonnes = {champ: [m[champ] for m in metiers] for champ in CHAMPS_METIER}
+    colonnes['nb_competences'] = moteur.nb_competences.astype(np.int32)
+    colonnes['nb_logiciels'] = moteur.nb_logiciels.astype(np.int32)
+    return pd.DataFrame(colonnes, copy=False)
+
+
+def elements_en_dataframe(moteur):
+    """
+    Compétences et logiciels des métiers, au format long : une ligne par
+    (metier_id, element, type). Éléments et types sont catégoriels, codés par
+    les tableaux de `MoteurScoring.caracteristiques`.
+    """
+    _, debut, elements, types, _ = moteur.caracteristiques()
+    ids = np.array([m['id'] for m in moteur.catalogue.metiers], dtype=np.int64)
+    return pd.DataFrame({
+        'metier_id': np.repeat(ids, np.diff(debut)),
+        'element': pd.Categorical.from_codes(elements, categories=moteur.noms_elements),
+        'type': pd.Categorical.from_codes(types, categories=TYPES_ELEMENTS)
+    }, copy=False)
+
+
+def scores_en_dataframe(moteur, utilisateurs, identifiants=None, profil=PROFIL_DEFAUT, dtype=np.float64):
+    """
+    Matrice des scores (une ligne par utilisateur, une colonne par identifiant
+    de métier) calculée par `MoteurScoring.scorer_lot` ; la matrice est
+    partagée par le DataFrame, sans copie
+    """
+    utilisateurs = list(utilisateurs)
+    if identifiants is None:
+        identifiants = range(len(utilisateurs))
+    matrice = moteur.scorer_lot(utilisateurs, profil, dtype)
+    colonnes = pd.Index([str(m['id']) for m in moteur.catalogue.metiers], name='metier_id')
+    return pd.DataFrame(matrice, index=pd.Index(list(identifiants), name='profil_id'),
+                        columns=colonnes, copy=False)
+
+
+def ecrire(df, chemin):
+    """Écrit un DataFrame en Parquet (.parquet) ou Feather (.feather), via pyarrow"""
+    if chemin.endswith('.parquet'):
+        df.to_parquet(chemin)
+    elif chemin.endswith('.feather'):
+        # Feather ne conserve pas l'index : il devient une colonne
+        if df.index.name is not None:
+            df = df.reset_index()
+        df.to_feather(chemin)
+    else:
+        raise ValueError(f"Format d'export non pris en charge : {chemin}")
+
+
+if __name__ == "__main__":
+    from employia_matching import EmployiaMatching
+    from employia_profils import StockProfils
+
+    parser = argparse.ArgumentParser(description="Export du catalogue et des scores des profils enregistrés")
+    parser.add_argument("--db", default="employia.db", help="Base du catalogue")
+    parser.add_argument("--profils", default="employia_profils.db", help="Base des profils enregistrés")
+    parser.add_argument("--sortie", default="export", help="Dossier de sortie")
+    parser.add_argument("--format", choices=("parquet", "feather"), default="parquet")
+    parser.add_argument("--profil-scoring", default=PROFIL_DEFAUT)
+    args = parser.parse_args()
+
+    matching = EmployiaMatching(args.db)
+    moteur = matching.moteur
+    os.makedirs(args.sortie, exist_ok=True)
+    ecrire(catalogue_en_dataframe(moteur), os.path.join(args.sortie, f"catalogue.{args.format}"))
+    ecrire(elements_en_dataframe(moteur), os.path.join(args.sortie, f"elements.{args.format}"))
+    if os.path.exists(args.profils):
+        stock = StockProfils(matching, args.profils)
+        scores = scores_en_dataframe(moteur, stock.profils.values(), stock.profils.keys(), args.profil_scoring)
+        ecrire(scores, os.path.join(args.sortie, f"scores.{args.format}"))
+        print(f"{len(stock)} profils x {len(moteur)} métiers exportés dans {args.sortie}")
+    else:
+        print(f"Catalogue ({len(moteur)} métiers) exporté dans {args.sortie}")
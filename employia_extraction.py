@@ -0,0 +1,207 @@
+import os
+import re
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from employia_normalisation import charger_alias
+
+
+def _plier(caractere):
+    """Caractère minuscule sans accent, ou espace s'il n'est pas alphanumérique"""
+    base = unicodedata.normalize('NFKD', caractere)[0].lower()
+    if ('a' <= base <= 'z') or ('0' <= base <= '9') or base in '+#.':
+        return base
+    return ' '
+
+
+class _Pliage(dict):
+    def __missing__(self, caractere):
+        self[caractere] = _plier(caractere)
+        return self[caractere]
+
+
+_PLIAGE = _Pliage()
+
+
+def plier_texte(texte):
+    """
+    Normalise un texte caractère par caractère (espaces consécutifs fusionnés).
+    Renvoie (texte normalisé, position d'origine de chaque caractère).
+    """
+    caracteres = []
+    positions = []
+    for i, c in enumerate(texte):
+        p = _PLIAGE[c]
+        if p == ' ' and (not caracteres or caracteres[-1] == ' '):
+            continue
+        caracteres.append(p)
+        positions.append(i)
+    return ''.join(caracteres), positions
+
+
+class AutomateCompetences:
+    def __init__(self, competences, alias=None):
+        """
+        Automate d'Aho-Corasick sur les noms de compétences et leurs alias.
+
+        Un document est parcouru en une seule passe ; seules les occurrences
+        délimitées par des espaces (mots entiers) sont retenues. Les noms de
+        trois caractères au plus ('R', 'RH', 'SAS') doivent apparaître avec leur
+        casse d'origine ou en majuscules.
+        """
+        self._transitions = [{}]
+        self._echec = [0]
+        self._sorties = [[]]
+
+        par_nom = {}
+        motifs = []
+        for competence in competences:
+            par_nom.setdefault(competence[1], competence)
+            motifs.append((competence[1], competence))
+        for texte, nom in (alias if alias is not None else charger_alias()).items():
+            if nom in par_nom:
+                motifs.append((texte, par_nom[nom]))
+
+        vus = set()
+        for texte, competence in motifs:
+            motif = plier_texte(texte)[0].strip()
+            if not motif or motif in vus:
+                continue
+            vus.add(motif)
+            etat = 0
+            for c in motif:
+                suivant = self._transitions[etat].get(c)
+                if suivant is None:
+                    suivant = len(self._transitions)
+                    self._transitions[etat][c] = suivant
+                    self._transitions.append({})
+                    self._echec.append(0)
+                    self._sorties.append([])
+                etat = suivant
+            sensible = texte if len(motif) <= 3 else None
+            self._sorties[etat].append((len(motif), competence, sensible))
+
+        # Liens d'échec en largeur
+        file = deque(self._transitions[0].values())
+        while file:
+            etat = file.popleft()
+            for c, suivant in self._transitions[etat].items():
+                file.append(suivant)
+                repli = self._echec[etat]
+                while repli and c not in self._transitions[repli]:
+                    repli = self._echec[repli]
+                cible = self._transitions[repli].get(c, 0)
+                self._echec[suivant] = cible if cible != suivant else 0
+                self._sorties[suivant] = self._sorties[suivant] + self._sorties[self._echec[suivant]]
+
+    def occurrences(self, texte):
+        """Occurrences (debut, fin, competence) des compétences, sans chevauchement"""
+        plie, positions = plier_texte(texte)
+        transitions, echec, sorties = self._transitions, self._echec, self._sorties
+
+        trouvees = []
+        etat = 0
+        for fin, c in enumerate(plie, 1):
+            while etat and c not in transitions[etat]:
+                etat = echec[etat]
+            etat = transitions[etat].get(c, 0)
+            for longueur, competence, sensible in sorties[etat]:
+                debut = fin - longueur
+                if debut > 0 and plie[debut - 1] != ' ':
+                    continue
+                if fin < len(plie) and plie[fin] != ' ':
+                    # Un point final ('Python.') ne fait pas partie du mot
+                    if not (plie[fin] == '.' and (fin + 1 == len(plie) or plie[fin + 1] == ' ')):
+                        continue
+                if sensible is not None:
+                    origine = texte[positions[debut]:positions[fin - 1] + 1]
+                    if origine not in (sensible, sensible.upper()):
+                        continue
+                trouvees.append((debut, fin, competence))
+
+        # Plus longue occurrence d'abord en cas de chevauchement
+        trouvees.sort(key=lambda t: (t[0], -(t[1] - t[0])))
+        retenues = []
+        limite = 0
+        for debut, fin, competence in trouvees:
+            if debut >= limite:
+                retenues.append((positions[debut], positions[fin - 1] + 1, competence))
+                limite = fin
+        return retenues
+
+    def extraire(self, texte):
+        """Compétences trouvées, classées : {'hard_skills', 'soft_skills', 'tools'}"""
+        resultat = {'hard_skills': [], 'soft_skills': [], 'tools': []}
+        cles = {'Hard Skill': 'hard_skills', 'Soft Skill': 'soft_skills', 'Tools': 'tools'}
+        for _, _, (_, nom, type_comp) in self.occurrences(texte):
+            liste = resultat[cles.get(type_comp, 'hard_skills')]
+            if nom not in liste:
+                liste.append(nom)
+        return resultat
+
+
+# Mentions de diplômes : (diplôme, motif, sur le texte brut). Les motifs portent sur le
+# texte plié (minuscules sans accents) ; les sigles qui sont aussi des mots courants
+# ('cap', 'but') ne sont reconnus qu'en majuscules, sur le texte brut. 'Autre' n'est
+# pas détectable : c'est un choix du formulaire, pas une mention de CV.
+MOTIFS_DIPLOMES = [
+    ('Doctorat', re.compile(r"\b(doctorat|doctorate|phd|ph\.d)\b"), False),
+    ('Master', re.compile(r"\b(master|mastere|msc|mba|m2|dea|dess|diplome d ingenieur)\b"), False),
+    ('Licence', re.compile(r"\b(licence|bachelor|l3)\b"), False),
+    ('BTS', re.compile(r"\b(bts|dut|deug)\b"), False),
+    ('BTS', re.compile(r"\bBUT\b"), True),
+    ('Bac', re.compile(r"\b(bac|baccalaureat)\b"), False),
+    ('BEP', re.compile(r"\bbep\b"), False),
+    ('CAP', re.compile(r"\bCAP\b"), True),
+]
+# 'Bac+N' : diplôme correspondant au nombre d'années après le bac
+_BAC_PLUS = re.compile(r"\bbac\s*\+\s*(\d+)")
+DIPLOMES_BAC_PLUS = {0: 'Bac', 1: 'Bac', 2: 'BTS', 3: 'Licence', 4: 'Licence', 5: 'Master',
+                     6: 'Master', 7: 'Master', 8: 'Doctorat'}
+
+
+def detecter_diplome(texte, niveaux):
+    """Diplôme de plus haut rang cité dans le texte (parmi ceux de `niveaux`), ou None"""
+    plie = plier_texte(texte)[0]
+    trouves = {diplome for diplome, motif, brut in MOTIFS_DIPLOMES if motif.search(texte if brut else plie)}
+    trouves.update(DIPLOMES_BAC_PLUS[min(int(n), 8)] for n in _BAC_PLUS.findall(plie))
+    trouves &= set(niveaux)
+    return max(trouves, key=lambda d: niveaux[d]) if trouves else None
+
+
+_MATCHING_PROCESSUS = None
+
+
+def _initialiser_processus(db_path):
+    """Charge le catalogue et compile l'automate une fois par processus"""
+    global _MATCHING_PROCESSUS
+    from employia_matching import EmployiaMatching
+    _MATCHING_PROCESSUS = EmployiaMatching(db_path)
+    _MATCHING_PROCESSUS.catalogue.extracteur
+
+
+def _traiter_fichier(chemin, top_n):
+    """Profil et recommandations d'un fichier texte de CV"""
+    with open(chemin, encoding="utf-8", errors="replace") as f:
+        texte = f.read()
+    profil = _MATCHING_PROCESSUS.profil_depuis_cv(texte)
+    recommandations = _MATCHING_PROCESSUS.recommander_metiers(profil, top_n) if top_n else None
+    return chemin, profil, recommandations
+
+
+def extraire_dossier(dossier, db_path="employia.db", top_n=5, processus=None, extension=".txt"):
+    """
+    Extrait les profils (et recommandations) de tous les CV texte d'un dossier,
+    en parallèle sur plusieurs processus. Renvoie {chemin: (profil, recommandations)}.
+    """
+    chemins = sorted(
+        os.path.join(dossier, nom) for nom in os.listdir(dossier) if nom.endswith(extension)
+    )
+    resultats = {}
+    with ProcessPoolExecutor(max_workers=processus, initializer=_initialiser_processus,
+                             initargs=(db_path,)) as executeur:
+        for chemin, profil, recommandations in executeur.map(
+                _traiter_fichier, chemins, [top_n] * len(chemins), chunksize=8):
+            resultats[chemin] = (profil, recommandations)
+    return resultats
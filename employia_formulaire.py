@@ -0,0 +1,33 @@
+import sqlite3
+from contextlib import contextmanager
+
+# Choix proposés par le formulaire de l'application
+DIPLOMES_FORMULAIRE = ["Bac", "BTS", "Licence", "Master", "Doctorat", "Autre"]
+# Attente de l'application après une soumission, pendant l'affichage de l'analyse (secondes)
+PAUSE_SOUMISSION = 1.0
+
+
+@contextmanager
+def get_db_connection(db_path="employia.db"):
+    """Connexion SQLite ouverte pour un seul usage, fermée à la sortie du bloc"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def get_secteurs(db_path="employia.db"):
+    """Secteurs proposés comme centres d'intérêt, par ordre alphabétique"""
+    with get_db_connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT nom FROM secteurs ORDER BY nom")
+        return [s[0] for s in cursor.fetchall()]
+
+
+def get_all_competences(db_path="employia.db"):
+    """Compétences proposées (nom, type), par ordre alphabétique"""
+    with get_db_connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT nom, type FROM competences ORDER BY nom")
+        return cursor.fetchall()
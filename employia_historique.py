@@ -0,0 +1,177 @@
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from employia_matching import manquantes_affichees
+
+_FIN = object()
+
+
+class JournalUtilisation:
+    def __init__(self, db_path="employia_historique.db", taille_lot=500,
+                 delai_lot=0.2, capacite=10000, attente_max=0.0, agregateurs=None):
+        """
+        Journal d'utilisation en ajout seul, écrit par un thread de fond.
+
+        Le chemin de requête ne fait qu'un dépôt dans une file bornée ; le
+        thread d'écriture regroupe les événements en transactions (WAL,
+        executemany). Si la file est pleine, l'événement est rejeté
+        (compté dans `evenements_rejetes`) après au plus `attente_max` secondes.
+        Une fois le journal fermé, `enregistrer` refuse tout événement.
+        Les `agregateurs` (installer/mettre_a_jour) sont mis à jour dans la
+        même transaction que chaque lot.
+        """
+        self.db_path = db_path
+        self.taille_lot = taille_lot
+        self.delai_lot = delai_lot
+        self.attente_max = attente_max
+        self.agregateurs = list(agregateurs or [])
+        self.evenements_rejetes = 0
+        self.evenements_ecrits = 0
+        self._file = queue.Queue(maxsize=capacite)
+        self._ferme = False
+        # Test de fermeture et dépôt atomiques : rien n'entre dans la file après le marqueur de fin
+        self._verrou = threading.Lock()
+
+        conn = self._connecter()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS evenements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                horodatage REAL NOT NULL,
+                session TEXT,
+                type TEXT NOT NULL,
+                donnees TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_evenements_horodatage ON evenements(horodatage)")
+        conn.commit()
+        for agregateur in self.agregateurs:
+            agregateur.installer(conn)
+        self._conn = conn
+
+        self._thread = threading.Thread(target=self._boucle_ecriture,
+                                        name="journal-utilisation", daemon=True)
+        self._thread.start()
+        atexit.register(self.fermer)
+
+    def _connecter(self):
+        """Ouvre une connexion configurée pour des écritures groupées"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def enregistrer(self, type_evenement, donnees=None, session=None):
+        """Dépose un événement sans bloquer ; renvoie False s'il a été rejeté (file pleine, journal fermé)"""
+        evenement = (time.time(), session, type_evenement, donnees)
+        with self._verrou:
+            if self._ferme:
+                return False
+            try:
+                if self.attente_max > 0:
+                    self._file.put(evenement, timeout=self.attente_max)
+                else:
+                    self._file.put_nowait(evenement)
+            except queue.Full:
+                self.evenements_rejetes += 1
+                return False
+        return True
+
+    def enregistrer_recommandations(self, utilisateur, recommandations, session=None):
+        """
+        Journalise une soumission de profil, ses résultats et les compétences
+        manquantes affichées (`manquantes_affichees`), pas les listes complètes
+        """
+        self.enregistrer('profil_soumis', utilisateur, session)
+        self.enregistrer('recommandations_affichees', {
+            'diplome': utilisateur.get('diplome', ''),
+            'resultats': [(r['metier'], r['secteur'], r['score']) for r in recommandations]
+        }, session)
+        self.enregistrer('competences_manquantes', [
+            c['nom'] for r in recommandations for c in manquantes_affichees(r['competences_manquantes'])
+        ], session)
+
+    def _boucle_ecriture(self):
+        """Vide la file par lots jusqu'à la réception du marqueur de fin"""
+        while True:
+            try:
+                premier = self._file.get(timeout=self.delai_lot)
+            except queue.Empty:
+                continue
+
+            lot = [premier]
+            while len(lot) < self.taille_lot:
+                try:
+                    lot.append(self._file.get_nowait())
+                except queue.Empty:
+                    break
+
+            fin = any(e is _FIN for e in lot)
+            evenements = [e for e in lot if e is not _FIN]
+            if evenements:
+                self._ecrire_lot(evenements)
+            for _ in lot:
+                self._file.task_done()
+            if fin:
+                return
+
+    def _ecrire_lot(self, evenements):
+        """Insère un lot d'événements dans une seule transaction"""
+        try:
+            lignes = [
+                (horodatage, session, type_evenement,
+                 json.dumps(donnees, ensure_ascii=False, default=str))
+                for horodatage, session, type_evenement, donnees in evenements
+            ]
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO evenements (horodatage, session, type, donnees) VALUES (?, ?, ?, ?)",
+                    lignes
+                )
+                for agregateur in self.agregateurs:
+                    agregateur.mettre_a_jour(self._conn, evenements)
+            self.evenements_ecrits += len(lignes)
+        except Exception:
+            # Base indisponible, donnée non sérialisable ou agrégateur en échec :
+            # le lot est rejeté, le thread d'écriture continue
+            self.evenements_rejetes += len(evenements)
+
+    def vider(self):
+        """Attend que tous les événements déposés soient écrits"""
+        self._file.join()
+
+    def fermer(self):
+        """Écrit les événements en attente puis arrête le thread d'écriture"""
+        with self._verrou:
+            if self._ferme:
+                return
+            self._ferme = True
+            self._file.put(_FIN)
+        self._thread.join()
+        self._conn.close()
+        atexit.unregister(self.fermer)
+
+    def evenements(self, type_evenement=None, depuis=None, jusqu_a=None):
+        """Parcourt les événements écrits, dans l'ordre d'arrivée"""
+        requete = "SELECT horodatage, session, type, donnees FROM evenements WHERE 1=1"
+        params = []
+        if type_evenement is not None:
+            requete += " AND type = ?"
+            params.append(type_evenement)
+        if depuis is not None:
+            requete += " AND horodatage >= ?"
+            params.append(depuis)
+        if jusqu_a is not None:
+            requete += " AND horodatage < ?"
+            params.append(jusqu_a)
+        requete += " ORDER BY id"
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for horodatage, session, type_ev, donnees in conn.execute(requete, params):
+                yield horodatage, session, type_ev, json.loads(donnees)
+        finally:
+            conn.close()
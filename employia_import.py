@@ -0,0 +1,295 @@
+import argparse
+import csv
+import functools
+import json
+import operator
+import sqlite3
+import time
+
+from employia_normalisation import normaliser_texte
+
+# Les mêmes noms reviennent sur des millions de lignes
+_cle = functools.lru_cache(maxsize=None)(normaliser_texte)
+
+CHAMPS_METIER = ('diplome_minimum', 'niveau_math', 'niveau_info',
+                 'demande_afrique', 'reconversion_facile')
+LISTES = (('hard_skills', 'Hard Skill'), ('soft_skills', 'Soft Skill'), ('tools', 'Tools'))
+SEPARATEUR_LISTE = '|'
+# Ordre des champs des lignes produites par lire_source
+COLONNES = ('nom', 'secteur') + CHAMPS_METIER + tuple(cle for cle, _ in LISTES)
+
+# Unicité des associations : les doublons sont écartés par INSERT OR IGNORE
+INDEX_PAIRES = "idx_metier_competences_paire"
+# Préfixe de l'index unique, supprimé à sa création
+INDEX_REMPLACE = "idx_metier_competences_metier"
+
+# Index du catalogue, (re)créés à la fin de chaque import ; les recherches par
+# métier passent par l'index unique des associations
+INDEX_CATALOGUE = [
+    "CREATE INDEX IF NOT EXISTS idx_metier_competences_competence ON metier_competences(competence_id)",
+]
+
+
+@functools.lru_cache(maxsize=None)
+def _entier(valeur):
+    """Convertit un champ numérique optionnel (peu de valeurs distinctes : mémoïsé)"""
+    if valeur in (None, ''):
+        return None
+    return int(valeur)
+
+
+def lire_source(chemin):
+    """
+    Parcourt les métiers d'un fichier source, ligne à ligne, en tuples ordonnés
+    selon COLONNES (champ absent : None).
+    CSV : colonnes nom, secteur, diplome_minimum, ..., hard_skills, soft_skills,
+    tools (listes séparées par '|', laissées brutes). JSON Lines (.jsonl) ou
+    tableau JSON (.json) : mêmes clés, listes en tableaux.
+    """
+    if chemin.endswith('.csv'):
+        with open(chemin, newline='', encoding='utf-8') as f:
+            lecteur = csv.reader(f)
+            entete = [c.strip() for c in next(lecteur, [])]
+            # Colonne absente : lue dans la case ajoutée en fin de ligne
+            largeur = len(entete) + 1
+            extraire = operator.itemgetter(*(entete.index(c) if c in entete else len(entete)
+                                             for c in COLONNES))
+            for ligne in lecteur:
+                if not ligne:
+                    continue
+                if len(ligne) < largeur:
+                    ligne += [None] * (largeur - len(ligne))
+                yield extraire(ligne)
+    elif chemin.endswith('.jsonl'):
+        with open(chemin, encoding='utf-8') as f:
+            for ligne in f:
+                if ligne.strip():
+                    ligne = json.loads(ligne)
+                    yield tuple(ligne.get(c) for c in COLONNES)
+    elif chemin.endswith('.json'):
+        with open(chemin, encoding='utf-8') as f:
+            for ligne in json.load(f):
+                yield tuple(ligne.get(c) for c in COLONNES)
+    else:
+        raise ValueError(f"Format de source non pris en charge : {chemin}")
+
+
+class ImportCatalogue:
+    def __init__(self, db_path="employia.db", taille_lot=50000):
+        """
+        Import en masse de métiers et de leurs compétences dans la base.
+
+        Secteurs, compétences et métiers sont dédoublonnés par nom normalisé
+        (et par type / secteur) en mémoire, les associations par un index unique
+        (metier_id, competence_id) ; un second import du même fichier ne
+        modifie rien. La version du catalogue (PRAGMA user_version) n'est
+        incrémentée que si l'import a ajouté ou modifié quelque chose.
+        """
+        self.db_path = db_path
+        self.taille_lot = taille_lot
+
+    def importer(self, chemins):
+        """Importe les fichiers sources dans une seule transaction ; renvoie des statistiques"""
+        debut = time.perf_counter()
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -200000")
+        stats = {'lignes': 0, 'metiers_ajoutes': 0, 'metiers_modifies': 0,
+                 'competences_ajoutees': 0, 'secteurs_ajoutes': 0, 'associations_ajoutees': 0,
+                 'doublons_retires': 0}
+        try:
+            conn.execute("BEGIN")
+            self._indexer_paires(conn, stats)
+            self._charger_existant(conn)
+
+            for chemin in chemins:
+                for ligne in lire_source(chemin):
+                    self._traiter(ligne, stats)
+                    if len(self._associations) >= self.taille_lot:
+                        self._vider(conn, stats)
+            self._vider(conn, stats)
+
+            for sql in (self._index or []) + INDEX_CATALOGUE:
+                conn.execute(sql)
+            # Import sans effet : la version reste, caches et curseurs restent valides
+            if any(n for cle, n in stats.items() if cle != 'lignes'):
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        stats['duree'] = round(time.perf_counter() - debut, 3)
+        stats['lignes_par_seconde'] = round(stats['lignes'] / stats['duree']) if stats['duree'] else 0
+        return stats
+
+    @staticmethod
+    def _indexer_paires(conn, stats):
+        """Crée l'index unique des associations s'il manque, après retrait des doublons"""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                        (INDEX_PAIRES,)).fetchone():
+            return
+        stats['doublons_retires'] = conn.execute("""
+            DELETE FROM metier_competences WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM metier_competences GROUP BY metier_id, competence_id)
+        """).rowcount
+        conn.execute(f"CREATE UNIQUE INDEX {INDEX_PAIRES} ON metier_competences(metier_id, competence_id)")
+        conn.execute(f"DROP INDEX IF EXISTS {INDEX_REMPLACE}")
+
+    def _charger_existant(self, conn):
+        """
+        Charge en mémoire les identifiants existants, indexés par clé normalisée.
+        Lecture par id décroissant : en cas de doublon, le plus petit id l'emporte.
+        """
+        self._secteurs = {_cle(nom): id_ for id_, nom in
+                          conn.execute("SELECT id, nom FROM secteurs ORDER BY id DESC")}
+        self._competences = {(_cle(nom), type_comp): id_ for id_, nom, type_comp in
+                             conn.execute("SELECT id, nom, type FROM competences ORDER BY id DESC")}
+        self._metiers = {}
+        for ligne in conn.execute(f"""
+            SELECT id, nom, secteur_id, {", ".join(CHAMPS_METIER)} FROM metiers ORDER BY id DESC
+        """):
+            self._metiers[(_cle(ligne[1]), ligne[2])] = (ligne[0], ligne[3:])
+        # Nom brut (tel que lu dans la source) -> identifiant en texte, par type ; '' : nom vide
+        self._competences_brutes = {type_comp: {} for _, type_comp in LISTES}
+
+        self._prochain = {}
+        for table in ('secteurs', 'competences', 'metiers'):
+            self._prochain[table] = (conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0) + 1
+
+        self._nouveaux_secteurs = []
+        self._nouvelles_competences = []
+        self._nouveaux_metiers = []
+        self._metiers_modifies = []
+        self._associations = []
+        # Définitions des index supprimés par _vider (None : aucun)
+        self._index = None
+
+    def _supprimer_index(self, conn):
+        """Supprime les index des tables chargées (sauf l'index unique des associations) et renvoie leur définition"""
+        index = conn.execute("""
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL AND name != ?
+              AND tbl_name IN ('metiers', 'competences', 'metier_competences', 'secteurs')
+        """, (INDEX_PAIRES,)).fetchall()
+        for nom, _ in index:
+            conn.execute(f'DROP INDEX "{nom}"')
+        return [sql for _, sql in index]
+
+    def _identifiant(self, table):
+        """Réserve le prochain identifiant d'une table"""
+        id_ = self._prochain[table]
+        self._prochain[table] += 1
+        return id_
+
+    def _traiter(self, ligne, stats):
+        """Résout les identifiants d'une ligne source et prépare ses insertions"""
+        stats['lignes'] += 1
+        nom, secteur, diplome, math, info, demande, reconversion, *listes = ligne
+        nom = (nom or '').strip()
+        if not nom:
+            return
+
+        secteur = (secteur or '').strip()
+        cle_secteur = _cle(secteur)
+        secteur_id = self._secteurs.get(cle_secteur)
+        if secteur_id is None:
+            secteur_id = self._identifiant('secteurs')
+            self._secteurs[cle_secteur] = secteur_id
+            self._nouveaux_secteurs.append((secteur_id, secteur))
+            stats['secteurs_ajoutes'] += 1
+
+        valeurs = (
+            (diplome or '').strip() or None,
+            _entier(math),
+            _entier(info),
+            _entier(demande),
+            _entier(reconversion),
+        )
+        cle_metier = (_cle(nom), secteur_id)
+        existant = self._metiers.get(cle_metier)
+        if existant is None:
+            metier_id = self._identifiant('metiers')
+            self._nouveaux_metiers.append((metier_id, nom, secteur_id) + valeurs)
+            stats['metiers_ajoutes'] += 1
+        else:
+            metier_id = existant[0]
+            if tuple(existant[1]) != valeurs:
+                self._metiers_modifies.append(valeurs + (metier_id,))
+                stats['metiers_modifies'] += 1
+        self._metiers[cle_metier] = (metier_id, valeurs)
+
+        # Boucle chaude : les noms bruts déjà vus sont résolus sans normalisation, et les
+        # compétences du métier partent en un seul tableau JSON, déplié par SQLite
+        ids = []
+        for (_, type_comp), competences in zip(LISTES, listes):
+            if not competences:
+                continue
+            if isinstance(competences, str):
+                competences = competences.split(SEPARATEUR_LISTE)
+            trouves = list(map(self._competences_brutes[type_comp].get, competences))
+            if None in trouves:
+                trouves = [self._resoudre_competence(c, type_comp, stats) if i is None else i
+                           for c, i in zip(competences, trouves)]
+            ids += trouves
+        if ids:
+            self._associations.append((metier_id, f"[{','.join(filter(None, ids))}]"))
+
+    def _resoudre_competence(self, competence, type_comp, stats):
+        """Identifiant (en texte) d'une compétence par nom normalisé, créée si besoin ('' pour un nom vide)"""
+        brut, competence = competence, competence.strip()
+        if not competence:
+            self._competences_brutes[type_comp][brut] = ''
+            return ''
+        cle_competence = (_cle(competence), type_comp)
+        competence_id = self._competences.get(cle_competence)
+        if competence_id is None:
+            competence_id = self._identifiant('competences')
+            self._competences[cle_competence] = competence_id
+            self._nouvelles_competences.append((competence_id, competence, type_comp))
+            stats['competences_ajoutees'] += 1
+        self._competences_brutes[type_comp][brut] = competence_id = str(competence_id)
+        return competence_id
+
+    def _vider(self, conn, stats):
+        """Écrit les lots en attente avec executemany"""
+        # Index supprimés au premier lot qui ajoute des lignes au catalogue : un import
+        # qui ne fait que retrouver l'existant ne les reconstruit pas
+        if self._index is None and (self._nouveaux_secteurs or self._nouvelles_competences
+                                    or self._nouveaux_metiers):
+            self._index = self._supprimer_index(conn)
+        conn.executemany("INSERT INTO secteurs (id, nom) VALUES (?, ?)", self._nouveaux_secteurs)
+        conn.executemany("INSERT INTO competences (id, nom, type) VALUES (?, ?, ?)",
+                         self._nouvelles_competences)
+        conn.executemany(f"""
+            INSERT INTO metiers (id, nom, secteur_id, {", ".join(CHAMPS_METIER)})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, self._nouveaux_metiers)
+        conn.executemany(f"""
+            UPDATE metiers SET {", ".join(f"{c} = ?" for c in CHAMPS_METIER)} WHERE id = ?
+        """, self._metiers_modifies)
+        avant = conn.total_changes
+        conn.executemany("""
+            INSERT OR IGNORE INTO metier_competences (metier_id, competence_id)
+            SELECT ?, value FROM json_each(?)
+        """, self._associations)
+        stats['associations_ajoutees'] += conn.total_changes - avant
+        self._nouveaux_secteurs = []
+        self._nouvelles_competences = []
+        self._nouveaux_metiers = []
+        self._metiers_modifies = []
+        self._associations = []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import en masse de métiers dans employia.db")
+    parser.add_argument("sources", nargs="+", help="Fichiers .csv, .jsonl ou .json")
+    parser.add_argument("--db", default="employia.db", help="Base SQLite cible")
+    parser.add_argument("--taille-lot", type=int, default=50000)
+    args = parser.parse_args()
+
+    resultat = ImportCatalogue(args.db, args.taille_lot).importer(args.sources)
+    print(json.dumps(resultat, indent=2, ensure_ascii=False))
@@ -1,78 +1,67 @@
 import sqlite3
+import time
+from collections import Counter
+
+from employia_catalogue import Catalogue
+from employia_extraction import detecter_diplome
+from employia_scoring import (MoteurScoring, PROFIL_DEFAUT, TYPE_HARD, TYPE_OUTIL, TYPE_SOFT,
+                              charger_profils_scoring, classer, detail_metier)
+
+# Compétences manquantes affichées par priorité (voir `manquantes_affichees`)
+LIMITES_MANQUANTES = {'Haute': 3, 'Moyenne': 2, 'Basse': 2}
 
 class EmployiaMatching:
-    def __init__(self, db_path="employia.db"):
-        """Initialise la connexion à la base de données"""
+    # Libellé et priorité des compétences manquantes, par type d'élément (hard skill, soft skill, outil)
+    TYPES_MANQUANTES = {TYPE_HARD: ('Hard Skill', 'Haute'), TYPE_SOFT: ('Soft Skill', 'Basse'),
+                        TYPE_OUTIL: ('Outil', 'Moyenne')}
+    
+    def __init__(self, db_path="employia.db", profil_scoring=PROFIL_DEFAUT, catalogue=None, archetypes=None):
+        """
+        Initialise la connexion à la base de données.
+        `archetypes` (CacheArchetypes) sert les profils fréquents sans calcul de score.
+        """
+        self.db_path = db_path
         self.conn = sqlite3.connect(db_path)
         self.cursor = self.conn.cursor()
+        self._catalogue = catalogue
+        self._moteur = None
+        self.archetypes = archetypes
+        self.profils_scoring = charger_profils_scoring()
+        self.profil_scoring = self.profils_scoring[profil_scoring]
+    
+    @property
+    def catalogue(self):
+        """Catalogue des métiers, chargé une seule fois"""
+        if self._catalogue is None:
+            self._catalogue = Catalogue.depuis_base(self.db_path)
+        return self._catalogue
+    
+    @property
+    def moteur(self):
+        """Moteur de score vectorisé, compilé une seule fois pour le catalogue"""
+        if self._moteur is None:
+            self._moteur = MoteurScoring(self.catalogue, self.profils_scoring)
+        return self._moteur
         
     def get_all_metiers_with_competences(self):
         """Récupère tous les métiers avec leurs compétences associées"""
-        self.cursor.execute("""
-            SELECT m.id, m.nom, m.secteur_id, s.nom as secteur_nom,
-                   m.diplome_minimum, m.niveau_math, m.niveau_info,
-                   m.demande_afrique, m.reconversion_facile
-            FROM metiers m
-            JOIN secteurs s ON m.secteur_id = s.id
-        """)
-        metiers = self.cursor.fetchall()
-        
-        metiers_complets = []
-        for m in metiers:
-            self.cursor.execute("""
-                SELECT c.id, c.nom, c.type
-                FROM competences c
-                JOIN metier_competences mc ON c.id = mc.competence_id
-                WHERE mc.metier_id = ?
-            """, (m[0],))
-            competences = self.cursor.fetchall()
-            
-            hard_skills = [c[1] for c in competences if c[2] == 'Hard Skill']
-            soft_skills = [c[1] for c in competences if c[2] == 'Soft Skill']
-            tools = [c[1] for c in competences if c[2] == 'Tools']
-            
-            metiers_complets.append({
-                'id': m[0],
-                'nom': m[1],
-                'secteur_id': m[2],
-                'secteur': m[3],
-                'diplome_minimum': m[4],
-                'niveau_math': m[5],
-                'niveau_info': m[6],
-                'demande_afrique': m[7],
-                'reconversion_facile': m[8],
-                'hard_skills': hard_skills,
-                'soft_skills': soft_skills,
-                'tools': tools,
-                'toutes_competences': hard_skills + soft_skills + tools
-            })
-        
-        return metiers_complets
+        return self.catalogue.metiers
     
     def check_diplome_compatible(self, diplome_utilisateur, diplome_requis):
         """Vérifie si le diplôme de l'utilisateur est compatible avec le diplôme requis"""
-        niveaux = {
-            'CAP': 1,
-            'BEP': 1,
-            'Bac': 2,
-            'BTS': 3,
-            'Licence': 4,
-            'Master': 5,
-            'Doctorat': 6
-        }
-        
-        diplome_requis_min = diplome_requis.split(' / ')[0]
-        
-        niveau_user = niveaux.get(diplome_utilisateur, 0)
-        niveau_requis = niveaux.get(diplome_requis_min, 0)
+        niveau_user = self.profil_scoring.niveau(diplome_utilisateur)
+        niveau_requis = self.profil_scoring.niveau_requis(diplome_requis)
         
         return 1 if niveau_user >= niveau_requis else 0
     
-    def calculer_score_metier(self, utilisateur, metier):
+    def calculer_score_metier(self, utilisateur, metier, detail=False):
         """
         Calcule le score d'adéquation pour un métier
         Score = (compétences × 50%) + (diplôme × 30%) + (logiciels × 20%)
+        (pondérations du profil de scoring choisi)
+        Avec `detail`, renvoie (score, composantes du score).
         """
+        profil = self.profil_scoring
         competences_user = set(utilisateur.get('competences', []))
         logiciels_user = set(utilisateur.get('logiciels', []))
         
@@ -82,98 +71,247 @@ class EmployiaMatching:
         # Score Compétences (50%)
         if competences_metier:
             competences_communes = competences_user & competences_metier
-            score_competences = (len(competences_communes) / len(competences_metier)) * 50
+            score_competences = (len(competences_communes) / len(competences_metier)) * profil.poids_competences
         else:
-            score_competences = 25
+            competences_communes = set()
+            score_competences = profil.score_competences_vide
+        score_competences_base = score_competences
         
         # Bonus pour compétences clés
-        competences_cles = ['Python', 'SQL', 'JavaScript', 'Gestion de Projet', 'Excel']
-        for comp_cle in competences_cles:
+        for comp_cle in profil.competences_cles:
             if comp_cle in competences_communes:
-                score_competences += 2
-        score_competences = min(score_competences, 50)
+                score_competences += profil.bonus_competence_cle
+        score_competences = min(score_competences, profil.poids_competences)
         
         # Score Diplôme (30%)
         diplome_compatible = self.check_diplome_compatible(
             utilisateur.get('diplome', ''), 
             metier['diplome_minimum']
         )
-        score_diplome = diplome_compatible * 30
+        score_diplome = diplome_compatible * profil.poids_diplome
         
         # Score Logiciels (20%)
         if logiciels_metier:
             logiciels_communs = logiciels_user & logiciels_metier
-            score_logiciels = (len(logiciels_communs) / len(logiciels_metier)) * 20
+            score_logiciels = (len(logiciels_communs) / len(logiciels_metier)) * profil.poids_logiciels
         else:
-            score_logiciels = 10
+            logiciels_communs = set()
+            score_logiciels = profil.score_logiciels_vide
         
         score_total = score_competences + score_diplome + score_logiciels
         
+        if detail:
+            return round(score_total, 2), {
+                'competences': round(float(score_competences_base), 2),
+                'bonus': round(float(score_competences - score_competences_base), 2),
+                'diplome': round(float(score_diplome), 2),
+                'logiciels': round(float(score_logiciels), 2),
+                'nb_competences_communes': len(competences_communes),
+                'nb_competences': len(competences_metier),
+                'nb_logiciels_communs': len(logiciels_communs),
+                'nb_logiciels': len(logiciels_metier)
+            }
         return round(score_total, 2)
     
-    def recommander_metiers(self, utilisateur, top_n=5):
-        """Recommande les meilleurs métiers pour un utilisateur"""
-        metiers = self.get_all_metiers_with_competences()
-        scores_metiers = []
+    def recommander_metiers(self, utilisateur, top_n=5, eligibilite_stricte=False,
+                            diversite=0.0, max_par_secteur=None):
+        """
+        Recommande les meilleurs métiers pour un utilisateur.
+        Avec `eligibilite_stricte`, les métiers dont le diplôme requis n'est pas
+        atteint sont écartés avant le calcul au lieu d'être pénalisés.
+        `diversite` (0 à 1) et `max_par_secteur` limitent les métiers redondants
+        (même secteur, compétences proches).
+        """
+        diversifie = diversite > 0 or max_par_secteur is not None
+        if self.archetypes is not None and not diversifie:
+            precalculees = self.archetypes.trouver(self, utilisateur, top_n, eligibilite_stricte)
+            if precalculees is not None:
+                return precalculees
         
-        for metier in metiers:
-            score = self.calculer_score_metier(utilisateur, metier)
-            scores_metiers.append((metier, score))
+        metiers = self.get_all_metiers_with_competences()
+        profil = self.profil_scoring.nom
+        candidats = self.moteur.metiers_eligibles(utilisateur, profil) if eligibilite_stricte else None
+        scores, details = self.moteur.scorer(utilisateur, profil, candidats, detail=True)
+        if diversifie:
+            indices = self.moteur.classer_diversifie(scores, top_n, diversite, max_par_secteur, candidats)
+        else:
+            indices = classer(scores, top_n)
         
-        scores_metiers.sort(key=lambda x: x[1], reverse=True)
+        retenus = indices if candidats is None else candidats[indices]
+        manquantes = self.competences_manquantes_lot(utilisateur, retenus)
         
         recommandations = []
-        for metier, score in scores_metiers[:top_n]:
-            recommandations.append({
-                'metier': metier['nom'],
-                'secteur': metier['secteur'],
-                'score': score,
-                'diplome_requis': metier['diplome_minimum'],
-                'demande_afrique': metier['demande_afrique'],
-                'reconversion_facile': metier['reconversion_facile'],
-                'competences_requises': metier['hard_skills'][:5],
-                'competences_manquantes': self.get_competences_manquantes(utilisateur, metier)
-            })
+        for i, j, manques in zip(indices, retenus, manquantes):
+            recommandations.append(self._recommandation(utilisateur, metiers[j], float(scores[i]),
+                                                        detail_metier(details, i), manques))
         
         return recommandations
     
+    def recommander_metiers_progressif(self, utilisateur, top_n=5, eligibilite_stricte=False):
+        """
+        Recommandations par étapes, pour un affichage progressif : produit des
+        états {'recommandations', 'exact', 'metiers_evalues', 'metiers_total'}
+        de plus en plus précis ; le dernier est exact (celui de `recommander_metiers`).
+        """
+        precalculees = self._etat_precalcule(utilisateur, top_n, eligibilite_stricte)
+        if precalculees is not None:
+            yield precalculees
+            return
+        
+        candidats = self.moteur.metiers_eligibles(utilisateur, self.profil_scoring.nom) if eligibilite_stricte else None
+        total = len(self.catalogue) if candidats is None else len(candidats)
+        for indices, _, exact, evalues in self.moteur.classer_progressif(
+                utilisateur, top_n, self.profil_scoring.nom, candidats):
+            yield self._etat_progressif(utilisateur, indices, exact, evalues, total)
+    
+    def recommander_metiers_delai(self, utilisateur, top_n=5, budget=0.3, eligibilite_stricte=False):
+        """
+        Recommandations en temps borné (`budget` en secondes) : les métiers les
+        plus prometteurs sont scorés d'abord et le meilleur classement trouvé à
+        l'échéance est renvoyé, au format de `recommander_metiers_progressif`.
+        'exact' indique s'il est identique à celui de `recommander_metiers`.
+        """
+        echeance = time.perf_counter() + budget
+        precalculees = self._etat_precalcule(utilisateur, top_n, eligibilite_stricte)
+        if precalculees is not None:
+            return precalculees
+        
+        candidats = self.moteur.metiers_eligibles(utilisateur, self.profil_scoring.nom) if eligibilite_stricte else None
+        total = len(self.catalogue) if candidats is None else len(candidats)
+        # Tranches réduites au temps restant, première comprise
+        for indices, _, exact, evalues in self.moteur.classer_progressif(
+                utilisateur, top_n, self.profil_scoring.nom, candidats, echeance=echeance):
+            if exact or time.perf_counter() >= echeance:
+                break
+        return self._etat_progressif(utilisateur, indices, exact, evalues, total)
+    
+    def _etat_precalcule(self, utilisateur, top_n, eligibilite_stricte):
+        """État exact servi par le cache des profils fréquents, ou None"""
+        if self.archetypes is None:
+            return None
+        recommandations = self.archetypes.trouver(self, utilisateur, top_n, eligibilite_stricte)
+        if recommandations is None:
+            return None
+        return {'recommandations': recommandations, 'exact': True,
+                'metiers_evalues': 0, 'metiers_total': len(self.catalogue)}
+    
+    def _etat_progressif(self, utilisateur, indices, exact, evalues, total):
+        """Met en forme un état du classement progressif"""
+        metiers = self.catalogue.metiers
+        scores, details = self.moteur.scorer(utilisateur, self.profil_scoring.nom, indices, detail=True)
+        manquantes = self.competences_manquantes_lot(utilisateur, indices)
+        recommandations = [
+            self._recommandation(utilisateur, metiers[j], float(scores[i]), detail_metier(details, i), manques)
+            for i, (j, manques) in enumerate(zip(indices, manquantes))
+        ]
+        return {'recommandations': recommandations, 'exact': bool(exact),
+                'metiers_evalues': int(evalues), 'metiers_total': total}
+    
+    def _recommandation(self, utilisateur, metier, score, detail=None, manquantes=None):
+        """Met en forme le résultat d'un métier pour l'affichage"""
+        if manquantes is None:
+            manquantes = self.get_competences_manquantes(utilisateur, metier)
+        return {
+            'id': metier['id'],
+            'metier': metier['nom'],
+            'secteur': metier['secteur'],
+            'score': score,
+            'diplome_requis': metier['diplome_minimum'],
+            'demande_afrique': metier['demande_afrique'],
+            'reconversion_facile': metier['reconversion_facile'],
+            'competences_requises': metier['hard_skills'][:5],
+            'competences_manquantes': manquantes,
+            'detail': detail
+        }
+    
+    def rechercher_metiers(self, texte, limite=10):
+        """Recherche des métiers par nom ou secteur (préfixes, sans accents)"""
+        catalogue = self.catalogue
+        return [catalogue.get_metier(metier_id) for metier_id in catalogue.recherche.rechercher(texte, limite)]
+    
+    def evaluer_metier(self, utilisateur, metier_id):
+        """Score et compétences manquantes pour un seul métier, sans parcourir le catalogue"""
+        metier = self.catalogue.get_metier(metier_id)
+        return self._recommandation(utilisateur, metier, *self.calculer_score_metier(utilisateur, metier, detail=True))
+    
+    def comparer_profils(self, utilisateur, profils=None, top_n=5):
+        """Classements de plusieurs profils de scoring, calculés en une seule passe"""
+        noms = profils or list(self.profils_scoring)
+        metiers = self.get_all_metiers_with_competences()
+        scores = self.moteur.scorer_profils(utilisateur, noms)
+        
+        return {
+            nom: [(metiers[j]['nom'], float(scores[i][j])) for j in classer(scores[i], top_n)]
+            for i, nom in enumerate(noms)
+        }
+    
+    def normaliser_profil(self, utilisateur):
+        """
+        Remplace les compétences et logiciels saisis librement par les noms du
+        catalogue (les outils vont dans 'logiciels', le reste dans 'competences').
+        Les saisies non reconnues sont conservées telles quelles.
+        """
+        normaliseur = self.catalogue.normaliseur
+        competences, logiciels = [], []
+        for cle, cible in (('competences', competences), ('logiciels', logiciels)):
+            saisies = utilisateur.get(cle, [])
+            for saisie, trouve in zip(saisies, normaliseur.normaliser_lot(saisies)):
+                if trouve is None:
+                    cible.append(saisie)
+                    continue
+                nom = trouve[1]
+                destination = logiciels if trouve[2] == 'Tools' else competences
+                if nom not in destination:
+                    destination.append(nom)
+        
+        return {**utilisateur, 'competences': competences, 'logiciels': logiciels}
+    
+    def profil_depuis_cv(self, texte, diplome=None, interets=None):
+        """Construit un profil à partir du texte d'un CV (compétences, outils, diplôme)"""
+        extraites = self.catalogue.extracteur.extraire(texte)
+        if diplome is None:
+            diplome = detecter_diplome(texte, self.profil_scoring.niveaux_diplome) or ''
+        return creer_profil_utilisateur(
+            diplome,
+            extraites['hard_skills'] + extraites['soft_skills'],
+            extraites['tools'],
+            interets
+        )
+    
     def get_competences_manquantes(self, utilisateur, metier):
         """Identifie les compétences manquantes pour un métier"""
-        competences_user = set(utilisateur.get('competences', []))
-        logiciels_user = set(utilisateur.get('logiciels', []))
-        
-        competences_requises = set(metier['hard_skills'])
-        logiciels_requis = set(metier['tools'])
-        soft_skills_requis = set(metier['soft_skills'])
-        
-        competences_manquantes = competences_requises - competences_user
-        logiciels_manquants = logiciels_requis - logiciels_user
-        soft_skills_manquants = soft_skills_requis - set(utilisateur.get('competences', []))
-        
-        competences_priorisees = []
-        
-        for comp in competences_manquantes:
-            competences_priorisees.append({
-                'nom': comp,
-                'type': 'Hard Skill',
-                'priorite': 'Haute'
-            })
-        
-        for logiciel in logiciels_manquants:
-            competences_priorisees.append({
-                'nom': logiciel,
-                'type': 'Outil',
-                'priorite': 'Moyenne'
-            })
-        
-        for soft in soft_skills_manquants:
-            competences_priorisees.append({
-                'nom': soft,
-                'type': 'Soft Skill',
-                'priorite': 'Basse'
-            })
-        
-        return competences_priorisees
+        return self.competences_manquantes_lot(utilisateur, [self.catalogue.index_metiers[metier['id']]])[0]
+    
+    def competences_manquantes_lot(self, utilisateur, indices):
+        """
+        Compétences manquantes de plusieurs métiers (indices du catalogue), calculées
+        ensemble. Chaque liste est complète, les plus utiles d'abord : gain de score
+        ('gain', en points) puis nombre de ces métiers qui la demandent aussi ('partage').
+        """
+        debut, elements, types, gains, partages = self.moteur.ecarts(
+            utilisateur, indices, self.profil_scoring.nom)
+        noms = self.moteur.noms_elements
+        manquantes = [
+            {'nom': noms[e], 'type': self.TYPES_MANQUANTES[t][0], 'priorite': self.TYPES_MANQUANTES[t][1],
+             'gain': g, 'partage': p}
+            for e, t, g, p in zip(elements.tolist(), types.tolist(), gains.tolist(), partages.tolist())
+        ]
+        bornes = debut.tolist()
+        return [manquantes[bornes[i]:bornes[i + 1]] for i in range(len(bornes) - 1)]
+    
+    def ordonner_manquantes(self, metier, manquantes):
+        """
+        Remet les compétences manquantes d'un métier dans l'ordre du catalogue,
+        pour recompter 'partage' sur un autre lot de métiers (`repartager`)
+        """
+        outil = self.TYPES_MANQUANTES[TYPE_OUTIL][0]
+        positions = {}
+        for nom in metier['hard_skills'] + metier['soft_skills']:
+            positions.setdefault((nom, False), len(positions))
+        for nom in metier['tools']:
+            positions.setdefault((nom, True), len(positions))
+        manquantes.sort(key=lambda c: positions[(c['nom'], c['type'] == outil)])
+        return manquantes
     
     def filtrer_par_secteur(self, utilisateur, secteur_nom):
         """Filtre les recommandations par secteur d'intérêt"""
@@ -201,14 +339,9 @@ class EmployiaMatching:
         competences_user = set(utilisateur.get('competences', []))
         logiciels_user = set(utilisateur.get('logiciels', []))
         
-        competences_recherchees = []
-        for rec in recommandations:
-            metier = next(m for m in self.get_all_metiers_with_competences() 
-                         if m['nom'] == rec['metier'])
-            competences_recherchees.extend(metier['hard_skills'])
-        
-        from collections import Counter
-        competences_tendances = Counter(competences_recherchees).most_common(5)
+        # Compétences les plus demandées dans le secteur du meilleur métier
+        secteur = recommandations[0]['secteur'] if recommandations else None
+        competences_tendances = self.catalogue.demande.top(5, secteur=secteur, types=['Hard Skill'])
         
         return {
             'profil': {
@@ -230,7 +363,12 @@ class EmployiaMatching:
             meilleur_metier = recommandations[0]
             competences_manquantes = meilleur_metier['competences_manquantes']
             
-            hard_skills_manquantes = [c for c in competences_manquantes if c['type'] == 'Hard Skill']
+            # Les compétences les plus demandées dans le catalogue d'abord
+            demande = self.catalogue.demande
+            hard_skills_manquantes = sorted(
+                [c for c in competences_manquantes if c['type'] == 'Hard Skill'],
+                key=lambda c: (-demande.poids(c['nom']), c['nom'])
+            )
             if hard_skills_manquantes:
                 conseils.append({
                     'type': 'formation',
@@ -256,6 +394,38 @@ class EmployiaMatching:
         self.conn.close()
 
 
+def repartager(listes, type_outil=EmployiaMatching.TYPES_MANQUANTES[TYPE_OUTIL][0]):
+    """
+    Recompte 'partage' sur ces listes de compétences manquantes (une par métier
+    renvoyé, chacune dans l'ordre du catalogue) et les trie comme
+    `competences_manquantes_lot` : gain, puis partage, puis ordre du catalogue
+    """
+    cles = [[(c['nom'], c['type'] == type_outil) for c in liste] for liste in listes]
+    partages = Counter(cle for cles_liste in cles for cle in cles_liste)
+    for liste, cles_liste in zip(listes, cles):
+        for c, cle in zip(liste, cles_liste):
+            c['partage'] = partages[cle]
+        liste.sort(key=lambda c: (-c['gain'], -c['partage']))
+    return listes
+
+
+def manquantes_affichees(competences_manquantes, limites=None):
+    """
+    Compétences manquantes présentées à l'utilisateur : les premières de chaque
+    priorité, au plus `limites[priorite]` (LIMITES_MANQUANTES par défaut).
+    Les listes restent complètes et triées par utilité ; seul l'affichage tronque.
+    """
+    if limites is None:
+        limites = LIMITES_MANQUANTES
+    comptes = Counter()
+    resultat = []
+    for comp in competences_manquantes:
+        comptes[comp['priorite']] += 1
+        if comptes[comp['priorite']] <= limites.get(comp['priorite'], 0):
+            resultat.append(comp)
+    return resultat
+
+
 def creer_profil_utilisateur(diplome, competences, logiciels, interets=None):
     """Crée un profil utilisateur structuré"""
     if interets is None:
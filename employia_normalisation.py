@@ -0,0 +1,142 @@
+import heapq
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+ALIAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alias_competences.json")
+
+_NON_ALNUM = re.compile(r"[^a-z0-9+#.]+")
+
+
+def normaliser_texte(texte):
+    """Minuscules, sans accents, ponctuation réduite à des espaces"""
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+    return _NON_ALNUM.sub(' ', texte).strip()
+
+
+def trigrammes(texte):
+    """Trigrammes de caractères d'un texte normalisé, bordé d'espaces"""
+    texte = f"  {texte} "
+    return {texte[i:i + 3] for i in range(len(texte) - 2)}
+
+
+def distance_bornee(a, b, borne):
+    """Distance de Levenshtein si elle est <= borne, sinon borne + 1"""
+    if abs(len(a) - len(b)) > borne:
+        return borne + 1
+    precedente = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        courante = [i] + [0] * len(b)
+        minimum = i
+        for j, cb in enumerate(b, 1):
+            courante[j] = min(precedente[j] + 1, courante[j - 1] + 1,
+                              precedente[j - 1] + (ca != cb))
+            minimum = min(minimum, courante[j])
+        if minimum > borne:
+            return borne + 1
+        precedente = courante
+    return min(precedente[-1], borne + 1)
+
+
+def charger_alias(path=ALIAS_PATH):
+    """Charge la table d'alias (texte libre -> nom canonique de compétence)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class NormaliseurCompetences:
+    def __init__(self, competences, alias=None, seuil=0.75, nb_candidats=20, taille_cache=100000):
+        """
+        Associe des compétences saisies librement aux compétences du catalogue.
+
+        `competences` est une liste de (id, nom, type). Les candidats sont
+        trouvés par un index de trigrammes (noms et alias), puis vérifiés
+        par une distance d'édition bornée par le `seuil` de similarité.
+        """
+        self.seuil = seuil
+        self.nb_candidats = nb_candidats
+        self.taille_cache = taille_cache
+        self._cache = {}
+        self._verrou = threading.Lock()
+
+        # Entrées de l'index : (forme normalisée, (id, nom, type))
+        self._entrees = []
+        self._exact = {}
+        par_nom = {}
+        for competence in competences:
+            cle = normaliser_texte(competence[1])
+            if cle not in self._exact:
+                self._exact[cle] = competence
+                par_nom[competence[1]] = competence
+                self._entrees.append((cle, competence))
+        for texte, nom in (alias if alias is not None else charger_alias()).items():
+            cle = normaliser_texte(texte)
+            if nom in par_nom and cle not in self._exact:
+                self._exact[cle] = par_nom[nom]
+                self._entrees.append((cle, par_nom[nom]))
+
+        self._index = defaultdict(list)
+        self._nb_trigrammes = []
+        for i, (cle, _) in enumerate(self._entrees):
+            grammes = trigrammes(cle)
+            self._nb_trigrammes.append(len(grammes))
+            for g in grammes:
+                self._index[g].append(i)
+
+    def _chercher(self, cle):
+        """Meilleure entrée pour une forme normalisée : (id, nom, type, similarite) ou None"""
+        if cle in self._exact:
+            return self._exact[cle] + (1.0,)
+
+        grammes = trigrammes(cle)
+        communs = defaultdict(int)
+        for g in grammes:
+            for i in self._index.get(g, ()):
+                communs[i] += 1
+        # Coefficient de Dice sur les trigrammes pour présélectionner
+        candidats = heapq.nlargest(
+            self.nb_candidats, communs,
+            key=lambda i: 2 * communs[i] / (len(grammes) + self._nb_trigrammes[i])
+        )
+
+        meilleur = None
+        for i in candidats:
+            entree, competence = self._entrees[i]
+            longueur = max(len(cle), len(entree))
+            borne = int((1 - self.seuil) * longueur)
+            distance = distance_bornee(cle, entree, borne)
+            if distance > borne:
+                continue
+            similarite = round(1 - distance / longueur, 4)
+            if meilleur is None or similarite > meilleur[3]:
+                meilleur = competence + (similarite,)
+        return meilleur
+
+    def normaliser(self, texte):
+        """Compétence du catalogue la plus proche : (id, nom, type, similarite) ou None"""
+        cle = normaliser_texte(texte)
+        if not cle:
+            return None
+        with self._verrou:
+            if cle in self._cache:
+                return self._cache[cle]
+        resultat = self._chercher(cle)
+        with self._verrou:
+            if len(self._cache) >= self.taille_cache:
+                self._cache.clear()
+            self._cache[cle] = resultat
+        return resultat
+
+    def normaliser_lot(self, textes):
+        """Normalise une liste de textes ; chaque forme distincte n'est cherchée qu'une fois"""
+        resultats = {}
+        for texte in textes:
+            if texte not in resultats:
+                resultats[texte] = self.normaliser(texte)
+        return [resultats[texte] for texte in textes]
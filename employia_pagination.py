@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from employia_archetypes import _empreinte_profil, cle_profil
+
+
+class ClassementsPagines:
+    def __init__(self, memoire_max=64 * 2 ** 20):
+        """
+        Classements complets par profil et version du catalogue, servis par pages.
+
+        Ordre total : score décroissant, puis demande décroissante, puis
+        identifiant croissant (`MoteurScoring.classer_departage`). Les curseurs
+        sont opaques ; une page ne coûte que la mise en forme de ses métiers.
+        Au-delà de `memoire_max` octets, les classements les moins récemment
+        utilisés sont libérés ; l'ordre étant déterministe, ils sont recalculés
+        à l'identique et les curseurs restent valides. Les profils présents dans
+        le cache des archétypes (`matching.archetypes`) sont classés à partir
+        de leurs scores précalculés, sans rescoring.
+        """
+        self.memoire_max = memoire_max
+        self.calculs = 0
+        self.precalcules = 0
+        self.succes = 0
+        self.evictions = 0
+        self._classements = OrderedDict()
+        self._memoire = 0
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def _cle(matching, utilisateur, eligibilite_stricte):
+        """Identifie un classement : profil canonique, version du catalogue et profil de scoring"""
+        texte = "\n".join((cle_profil(utilisateur), matching.catalogue.version,
+                           _empreinte_profil(matching.profil_scoring), str(bool(eligibilite_stricte))))
+        return hashlib.sha1(texte.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _curseur(cle, position):
+        return base64.urlsafe_b64encode(f"{cle}:{position}".encode()).decode()
+
+    @staticmethod
+    def _lire_curseur(curseur):
+        try:
+            cle, position = base64.urlsafe_b64decode(curseur.encode()).decode().split(":")
+            position = int(position)
+            if position < 0:
+                raise ValueError
+            return cle, position
+        except ValueError:
+            raise ValueError(f"Curseur invalide : {curseur}") from None
+
+    def _classement(self, matching, utilisateur, eligibilite_stricte, cle):
+        """Ordre complet des métiers (indices du catalogue), calculé si besoin"""
+        with self._verrou:
+            if cle in self._classements:
+                self._classements.move_to_end(cle)
+                self.succes += 1
+                return self._classements[cle]
+
+        moteur = matching.moteur
+        profil = matching.profil_scoring.nom
+        candidats = moteur.metiers_eligibles(utilisateur, profil) if eligibilite_stricte else None
+        # Profil fréquent : scores précalculés par le cache des archétypes, reclassés ici
+        scores = matching.archetypes.scores(matching, utilisateur) if matching.archetypes is not None else None
+        if scores is None:
+            scores = moteur.scorer(utilisateur, profil, candidats)
+        else:
+            with self._verrou:
+                self.precalcules += 1
+            if candidats is not None:
+                scores = scores[candidats]
+        ordre = moteur.classer_departage(scores, candidats)
+        if candidats is not None:
+            ordre = candidats[ordre]
+        ordre = ordre.astype(np.int32 if len(moteur) < 2 ** 31 else np.int64)
+
+        with self._verrou:
+            if cle not in self._classements:
+                self._classements[cle] = ordre
+                self._memoire += ordre.nbytes
+                self.calculs += 1
+                while len(self._classements) > 1 and self._memoire > self.memoire_max:
+                    _, libere = self._classements.popitem(last=False)
+                    self._memoire -= libere.nbytes
+                    self.evictions += 1
+            return self._classements.get(cle, ordre)
+
+    def page(self, matching, utilisateur, curseur=None, taille_page=10, eligibilite_stricte=False):
+        """
+        Page de recommandations : {'recommandations', 'position', 'total',
+        'curseur_suivant'} ; `curseur_suivant` vaut None après la dernière page.
+        Un curseur n'est valable que pour le même profil, la même version du
+        catalogue et le même filtre d'éligibilité (ValueError sinon).
+        """
+        cle = self._cle(matching, utilisateur, eligibilite_stricte)
+        position = 0
+        if curseur is not None:
+            cle_curseur, position = self._lire_curseur(curseur)
+            if cle_curseur != cle:
+                raise ValueError("Curseur obtenu pour un autre profil ou une autre version du catalogue")
+
+        ordre = self._classement(matching, utilisateur, eligibilite_stricte, cle)
+        if position > len(ordre):
+            raise ValueError(f"Curseur invalide : {curseur}")
+        fin = min(position + taille_page, len(ordre))
+
+        # Seuls les métiers de la page sont mis en forme (score détaillé, compétences manquantes)
+        metiers = matching.catalogue.metiers
+        indices = ordre[position:fin]
+        recommandations = []
+        for j, manquantes in zip(indices.tolist(), matching.competences_manquantes_lot(utilisateur, indices)):
+            score, detail = matching.calculer_score_metier(utilisateur, metiers[j], detail=True)
+            recommandations.append(matching._recommandation(utilisateur, metiers[j], score, detail, manquantes))
+        return {
+            'recommandations': recommandations,
+            'position': position,
+            'total': len(ordre),
+            'curseur_suivant': self._curseur(cle, fin) if fin < len(ordre) else None
+        }
+
+    def statistiques(self):
+        """Classements en mémoire, mémoire utilisée et compteurs"""
+        with self._verrou:
+            return {
+                'classements': len(self._classements),
+                'memoire': self._memoire,
+                'memoire_max': self.memoire_max,
+                'calculs': self.calculs,
+                'precalcules': self.precalcules,
+                'succes': self.succes,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+from employia_regions import taille_memoire
+
+# Variable d'environnement qui active le profilage dès le démarrage (catalogues compris)
+PROFILAGE_ENV = "EMPLOYIA_PROFILAGE"
+RACINE = os.path.dirname(os.path.abspath(__file__))
+
+
+def profilage_demande(environ=None):
+    """Profilage demandé par la variable d'environnement EMPLOYIA_PROFILAGE (1, oui, true...)"""
+    valeur = (os.environ if environ is None else environ).get(PROFILAGE_ENV, '')
+    return valeur.strip().lower() in ('1', 'oui', 'true', 'yes', 'on')
+
+
+def _site(statistique):
+    """Ligne d'allocation 'fichier:ligne', relative au dépôt pour rester comparable d'une machine à l'autre"""
+    cadre = statistique.traceback[0]
+    fichier = cadre.filename
+    if fichier.startswith(RACINE + os.sep):
+        fichier = os.path.relpath(fichier, RACINE)
+    else:
+        # Bibliothèques : chemin à partir du paquet (site-packages varie selon l'installation)
+        morceaux = fichier.split(os.sep)
+        if 'site-packages' in morceaux:
+            fichier = os.sep.join(morceaux[morceaux.index('site-packages') + 1:])
+    return f"{fichier}:{cadre.lineno}"
+
+
+class ProfilageMemoire:
+    def __init__(self, actif=False, nb_cadres=1, nb_sites=15, periode_sites=20):
+        """
+        Profilage mémoire (tracemalloc) du parcours de recommandation.
+
+        `mesurer(etape)` relève, pour chaque exécution d'une étape, les octets
+        encore alloués à la sortie (retenus), le solde de blocs alloués
+        (allocations moins libérations : tracemalloc ne compte pas les
+        allocations brutes) et le pic atteint pendant l'étape. Un instantané
+        coûtant de l'ordre d'une seconde sur un catalogue chargé, les lignes qui
+        allouent le plus ne sont relevées qu'à la première exécution puis toutes
+        les `periode_sites`. Les mesures sont cumulées par étape. Inactif, le
+        profilage ne coûte qu'un test par appel ; actif, seuls les relevés sont
+        sous verrou : les étapes s'exécutent en parallèle et, tracemalloc étant
+        global au processus, la mesure d'une étape inclut les allocations des
+        étapes simultanées.
+        """
+        self.nb_cadres = nb_cadres
+        self.nb_sites = nb_sites
+        self.periode_sites = periode_sites
+        self.actif = False
+        self._demarre = False
+        self._etapes = {}
+        self._sites = {}
+        self._sessions = {}
+        # Pic reporté de chaque étape en cours (un jeton par exécution)
+        self._pics = {}
+        self._verrou = threading.Lock()
+        if actif:
+            self.activer()
+
+    def activer(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nb_cadres)
+            self._demarre = True
+        self.actif = True
+
+    def desactiver(self):
+        """Arrête le profilage une fois terminées les étapes en cours de mesure"""
+        with self._verrou:
+            self.actif = False
+            if self._demarre:
+                tracemalloc.stop()
+                self._demarre = False
+
+    def reinitialiser(self):
+        """Oublie les mesures (le profilage reste dans son état)"""
+        with self._verrou:
+            self._etapes.clear()
+            self._sites.clear()
+            self._sessions.clear()
+
+    @contextmanager
+    def mesurer(self, etape):
+        """Mesure le bloc encadré sous le nom `etape` (rien si le profilage est inactif)"""
+        if not self.actif:
+            yield
+            return
+        jeton = object()
+        with self._verrou:
+            # Le profilage a pu être arrêté avant la prise du verrou
+            mesure = self.actif and tracemalloc.is_tracing()
+            if mesure:
+                cumul = self._etapes.setdefault(etape, {'mesures': 0, 'octets': 0, 'blocs_nets': 0, 'pic_total': 0,
+                                                        'pic_max': 0, 'duree': 0.0, 'mesures_sites': 0})
+                avant = tracemalloc.take_snapshot() if cumul['mesures'] % self.periode_sites == 0 else None
+                self._remettre_pic()
+                self._pics[jeton] = 0
+                base = tracemalloc.get_traced_memory()[0]
+                blocs = sys.getallocatedblocks()
+        if not mesure:
+            yield
+            return
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            duree = time.perf_counter() - debut
+            with self._verrou:
+                pic = self._pics.pop(jeton)
+                # tracemalloc arrêté ailleurs pendant l'étape : mesure abandonnée
+                if tracemalloc.is_tracing():
+                    self._enregistrer(etape, cumul, avant, base, blocs, pic, duree)
+
+    def _remettre_pic(self):
+        """Remet à zéro le pic de tracemalloc après l'avoir reporté sur les étapes en cours"""
+        pic = tracemalloc.get_traced_memory()[1]
+        for jeton, reporte in self._pics.items():
+            self._pics[jeton] = max(reporte, pic)
+        tracemalloc.reset_peak()
+
+    def _enregistrer(self, etape, cumul, avant, base, blocs, pic, duree):
+        courant, pic_courant = tracemalloc.get_traced_memory()
+        pic = max(pic, pic_courant)
+        cumul['mesures'] += 1
+        cumul['octets'] += courant - base
+        cumul['blocs_nets'] += sys.getallocatedblocks() - blocs
+        cumul['pic_total'] += pic - base
+        cumul['pic_max'] = max(cumul['pic_max'], pic - base)
+        cumul['duree'] += duree
+        if avant is not None:
+            self._ajouter_sites(etape, tracemalloc.take_snapshot().compare_to(avant, 'lineno'))
+            cumul['mesures_sites'] += 1
+
+    def _ajouter_sites(self, etape, differences):
+        sites = self._sites.setdefault(etape, {'octets': Counter(), 'blocs_nets': Counter()})
+        for s in differences:
+            if (s.size_diff or s.count_diff) and s.traceback[0].filename != tracemalloc.__file__:
+                site = _site(s)
+                sites['octets'][site] += s.size_diff
+                sites['blocs_nets'][site] += s.count_diff
+
+    def instrumenter(self, objet, methode, etape=None):
+        """Remplace `objet.methode` par une version mesurée à chaque appel (une requête = une mesure)"""
+        fonction = getattr(objet, methode)
+
+        def mesuree(*args, **kwargs):
+            with self.mesurer(etape or methode):
+                return fonction(*args, **kwargs)
+
+        setattr(objet, methode, mesuree)
+        return objet
+
+    def enregistrer_session(self, session_id, etat):
+        """Relève la mémoire atteignable depuis l'état d'une session (dernier relevé conservé)"""
+        if not self.actif:
+            return
+        taille = taille_memoire(dict(etat))
+        with self._verrou:
+            self._sessions[session_id] = taille
+
+    def rapport(self, pool=None, classements=None):
+        """
+        Rapport comparable entre versions : octets par métier de chaque
+        catalogue chargé, par session et par résultat en cache, puis, par
+        étape mesurée, moyennes d'octets retenus et de solde de blocs, pics et lignes
+        qui allouent le plus. Aucun horodatage : deux rapports se comparent
+        avec `comparer` ou un simple diff.
+        """
+        with self._verrou:
+            etapes = {}
+            for etape, cumul in sorted(self._etapes.items()):
+                n = cumul['mesures']
+                if not n:
+                    continue
+                sites = self._sites.get(etape, {'octets': Counter(), 'blocs_nets': Counter()})
+                etapes[etape] = {
+                    'mesures': n,
+                    'octets_retenus_moyen': round(cumul['octets'] / n),
+                    'blocs_nets_moyen': round(cumul['blocs_nets'] / n, 1),
+                    'pic_octets_moyen': round(cumul['pic_total'] / n),
+                    'pic_octets_max': cumul['pic_max'],
+                    'duree_ms_moyenne': round(cumul['duree'] / n * 1000, 2),
+                    # Octets retenus et solde de blocs par ligne, en moyenne sur les exécutions échantillonnées
+                    'sites': [
+                        {'site': site, 'octets': round(octets / cumul['mesures_sites']),
+                         'blocs_nets': round(sites['blocs_nets'][site] / cumul['mesures_sites'], 1)}
+                        for site, octets in sorted(sites['octets'].items(), key=lambda e: (-abs(e[1]), e[0]))
+                        [:self.nb_sites]
+                    ]
+                }
+            tailles_sessions = sorted(self._sessions.values())
+
+        catalogues = {}
+        resultats = {}
+        if pool is not None:
+            with pool._verrou:
+                charges = {region: objet for region, (objet, _) in pool._charges.items()}
+            for region, matching in sorted(charges.items()):
+                nb = len(matching.catalogue)
+                octets = taille_memoire(matching)
+                catalogues[region] = {
+                    'version': matching.catalogue.version,
+                    'metiers': nb,
+                    'octets': octets,
+                    'octets_par_metier': round(octets / nb) if nb else None
+                }
+                chargement = etapes.get(f"chargement_catalogue:{region}")
+                if chargement is not None and nb:
+                    catalogues[region]['octets_retenus_chargement_par_metier'] = round(
+                        chargement['octets_retenus_moyen'] / nb)
+                archetypes = getattr(matching, 'archetypes', None)
+                if archetypes is not None and archetypes._entrees:
+                    resultats[f"archetypes:{region}"] = {
+                        'entrees': len(archetypes._entrees),
+                        'octets_par_entree': round(taille_memoire(archetypes._entrees) / len(archetypes._entrees))
+                    }
+        if classements is not None:
+            stats = classements.statistiques()
+            resultats['pagination'] = {
+                'entrees': stats['classements'],
+                'octets_par_entree': round(stats['memoire'] / stats['classements']) if stats['classements'] else None
+            }
+
+        return {
+            'contexte': {'python': sys.version.split()[0], 'numpy': np.__version__, 'nb_cadres': self.nb_cadres},
+            'catalogues': catalogues,
+            'sessions': {
+                'nombre': len(tailles_sessions),
+                'octets_moyen': round(sum(tailles_sessions) / len(tailles_sessions)) if tailles_sessions else None,
+                'octets_max': tailles_sessions[-1] if tailles_sessions else None
+            },
+            'resultats_caches': resultats,
+            'etapes': etapes
+        }
+
+    def sauvegarder(self, chemin, pool=None, classements=None):
+        """Écrit le rapport en JSON (clés triées, une valeur par ligne) et le renvoie"""
+        rapport = self.rapport(pool, classements)
+        with open(chemin, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+        return rapport
+
+
+def _valeurs(rapport, prefixe=""):
+    """Valeurs numériques d'un rapport, à plat : {'etapes.page.pic_octets_max': ...} (listes ignorées)"""
+    valeurs = {}
+    for cle, valeur in rapport.items():
+        chemin = f"{prefixe}{cle}"
+        if isinstance(valeur, dict):
+            valeurs.update(_valeurs(valeur, chemin + "."))
+        elif isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+            valeurs[chemin] = valeur
+    return valeurs
+
+
+def comparer(ancien, nouveau, seuil=0.05):
+    """
+    Différences entre deux rapports : [(chemin, avant, après, variation relative)]
+    pour les valeurs qui varient de plus de `seuil`, apparaissent ou disparaissent
+    (les lignes d'allocation se comparent au diff du fichier)
+    """
+    avant, apres = _valeurs(ancien), _valeurs(nouveau)
+    differences = []
+    for chemin in sorted(set(avant) | set(apres)):
+        a, b = avant.get(chemin), apres.get(chemin)
+        if a is None or b is None:
+            differences.append((chemin, a, b, None))
+        elif a != b and (a == 0 or abs(b - a) / abs(a) > seuil):
+            differences.append((chemin, a, b, round((b - a) / a, 3) if a else None))
+    return differences
+
+
+if __name__ == "__main__":
+    from employia_charge import ParcoursFormulaire, soumissions_synthetiques
+    from employia_pagination import ClassementsPagines
+    from employia_regions import PoolCatalogues, REGION_DEFAUT, _fabrique_defaut
+
+    parser = argparse.ArgumentParser(description="Profilage mémoire du parcours de recommandation")
+    parser.add_argument("--soumissions", type=int, default=200, help="Soumissions synthétiques à profiler")
+    parser.add_argument("--sortie", default="employia_profilage.json", help="Fichier du rapport")
+    parser.add_argument("--comparer", nargs=2, metavar=("ANCIEN", "NOUVEAU"),
+                        help="Compare deux rapports au lieu de profiler")
+    parser.add_argument("--seuil", type=float, default=0.05, help="Variation relative signalée par --comparer")
+    args = parser.parse_args()
+
+    if args.comparer:
+        with open(args.comparer[0], encoding="utf-8") as f:
+            ancien = json.load(f)
+        with open(args.comparer[1], encoding="utf-8") as f:
+            nouveau = json.load(f)
+        for chemin, a, b, variation in comparer(ancien, nouveau, args.seuil):
+            print(f"{chemin}: {a} -> {b}" + (f" ({variation:+.1%})" if variation is not None else ""))
+        raise SystemExit(0)
+
+    profilage = ProfilageMemoire(actif=True)
+
+    def fabrique(region, db_path):
+        with profilage.mesurer(f"chargement_catalogue:{region}"):
+            matching = _fabrique_defaut(region, db_path)
+        return profilage.instrumenter(matching, 'recommander_metiers')
+
+    pool = PoolCatalogues(fabrique=fabrique)
+    classements = profilage.instrumenter(ClassementsPagines(), 'page')
+    region = REGION_DEFAUT if REGION_DEFAUT in pool.regions else next(iter(pool.regions))
+    parcours = ParcoursFormulaire(pool, classements, region=region, pause=0)
+    for i, soumission in enumerate(soumissions_synthetiques(pool.obtenir(region).catalogue, args.soumissions)):
+        recommandations = parcours(soumission)
+        profilage.enregistrer_session(i, {'profil': soumission['profil'], 'recommandations': recommandations})
+    rapport = profilage.sauvegarder(args.sortie, pool, classements)
+    print(json.dumps({k: rapport[k] for k in ('catalogues', 'sessions', 'resultats_caches')}, indent=2))
+    print(f"Rapport écrit dans {args.sortie}")
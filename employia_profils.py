@@ -0,0 +1,213 @@
+import heapq
+import json
+import sqlite3
+from collections import defaultdict
+
+
+class _Classe:
+    __slots__ = ('score', 'profil_id')
+
+    def __init__(self, score, profil_id):
+        """Entrée du tas des k meilleurs : la moins bonne est la plus petite"""
+        self.score = score
+        self.profil_id = profil_id
+
+    def __lt__(self, autre):
+        if self.score != autre.score:
+            return self.score < autre.score
+        return self.profil_id > autre.profil_id
+
+
+class StockProfils:
+    def __init__(self, matching, db_path=None):
+        """
+        Profils utilisateurs enregistrés, indexés pour la recherche inverse.
+
+        Index inversé compétence/logiciel -> profils et un compartiment par
+        rang de diplôme. Si `db_path` est donné, les profils y sont persistés.
+        """
+        self.matching = matching
+        self.profils = {}
+        self.index_competences = defaultdict(set)
+        self.index_logiciels = defaultdict(set)
+        self.par_niveau = defaultdict(set)
+        self._niveaux = {}
+        self._niveaux_tries = {}
+        self.db_path = db_path
+
+        if db_path is not None:
+            conn = sqlite3.connect(db_path)
+            try:
+                conn.execute("CREATE TABLE IF NOT EXISTS profils (id PRIMARY KEY, donnees TEXT NOT NULL)")
+                conn.commit()
+                for profil_id, donnees in conn.execute("SELECT id, donnees FROM profils"):
+                    self._indexer(profil_id, json.loads(donnees))
+            finally:
+                conn.close()
+
+    def __len__(self):
+        return len(self.profils)
+
+    def _niveau(self, utilisateur):
+        return self.matching.profil_scoring.niveau(utilisateur.get('diplome', ''))
+
+    def _indexer(self, profil_id, utilisateur):
+        """Ajoute un profil aux index (après retrait de son ancienne version)"""
+        self._desindexer(profil_id)
+        self.profils[profil_id] = utilisateur
+        for comp in set(utilisateur.get('competences', [])):
+            self.index_competences[comp].add(profil_id)
+        for logiciel in set(utilisateur.get('logiciels', [])):
+            self.index_logiciels[logiciel].add(profil_id)
+        niveau = self._niveau(utilisateur)
+        self._niveaux[profil_id] = niveau
+        self.par_niveau[niveau].add(profil_id)
+        self._niveaux_tries.pop(niveau, None)
+
+    def _desindexer(self, profil_id):
+        """Retire un profil des index"""
+        ancien = self.profils.pop(profil_id, None)
+        if ancien is None:
+            return None
+        for comp in set(ancien.get('competences', [])):
+            self.index_competences[comp].discard(profil_id)
+        for logiciel in set(ancien.get('logiciels', [])):
+            self.index_logiciels[logiciel].discard(profil_id)
+        niveau = self._niveaux.pop(profil_id)
+        self.par_niveau[niveau].discard(profil_id)
+        self._niveaux_tries.pop(niveau, None)
+        return ancien
+
+    def ajouter(self, profil_id, utilisateur):
+        """Ajoute ou met à jour un profil"""
+        self._indexer(profil_id, utilisateur)
+        if self.db_path is not None:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO profils (id, donnees) VALUES (?, ?)",
+                                 (profil_id, json.dumps(utilisateur, ensure_ascii=False)))
+            finally:
+                conn.close()
+
+    def supprimer(self, profil_id):
+        """Supprime un profil"""
+        self._desindexer(profil_id)
+        if self.db_path is not None:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                with conn:
+                    conn.execute("DELETE FROM profils WHERE id = ?", (profil_id,))
+            finally:
+                conn.close()
+
+    def _ids_tries(self, niveau):
+        """Identifiants d'un compartiment de diplôme, triés (mis en cache)"""
+        if niveau not in self._niveaux_tries:
+            self._niveaux_tries[niveau] = sorted(self.par_niveau[niveau])
+        return self._niveaux_tries[niveau]
+
+    def _score(self, metier_info, communs_competences, communs_logiciels, eligible, competences_user=()):
+        """
+        Score à partir des recouvrements, avec les mêmes opérations que
+        `calculer_score_metier` (donc le même arrondi)
+        """
+        profil = self.matching.profil_scoring
+        competences_metier, nb_logiciels, cles_metier = metier_info
+        if competences_metier:
+            score_competences = (communs_competences / len(competences_metier)) * profil.poids_competences
+        else:
+            score_competences = profil.score_competences_vide
+        for comp_cle in cles_metier:
+            if comp_cle in competences_user:
+                score_competences += profil.bonus_competence_cle
+        score_competences = min(score_competences, profil.poids_competences)
+        score_diplome = (1 if eligible else 0) * profil.poids_diplome
+        if nb_logiciels:
+            score_logiciels = (communs_logiciels / nb_logiciels) * profil.poids_logiciels
+        else:
+            score_logiciels = profil.score_logiciels_vide
+        return round(score_competences + score_diplome + score_logiciels, 2)
+
+    def top_profils(self, metier_id, k=10):
+        """
+        Meilleurs profils pour un métier : [(profil_id, score), ...].
+        Ordre identique à un tri exhaustif par (score décroissant, identifiant).
+        """
+        profil = self.matching.profil_scoring
+        metier = self.matching.catalogue.get_metier(metier_id)
+        competences_metier = set(metier['hard_skills'] + metier['soft_skills'])
+        logiciels_metier = set(metier['tools'])
+        niveau_requis = profil.niveau_requis(metier['diplome_minimum'])
+        cles_metier = [c for c in profil.competences_cles if c in competences_metier]
+        metier_info = (competences_metier, len(logiciels_metier), cles_metier)
+
+        # Candidats : profils partageant au moins une compétence ou un logiciel
+        communs_competences = defaultdict(int)
+        for comp in competences_metier:
+            for profil_id in self.index_competences.get(comp, ()):
+                communs_competences[profil_id] += 1
+        communs_logiciels = defaultdict(int)
+        for logiciel in logiciels_metier:
+            for profil_id in self.index_logiciels.get(logiciel, ()):
+                communs_logiciels[profil_id] += 1
+        candidats = set(communs_competences) | set(communs_logiciels)
+
+        # Profils sans recouvrement : score constant selon l'éligibilité,
+        # départagés par identifiant (k premiers de chaque groupe)
+        heap = []
+        for eligible in (True, False):
+            score = self._score(metier_info, 0, 0, eligible)
+            niveaux = [n for n in self.par_niveau if (n >= niveau_requis) == eligible]
+            pris = 0
+            for profil_id in heapq.merge(*(self._ids_tries(n) for n in niveaux)):
+                if profil_id in candidats:
+                    continue
+                self._pousser(heap, k, score, profil_id)
+                pris += 1
+                if pris >= k:
+                    break
+
+        # Les candidats d'un même groupe (recouvrements, éligibilité) ne diffèrent
+        # que par le bonus : les groupes sont parcourus par borne décroissante
+        groupes = defaultdict(list)
+        for profil_id in candidats:
+            groupes[(communs_competences.get(profil_id, 0), communs_logiciels.get(profil_id, 0),
+                     self._niveaux[profil_id] >= niveau_requis)].append(profil_id)
+
+        bornes = []
+        for cle in groupes:
+            communs_c, communs_l, eligible = cle
+            borne = self._score(metier_info, communs_c, communs_l, eligible, cles_metier)
+            bornes.append((borne, cle))
+        bornes.sort(reverse=True)
+
+        for borne, (communs_c, communs_l, eligible) in bornes:
+            if len(heap) >= k and borne < heap[0].score:
+                break
+            for profil_id in groupes[(communs_c, communs_l, eligible)]:
+                if cles_metier:
+                    competences_user = set(self.profils[profil_id].get('competences', []))
+                    score = self._score(metier_info, communs_c, communs_l, eligible, competences_user)
+                else:
+                    score = borne
+                self._pousser(heap, k, score, profil_id)
+
+        return [(e.profil_id, e.score) for e in sorted(heap, reverse=True)]
+
+    @staticmethod
+    def _pousser(heap, k, score, profil_id):
+        """Garde les k meilleurs (score, id) ; le moins bon est au sommet du tas"""
+        entree = _Classe(score, profil_id)
+        if len(heap) < k:
+            heapq.heappush(heap, entree)
+        elif heap[0] < entree:
+            heapq.heapreplace(heap, entree)
+
+    def top_profils_exhaustif(self, metier_id, k=10):
+        """Référence : score de tous les profils puis tri complet"""
+        metier = self.matching.catalogue.get_metier(metier_id)
+        scores = [(profil_id, self.matching.calculer_score_metier(u, metier))
+                  for profil_id, u in self.profils.items()]
+        scores.sort(key=lambda x: (-x[1], x[0]))
+        return scores[:k]
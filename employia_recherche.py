@@ -0,0 +1,45 @@
+import re
+import sqlite3
+import threading
+
+_MOT = re.compile(r"\w+", re.UNICODE)
+
+
+class IndexRechercheMetiers:
+    def __init__(self, metiers):
+        """
+        Index plein texte (SQLite FTS5, en mémoire) sur le nom des métiers et
+        de leur secteur. Insensible aux accents et à la casse, recherche par préfixe.
+        """
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._verrou = threading.Lock()
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE recherche_metiers USING fts5(
+                nom, secteur, tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO recherche_metiers (rowid, nom, secteur) VALUES (?, ?, ?)",
+                [(m['id'], m['nom'], m['secteur']) for m in metiers]
+            )
+
+    @staticmethod
+    def _requete(texte):
+        """Transforme un texte libre en requête FTS5 : chaque mot est un préfixe"""
+        mots = _MOT.findall(texte or '')
+        return " ".join(f'"{mot}"*' for mot in mots)
+
+    def rechercher(self, texte, limite=10):
+        """Identifiants des métiers correspondant au texte, les plus pertinents d'abord"""
+        requete = self._requete(texte)
+        if not requete:
+            return []
+        with self._verrou:
+            lignes = self._conn.execute("""
+                SELECT rowid FROM recherche_metiers
+                WHERE recherche_metiers MATCH ?
+                ORDER BY bm25(recherche_metiers, 10.0, 1.0)
+                LIMIT ?
+            """, (requete, limite)).fetchall()
+        return [ligne[0] for ligne in lignes]
@@ -0,0 +1,253 @@
+import argparse
+import bisect
+import json
+import sqlite3
+from collections import defaultdict
+
+from employia_scoring import classer
+
+_DERNIER = (float('inf'), float('inf'))
+
+
+def _cle(score, metier_id):
+    """Clé de classement : la plus petite est la meilleure (score décroissant, puis id)"""
+    return (-score, metier_id)
+
+
+class ReclassementProfils:
+    def __init__(self, stock, k=10, journal=None):
+        """
+        Classements (top-k métiers) des profils d'un StockProfils, tenus à jour
+        au fil des changements du catalogue.
+
+        Après une modification de `metiers` / `metier_competences`, seuls les
+        profils dont le top-k peut changer sont repris : ceux qui partagent une
+        compétence ou un logiciel avec un métier modifié, ceux dont le seuil
+        (k-ième score) est battu par le score sans recouvrement de leur
+        diplôme, et ceux dont le classement contient un métier modifié ou
+        supprimé. Ils ne sont rescorés que sur les métiers modifiés ; un
+        rescoring complet n'a lieu que si un métier de leur top-k perd des
+        points ou disparaît. Chaque métier qui entre dans un top-k produit un
+        événement 'nouveau_match' (renvoyé, et journalisé si `journal` est donné).
+        """
+        self.stock = stock
+        self.k = k
+        self.journal = journal
+        self.classements = {}
+        self.par_metier = defaultdict(set)
+        self._seuils = defaultdict(list)
+        self._seuil_profil = {}
+        self._empreintes = {}
+        self.statistiques = {}
+
+        if stock.db_path is not None:
+            conn = sqlite3.connect(stock.db_path)
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS classements_profils (
+                        profil_id PRIMARY KEY,
+                        classement TEXT NOT NULL
+                    )
+                """)
+                conn.execute("CREATE TABLE IF NOT EXISTS etat_reclassement (cle TEXT PRIMARY KEY, valeur TEXT)")
+                conn.commit()
+                for profil_id, classement in conn.execute("SELECT profil_id, classement FROM classements_profils"):
+                    if profil_id in stock.profils:
+                        self._remplacer(profil_id, [tuple(e) for e in json.loads(classement)])
+                ligne = conn.execute("SELECT valeur FROM etat_reclassement WHERE cle = 'empreintes'").fetchone()
+                if ligne is not None:
+                    self._empreintes = {int(i): e for i, e in json.loads(ligne[0]).items()}
+            finally:
+                conn.close()
+
+    @property
+    def matching(self):
+        return self.stock.matching
+
+    def _remplacer(self, profil_id, classement):
+        """Enregistre le classement [(score, metier_id), ...] d'un profil et met les index à jour"""
+        ancien = self.classements.pop(profil_id, None)
+        if ancien is not None:
+            for _, metier_id in ancien:
+                self.par_metier[metier_id].discard(profil_id)
+            seuil, niveau = self._seuil_profil.pop(profil_id)
+            seuils = self._seuils[niveau]
+            del seuils[bisect.bisect_left(seuils, (seuil, profil_id))]
+        if classement is None:
+            return
+
+        self.classements[profil_id] = classement
+        for _, metier_id in classement:
+            self.par_metier[metier_id].add(profil_id)
+        seuil = _cle(*classement[-1]) if len(classement) >= self.k else _DERNIER
+        niveau = self.stock._niveaux[profil_id]
+        self._seuil_profil[profil_id] = (seuil, niveau)
+        bisect.insort(self._seuils[niveau], (seuil, profil_id))
+
+    def _classement_complet(self, utilisateur):
+        """Top-k d'un profil sur tout le catalogue (moteur vectorisé)"""
+        metiers = self.matching.catalogue.metiers
+        scores = self.matching.moteur.scorer(utilisateur, self.matching.profil_scoring.nom)
+        return [(float(scores[j]), metiers[j]['id']) for j in classer(scores, self.k)]
+
+    def initialiser(self):
+        """Calcule le classement des profils qui n'en ont pas (tous au premier lancement)"""
+        manquants = [profil_id for profil_id in self.stock.profils if profil_id not in self.classements]
+        for profil_id in manquants:
+            self._remplacer(profil_id, self._classement_complet(self.stock.profils[profil_id]))
+        if not self._empreintes:
+            self._empreintes = self._empreintes_catalogue(self.matching.catalogue)
+        self._sauvegarder(manquants)
+        return len(manquants)
+
+    def ajouter(self, profil_id, utilisateur):
+        """Ajoute ou met à jour un profil du stock et calcule son classement"""
+        self.stock.ajouter(profil_id, utilisateur)
+        self._remplacer(profil_id, None)
+        self._remplacer(profil_id, self._classement_complet(utilisateur))
+        self._sauvegarder([profil_id])
+
+    def supprimer(self, profil_id):
+        """Supprime un profil du stock et son classement"""
+        self._remplacer(profil_id, None)
+        self.stock.supprimer(profil_id)
+        self._sauvegarder([profil_id])
+
+    @staticmethod
+    def _empreintes_catalogue(catalogue):
+        return {m['id']: e for m, e in zip(catalogue.metiers, catalogue.empreintes_metiers())}
+
+    def appliquer(self, matching):
+        """
+        Bascule sur une nouvelle version du catalogue (`matching`) et reclasse
+        les profils concernés. Renvoie les événements 'nouveau_match'.
+        """
+        empreintes = self._empreintes_catalogue(matching.catalogue)
+        modifies = [metier_id for metier_id, e in empreintes.items() if self._empreintes.get(metier_id) != e]
+        supprimes = [metier_id for metier_id in self._empreintes if metier_id not in empreintes]
+        self.stock.matching = matching
+        self._empreintes = empreintes
+        self.statistiques = {'metiers_modifies': 0, 'metiers_supprimes': 0, 'profils_concernes': 0,
+                             'profils_reclasses': 0, 'profils_total': len(self.stock), 'nouveaux_matchs': 0}
+        if not modifies and not supprimes:
+            self._sauvegarder([])
+            return []
+
+        # Profils concernés : scores des métiers modifiés, par profil
+        nouveaux_scores = defaultdict(dict)
+        for metier_id in modifies:
+            metier = matching.catalogue.get_metier(metier_id)
+            for profil_id in self._profils_candidats(metier):
+                nouveaux_scores[profil_id][metier_id] = matching.calculer_score_metier(
+                    self.stock.profils[profil_id], metier)
+        a_reprendre = set(nouveaux_scores)
+        for metier_id in modifies + supprimes:
+            a_reprendre |= self.par_metier.get(metier_id, set())
+
+        evenements = []
+        reclasses = []
+        changes = set(modifies) | set(supprimes)
+        for profil_id in a_reprendre:
+            ancien = self.classements.get(profil_id, [])
+            scores = nouveaux_scores.get(profil_id, {})
+            recul = any(metier_id in changes and scores.get(metier_id, -1.0) < score
+                        for score, metier_id in ancien)
+            if recul:
+                # Un métier du top-k a perdu des points : le (k+1)-ième est inconnu
+                classement = self._classement_complet(self.stock.profils[profil_id])
+            else:
+                if not scores:
+                    continue
+                classement = [(s, m) for s, m in ancien if m not in changes]
+                classement += [(s, m) for m, s in scores.items()]
+                classement.sort(key=lambda e: _cle(*e))
+                classement = classement[:self.k]
+            if classement == ancien:
+                continue
+
+            deja = {metier_id for _, metier_id in ancien}
+            for rang, (score, metier_id) in enumerate(classement, 1):
+                if metier_id not in deja:
+                    evenements.append({'profil_id': profil_id, 'metier_id': metier_id,
+                                       'metier': matching.catalogue.get_metier(metier_id)['nom'],
+                                       'score': score, 'rang': rang})
+            self._remplacer(profil_id, classement)
+            reclasses.append(profil_id)
+
+        self._sauvegarder(reclasses)
+        self.statistiques = {'metiers_modifies': len(modifies), 'metiers_supprimes': len(supprimes),
+                             'profils_concernes': len(a_reprendre), 'profils_reclasses': len(reclasses),
+                             'profils_total': len(self.stock), 'nouveaux_matchs': len(evenements)}
+        if self.journal is not None:
+            for evenement in evenements:
+                self.journal.enregistrer('nouveau_match', evenement, session=str(evenement['profil_id']))
+        return evenements
+
+    def _profils_candidats(self, metier):
+        """Profils dont le top-k peut accueillir ce métier (nouvelle version)"""
+        stock = self.stock
+        profil = self.matching.profil_scoring
+        competences_metier = set(metier['hard_skills'] + metier['soft_skills'])
+        logiciels_metier = set(metier['tools'])
+        candidats = set()
+        for comp in competences_metier:
+            candidats |= stock.index_competences.get(comp, set())
+        for logiciel in logiciels_metier:
+            candidats |= stock.index_logiciels.get(logiciel, set())
+
+        # Sans recouvrement, le score ne dépend que de l'éligibilité : seuls les
+        # profils dont le seuil est battu par ce score sont concernés
+        niveau_requis = profil.niveau_requis(metier['diplome_minimum'])
+        metier_info = (competences_metier, len(logiciels_metier), [])
+        for eligible in (True, False):
+            cle = _cle(stock._score(metier_info, 0, 0, eligible), metier['id'])
+            for niveau, seuils in self._seuils.items():
+                if (niveau >= niveau_requis) != eligible:
+                    continue
+                debut = bisect.bisect_right(seuils, cle, key=lambda e: e[0])
+                candidats.update(profil_id for _, profil_id in seuils[debut:])
+        return candidats
+
+    def _sauvegarder(self, profils):
+        """Persiste les classements des profils donnés et les empreintes du catalogue"""
+        if self.stock.db_path is None:
+            return
+        conn = sqlite3.connect(self.stock.db_path)
+        try:
+            with conn:
+                conn.executemany("DELETE FROM classements_profils WHERE profil_id = ?",
+                                 [(p,) for p in profils if p not in self.classements])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO classements_profils (profil_id, classement) VALUES (?, ?)",
+                    [(p, json.dumps(self.classements[p])) for p in profils if p in self.classements]
+                )
+                conn.execute("INSERT OR REPLACE INTO etat_reclassement (cle, valeur) VALUES ('empreintes', ?)",
+                             (json.dumps(self._empreintes),))
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    from employia_historique import JournalUtilisation
+    from employia_matching import EmployiaMatching
+    from employia_profils import StockProfils
+
+    parser = argparse.ArgumentParser(description="Reclassement des profils enregistrés après une modification du catalogue")
+    parser.add_argument("--db", default="employia.db", help="Base du catalogue")
+    parser.add_argument("--profils", default="employia_profils.db", help="Base des profils enregistrés")
+    parser.add_argument("--historique", default="employia_historique.db", help="Journal où écrire les événements")
+    parser.add_argument("-k", type=int, default=10, help="Taille des classements")
+    args = parser.parse_args()
+
+    matching = EmployiaMatching(args.db)
+    journal = JournalUtilisation(args.historique)
+    try:
+        reclassement = ReclassementProfils(StockProfils(matching, args.profils), args.k, journal)
+        # Premier lancement : tout est à calculer ; ensuite seuls les profils
+        # concernés par les métiers modifiés et les nouveaux profils le sont
+        if reclassement._empreintes:
+            reclassement.appliquer(matching)
+        resultat = dict(reclassement.statistiques, profils_initialises=reclassement.initialiser())
+    finally:
+        journal.fermer()
+    print(json.dumps(resultat, indent=2))
@@ -0,0 +1,179 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+REGIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regions.json")
+REGION_DEFAUT = "afrique"
+
+
+def charger_regions(path=REGIONS_PATH):
+    """Régions servies : {code: chemin de la base}, chemins relatifs au fichier de configuration"""
+    if not os.path.exists(path):
+        return {REGION_DEFAUT: "employia.db"}
+    with open(path, encoding="utf-8") as f:
+        regions = json.load(f)
+    dossier = os.path.dirname(os.path.abspath(path))
+    return {code: chemin if os.path.isabs(chemin) else os.path.join(dossier, chemin)
+            for code, chemin in regions.items()}
+
+
+def taille_memoire(objet):
+    """
+    Estimation (octets) de la mémoire occupée par un objet et tout ce qu'il
+    référence ; les objets partagés ne sont comptés qu'une fois
+    """
+    vus = set()
+    pile = [objet]
+    total = 0
+    while pile:
+        courant = pile.pop()
+        if id(courant) in vus or isinstance(courant, type):
+            continue
+        vus.add(id(courant))
+        if isinstance(courant, np.ndarray):
+            total += sys.getsizeof(courant) + (courant.nbytes if courant.base is not None else 0)
+            continue
+        total += sys.getsizeof(courant)
+        if isinstance(courant, dict):
+            pile.extend(courant.keys())
+            pile.extend(courant.values())
+        elif isinstance(courant, (list, tuple, set, frozenset)):
+            pile.extend(courant)
+        elif hasattr(courant, '__dict__'):
+            pile.append(vars(courant))
+    return total
+
+
+def preparer_matching(matching):
+    """
+    Construit d'avance ce qu'un matching crée sinon à la première utilisation
+    (moteur compilé, similarités des métiers, normaliseur, automate
+    d'extraction, index de recherche) : la mémoire mesurée au chargement est
+    celle d'une région en service
+    """
+    moteur = matching.moteur
+    moteur.compiler(matching.profil_scoring.nom)
+    moteur.similarites()
+    catalogue = matching.catalogue
+    catalogue.normaliseur
+    catalogue.extracteur
+    catalogue.recherche
+    return matching
+
+
+def _fabrique_defaut(region, db_path):
+    """Matching d'une région, structures paresseuses construites"""
+    from employia_matching import EmployiaMatching
+    return preparer_matching(EmployiaMatching(db_path))
+
+
+class PoolCatalogues:
+    def __init__(self, regions=None, memoire_max=512 * 2 ** 20, fabrique=None, intervalle_mesure=60.0):
+        """
+        Catalogues régionaux chargés à la première demande.
+
+        Les régions chargées restent dans un pool borné : dès que la mémoire
+        estimée dépasse `memoire_max` octets, les moins récemment utilisées sont
+        libérées (la dernière demandée est toujours gardée).
+        `fabrique(region, db_path)` construit l'objet servi pour une région,
+        par défaut un EmployiaMatching (voir `preparer_matching`). Ce qu'un
+        objet construit après son chargement est pris en compte en le
+        remesurant : `obtenir` le fait au plus toutes les `intervalle_mesure`
+        secondes, `remesurer` immédiatement.
+        """
+        self.regions = dict(regions if regions is not None else charger_regions())
+        self.memoire_max = memoire_max
+        self.fabrique = fabrique or _fabrique_defaut
+        self.intervalle_mesure = intervalle_mesure
+        self.chargements = 0
+        self.evictions = 0
+        self.succes = 0
+        self._charges = OrderedDict()
+        self._mesures = {}
+        self._verrou = threading.Lock()
+        self._verrous_chargement = {region: threading.Lock() for region in self.regions}
+
+    def obtenir(self, region=REGION_DEFAUT):
+        """Objet servi pour une région, chargé si besoin"""
+        if region not in self.regions:
+            raise KeyError(f"Région inconnue : {region}")
+        with self._verrou:
+            objet = None
+            if region in self._charges:
+                self._charges.move_to_end(region)
+                self.succes += 1
+                objet = self._charges[region][0]
+                a_remesurer = time.monotonic() - self._mesures[region] >= self.intervalle_mesure
+                if a_remesurer:
+                    # Réservé par ce fil : les requêtes concurrentes ne remesurent pas
+                    self._mesures[region] = time.monotonic()
+        if objet is not None:
+            if a_remesurer:
+                self.remesurer(region)
+            return objet
+
+        # Un seul chargement par région, sans bloquer les autres régions
+        with self._verrous_chargement[region]:
+            with self._verrou:
+                if region in self._charges:
+                    self._charges.move_to_end(region)
+                    self.succes += 1
+                    return self._charges[region][0]
+            objet = self.fabrique(region, self.regions[region])
+            taille = taille_memoire(objet)
+            with self._verrou:
+                self._charges[region] = (objet, taille)
+                self._mesures[region] = time.monotonic()
+                self.chargements += 1
+                self._evincer()
+        return objet
+
+    def _evincer(self):
+        """Libère les régions les moins récemment utilisées au-delà du budget mémoire"""
+        while len(self._charges) > 1 and self.memoire_utilisee() > self.memoire_max:
+            region, _ = self._charges.popitem(last=False)
+            self._mesures.pop(region, None)
+            self.evictions += 1
+
+    def remesurer(self, region=None):
+        """
+        Remesure les régions chargées (toutes, ou `region`), par exemple après
+        la construction d'une structure paresseuse, puis libère les moins
+        récemment utilisées si le budget est dépassé
+        """
+        with self._verrou:
+            objets = {r: objet for r, (objet, _) in self._charges.items() if region is None or r == region}
+        tailles = {r: taille_memoire(objet) for r, objet in objets.items()}
+        with self._verrou:
+            for r, taille in tailles.items():
+                if r in self._charges and self._charges[r][0] is objets[r]:
+                    self._charges[r] = (objets[r], taille)
+                    self._mesures[r] = time.monotonic()
+            self._evincer()
+
+    def liberer(self, region):
+        """Retire une région du pool (elle sera rechargée à la prochaine demande)"""
+        with self._verrou:
+            self._mesures.pop(region, None)
+            return self._charges.pop(region, None) is not None
+
+    def memoire_utilisee(self):
+        """Mémoire estimée des régions chargées, en octets"""
+        return sum(taille for _, taille in self._charges.values())
+
+    def statistiques(self):
+        """Régions chargées (de la moins à la plus récemment utilisée), mémoire et compteurs"""
+        with self._verrou:
+            return {
+                'regions_chargees': {region: taille for region, (_, taille) in self._charges.items()},
+                'memoire': self.memoire_utilisee(),
+                'memoire_max': self.memoire_max,
+                'chargements': self.chargements,
+                'evictions': self.evictions,
+                'succes': self.succes
+            }
@@ -0,0 +1,658 @@
+import json
+import os
+import time
+
+import numpy as np
+
+PROFILS_SCORING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profils_scoring.json")
+PROFIL_DEFAUT = "standard"
+# Types des éléments d'un métier
+TYPE_HARD, TYPE_SOFT, TYPE_OUTIL = 0, 1, 2
+# Au-delà, la similarité entre métiers est calculée à la demande sur le vivier de candidats
+# (la matrice complète, en float32, occupe 16 Mo à 2000 métiers et compte dans la
+# mémoire de la région)
+SIMILARITES_MAX_METIERS = 2000
+# Compétences traitées par bloc dans `calculer_similarites`
+SIMILARITES_BLOC_VOCAB = 2048
+# Nombre de cases (utilisateurs x métiers) calculées par bloc dans `scorer_lot` ;
+# de petits blocs gardent les tableaux intermédiaires en cache
+TAILLE_BLOC_LOT = 2 ** 16
+
+
+class ProfilScoring:
+    def __init__(self, nom, poids_competences, poids_diplome, poids_logiciels,
+                 score_competences_vide, score_logiciels_vide, bonus_competence_cle,
+                 competences_cles, niveaux_diplome, niveau_diplome_inconnu):
+        """Paramètres nommés de la formule de score"""
+        self.nom = nom
+        self.poids_competences = poids_competences
+        self.poids_diplome = poids_diplome
+        self.poids_logiciels = poids_logiciels
+        self.score_competences_vide = score_competences_vide
+        self.score_logiciels_vide = score_logiciels_vide
+        self.bonus_competence_cle = bonus_competence_cle
+        self.competences_cles = list(competences_cles)
+        self.niveaux_diplome = dict(niveaux_diplome)
+        self.niveau_diplome_inconnu = niveau_diplome_inconnu
+        self._niveaux_acceptes = {}
+
+    def niveau(self, diplome):
+        """Rang d'un diplôme (ex. 'Licence' -> 4)"""
+        return self.niveaux_diplome.get(diplome, self.niveau_diplome_inconnu)
+
+    def niveaux_acceptes(self, diplome_requis):
+        """Rangs des voies acceptées par un libellé (ex. 'BTS / Licence' -> {3, 4}), analysé une fois"""
+        if diplome_requis not in self._niveaux_acceptes:
+            voies = [v.strip() for v in (diplome_requis or '').split('/')]
+            self._niveaux_acceptes[diplome_requis] = frozenset(self.niveau(v) for v in voies)
+        return self._niveaux_acceptes[diplome_requis]
+
+    def niveau_requis(self, diplome_requis):
+        """Rang minimum exigé par un libellé de diplôme (ex. 'BTS / Licence' -> 3)"""
+        return min(self.niveaux_acceptes(diplome_requis))
+
+
+def charger_profils_scoring(path=PROFILS_SCORING_PATH):
+    """
+    Charge les profils de scoring d'un fichier JSON.
+    Les champs absents d'un profil reprennent ceux du profil 'standard'.
+    """
+    with open(path, encoding="utf-8") as f:
+        donnees = json.load(f)
+
+    base = donnees[PROFIL_DEFAUT]
+    return {nom: ProfilScoring(nom, **{**base, **params}) for nom, params in donnees.items()}
+
+
+def arrondir(scores):
+    """
+    Arrondit à 2 décimales exactement comme `round(x, 2)`.
+    np.round ne diffère qu'au voisinage d'une demi-unité : ces valeurs sont
+    recalculées avec `round`.
+    """
+    arrondis = np.round(scores, 2)
+    centiemes = scores * 100
+    douteux = np.nonzero(np.abs(centiemes - np.floor(centiemes) - 0.5) < 1e-6)[0]
+    if len(douteux):
+        arrondis[douteux] = [round(x, 2) for x in scores[douteux].tolist()]
+    return arrondis
+
+
+def detail_metier(details, i):
+    """Composantes du score d'un métier (position `i` des tableaux de détail)"""
+    return {
+        'competences': round(float(details['competences'][i]), 2),
+        'bonus': round(float(details['bonus'][i]), 2),
+        'diplome': round(float(details['diplome'][i]), 2),
+        'logiciels': round(float(details['logiciels'][i]), 2),
+        'nb_competences_communes': int(details['nb_competences_communes'][i]),
+        'nb_competences': int(details['nb_competences'][i]),
+        'nb_logiciels_communs': int(details['nb_logiciels_communs'][i]),
+        'nb_logiciels': int(details['nb_logiciels'][i])
+    }
+
+
+def classer(scores, top_n=None):
+    """Indices par score décroissant, les ex aequo dans l'ordre du catalogue"""
+    n = len(scores)
+    if top_n is None or top_n >= n:
+        return np.argsort(-scores, kind='stable')
+    if top_n <= 0:
+        return np.empty(0, dtype=np.intp)
+    seuil = np.partition(scores, n - top_n)[n - top_n]
+    candidats = np.nonzero(scores >= seuil)[0]
+    return candidats[np.argsort(-scores[candidats], kind='stable')][:top_n]
+
+
+class ProfilCompile:
+    def __init__(self, profil, moteur):
+        """Tableaux par métier dérivés d'un profil de scoring, calculés une fois"""
+        self.profil = profil
+        nb_competences = moteur.nb_competences
+        nb_logiciels = moteur.nb_logiciels
+
+        self.avec_competences = nb_competences > 0
+        self.avec_logiciels = nb_logiciels > 0
+        self.score_competences_vide = np.full(len(nb_competences), float(profil.score_competences_vide))
+        self.score_logiciels_vide = np.full(len(nb_logiciels), float(profil.score_logiciels_vide))
+
+        # Bonus : (indice dans le vocabulaire, métiers concernés), dans l'ordre du profil
+        self.bonus = [
+            (moteur.vocab_competences[comp], moteur.postings_competences[moteur.vocab_competences[comp]])
+            for comp in profil.competences_cles if comp in moteur.vocab_competences
+        ]
+
+        self.niveaux_acceptes = [profil.niveaux_acceptes(m['diplome_minimum'])
+                                 for m in moteur.catalogue.metiers]
+        self.niveau_requis = np.array([min(n) for n in self.niveaux_acceptes], dtype=np.int64)
+
+        # Index des métiers triés par niveau requis, pour le filtre d'éligibilité
+        self.ordre_niveau = np.argsort(self.niveau_requis, kind='stable')
+        self.niveaux_tries = self.niveau_requis[self.ordre_niveau]
+        # Score maximal d'un métier sans compétence ni logiciel commun avec l'utilisateur
+        sans_recouvrement = (np.where(self.avec_competences, 0.0, self.score_competences_vide)
+                             + np.where(self.avec_logiciels, 0.0, self.score_logiciels_vide))
+        self.borne_sans_recouvrement = round(float(sans_recouvrement.max(initial=0.0)) + profil.poids_diplome, 2)
+        # Apports de chaque élément de métier (voir MoteurScoring.ecarts), calculés à la demande
+        self.apports_elements = None
+        self.gains_logiciels_elements = None
+
+    def metiers_eligibles(self, niveau_user):
+        """Indices (ordre du catalogue) des métiers dont le diplôme requis est atteint"""
+        fin = np.searchsorted(self.niveaux_tries, niveau_user, side='right')
+        return np.sort(self.ordre_niveau[:fin])
+
+
+class MoteurScoring:
+    def __init__(self, catalogue, profils=None):
+        """
+        Moteur de score vectorisé sur tout le catalogue.
+
+        Les compétences (hard + soft) et les logiciels de chaque métier sont
+        indexés par nom ; pour un utilisateur, seules les listes de métiers
+        de ses propres compétences sont parcourues.
+        """
+        self.catalogue = catalogue
+        self.profils = profils if profils is not None else charger_profils_scoring()
+        self._compiles = {}
+
+        self.vocab_competences = {}
+        self.vocab_logiciels = {}
+        postings_competences = []
+        postings_logiciels = []
+        nb_competences = []
+        nb_logiciels = []
+
+        for j, metier in enumerate(catalogue.metiers):
+            competences = set(metier['hard_skills'] + metier['soft_skills'])
+            logiciels = set(metier['tools'])
+            nb_competences.append(len(competences))
+            nb_logiciels.append(len(logiciels))
+            for vocab, postings, noms in ((self.vocab_competences, postings_competences, competences),
+                                          (self.vocab_logiciels, postings_logiciels, logiciels)):
+                for nom in noms:
+                    k = vocab.setdefault(nom, len(vocab))
+                    if k == len(postings):
+                        postings.append([])
+                    postings[k].append(j)
+
+        self.postings_competences = [np.array(p, dtype=np.intp) for p in postings_competences]
+        self.postings_logiciels = [np.array(p, dtype=np.intp) for p in postings_logiciels]
+        self.nb_competences = np.array(nb_competences, dtype=np.float64)
+        self.nb_logiciels = np.array(nb_logiciels, dtype=np.float64)
+        self._nb_competences_sur = np.maximum(self.nb_competences, 1)
+        self._nb_logiciels_sur = np.maximum(self.nb_logiciels, 1)
+        self._caracteristiques = None
+        self._similarites = {}
+        self._plages_metiers = None
+        self._ordre_demande = None
+        self._cles_departage = None
+        self._postings_plats_cache = {}
+        # Coût de scoring par métier (secondes), mesuré par `classer_progressif`
+        self._cout_metier = None
+
+    def __len__(self):
+        return len(self.catalogue.metiers)
+
+    def compiler(self, nom=PROFIL_DEFAUT):
+        """Renvoie le profil compilé (mis en cache à la première demande)"""
+        if nom not in self._compiles:
+            self._compiles[nom] = ProfilCompile(self.profils[nom], self)
+        return self._compiles[nom]
+
+    def indices_utilisateur(self, utilisateur):
+        """Indices des compétences et logiciels de l'utilisateur connus du catalogue"""
+        competences = {self.vocab_competences[c] for c in utilisateur.get('competences', [])
+                       if c in self.vocab_competences}
+        logiciels = {self.vocab_logiciels[l] for l in utilisateur.get('logiciels', [])
+                     if l in self.vocab_logiciels}
+        return competences, logiciels
+
+    def _communs(self, indices, postings):
+        """Nombre d'éléments communs avec l'utilisateur, pour chaque métier"""
+        if not indices:
+            return np.zeros(len(self))
+        return np.bincount(np.concatenate([postings[k] for k in indices]),
+                           minlength=len(self)).astype(np.float64)
+
+    def metiers_eligibles(self, utilisateur, profil=PROFIL_DEFAUT):
+        """Indices des métiers accessibles avec le diplôme de l'utilisateur"""
+        compile = self.compiler(profil)
+        return compile.metiers_eligibles(compile.profil.niveau(utilisateur.get('diplome', '')))
+
+    def _scorer_compile(self, compile, utilisateur, competences, communs_competences,
+                        communs_logiciels, candidats=None, detail=False):
+        """
+        Applique la formule d'un profil compilé à des comptes déjà calculés.
+        Avec `detail`, renvoie aussi les composantes (tableaux alignés sur les scores).
+        """
+        profil = compile.profil
+        if candidats is None:
+            selection = slice(None)
+            position = None
+        else:
+            selection = candidats
+            position = np.full(len(self), -1, dtype=np.intp)
+            position[candidats] = np.arange(len(candidats))
+
+        # Score Compétences
+        score_competences = np.where(
+            compile.avec_competences[selection],
+            (communs_competences[selection] / self._nb_competences_sur[selection]) * profil.poids_competences,
+            compile.score_competences_vide[selection]
+        )
+        score_competences_base = score_competences.copy() if detail else None
+        for k, metiers in compile.bonus:
+            if k in competences:
+                if position is not None:
+                    metiers = position[metiers]
+                    metiers = metiers[metiers >= 0]
+                score_competences[metiers] += profil.bonus_competence_cle
+        score_competences = np.minimum(score_competences, profil.poids_competences)
+
+        # Score Diplôme
+        niveau_user = profil.niveau(utilisateur.get('diplome', ''))
+        score_diplome = (niveau_user >= compile.niveau_requis[selection]) * float(profil.poids_diplome)
+
+        # Score Logiciels
+        score_logiciels = np.where(
+            compile.avec_logiciels[selection],
+            (communs_logiciels[selection] / self._nb_logiciels_sur[selection]) * profil.poids_logiciels,
+            compile.score_logiciels_vide[selection]
+        )
+
+        total = arrondir(score_competences + score_diplome + score_logiciels)
+        if not detail:
+            return total
+        return total, {
+            'competences': score_competences_base,
+            'bonus': score_competences - score_competences_base,
+            'diplome': score_diplome,
+            'logiciels': score_logiciels,
+            'nb_competences_communes': communs_competences[selection],
+            'nb_competences': self.nb_competences[selection],
+            'nb_logiciels_communs': communs_logiciels[selection],
+            'nb_logiciels': self.nb_logiciels[selection]
+        }
+
+    def scorer(self, utilisateur, profil=PROFIL_DEFAUT, candidats=None, detail=False):
+        """
+        Scores des métiers du catalogue, dans l'ordre du catalogue.
+        Si `candidats` (indices) est donné, seuls ces métiers sont scorés.
+        Avec `detail`, renvoie (scores, composantes) : compétences, bonus des
+        compétences clés (après plafond), diplôme, logiciels et nombres d'éléments communs.
+        """
+        if detail:
+            scores, details = self.scorer_profils(utilisateur, [profil], candidats, detail=True)
+            return scores[0], details[0]
+        return self.scorer_profils(utilisateur, [profil], candidats)[0]
+
+    def scorer_profils(self, utilisateur, profils=None, candidats=None, detail=False):
+        """
+        Scores pour plusieurs profils en une passe : tableau (profils x métiers),
+        et avec `detail` la liste des composantes de chaque profil
+        """
+        if profils is None:
+            profils = list(self.profils)
+        competences, logiciels = self.indices_utilisateur(utilisateur)
+        communs_competences = self._communs(competences, self.postings_competences)
+        communs_logiciels = self._communs(logiciels, self.postings_logiciels)
+
+        resultats = [
+            self._scorer_compile(self.compiler(nom), utilisateur, competences,
+                                 communs_competences, communs_logiciels, candidats, detail)
+            for nom in profils
+        ]
+        if detail:
+            return np.vstack([r[0] for r in resultats]), [r[1] for r in resultats]
+        return np.vstack(resultats)
+
+    def _postings_plats(self, postings):
+        """Listes de métiers mises bout à bout et leurs débuts, calculées une fois"""
+        cle = id(postings)
+        if cle not in self._postings_plats_cache:
+            debut = np.zeros(len(postings) + 1, dtype=np.intp)
+            np.cumsum([len(p) for p in postings], out=debut[1:])
+            plat = np.concatenate(postings) if postings else np.empty(0, dtype=np.intp)
+            self._postings_plats_cache[cle] = (plat, debut)
+        return self._postings_plats_cache[cle]
+
+    def _communs_lot(self, liste_indices, postings):
+        """Nombre d'éléments communs, pour chaque utilisateur d'un bloc et chaque métier"""
+        n = len(self)
+        elements = [k for indices in liste_indices for k in indices]
+        if not elements:
+            return np.zeros((len(liste_indices), n))
+        proprietaires = np.repeat(np.arange(len(liste_indices)) * n, [len(indices) for indices in liste_indices])
+        plat, debut = self._postings_plats(postings)
+        elements = np.array(elements, dtype=np.intp)
+        longueurs = debut[elements + 1] - debut[elements]
+        premiers = np.cumsum(longueurs) - longueurs
+        positions = np.arange(longueurs.sum()) - np.repeat(premiers - debut[elements], longueurs)
+        cases = plat[positions] + np.repeat(proprietaires, longueurs)
+        return np.bincount(cases, minlength=len(liste_indices) * n).reshape(-1, n).astype(np.float64)
+
+    def scorer_lot(self, utilisateurs, profil=PROFIL_DEFAUT, dtype=np.float64):
+        """
+        Scores de plusieurs utilisateurs : matrice (utilisateurs x métiers), chaque
+        ligne identique à `scorer`. Calculée par blocs d'utilisateurs d'au plus
+        TAILLE_BLOC_LOT cases, sans boucle sur les métiers.
+        """
+        compile = self.compiler(profil)
+        parametres = compile.profil
+        n = len(self)
+        resultat = np.empty((len(utilisateurs), n), dtype=dtype)
+        taille_bloc = max(1, TAILLE_BLOC_LOT // max(n, 1))
+        for debut in range(0, len(utilisateurs), taille_bloc):
+            bloc = utilisateurs[debut:debut + taille_bloc]
+            indices = [self.indices_utilisateur(u) for u in bloc]
+            communs_competences = self._communs_lot([c for c, _ in indices], self.postings_competences)
+            communs_logiciels = self._communs_lot([l for _, l in indices], self.postings_logiciels)
+
+            score_competences = np.where(
+                compile.avec_competences,
+                (communs_competences / self._nb_competences_sur) * parametres.poids_competences,
+                compile.score_competences_vide
+            )
+            for k, metiers in compile.bonus:
+                lignes = [i for i, (competences, _) in enumerate(indices) if k in competences]
+                if lignes:
+                    score_competences[np.ix_(lignes, metiers)] += parametres.bonus_competence_cle
+            score_competences = np.minimum(score_competences, parametres.poids_competences)
+
+            niveaux = np.array([parametres.niveau(u.get('diplome', '')) for u in bloc], dtype=np.int64)
+            score_diplome = (niveaux[:, None] >= compile.niveau_requis) * float(parametres.poids_diplome)
+
+            score_logiciels = np.where(
+                compile.avec_logiciels,
+                (communs_logiciels / self._nb_logiciels_sur) * parametres.poids_logiciels,
+                compile.score_logiciels_vide
+            )
+
+            total = score_competences + score_diplome + score_logiciels
+            resultat[debut:debut + len(bloc)] = arrondir(total.ravel()).reshape(total.shape)
+        return resultat
+
+    def cles_departage(self):
+        """Demande et identifiant de chaque métier (ordre du catalogue), calculés une fois"""
+        if self._cles_departage is None:
+            metiers = self.catalogue.metiers
+            self._cles_departage = (np.array([m['demande_afrique'] or 0 for m in metiers], dtype=np.float64),
+                                    np.array([m['id'] for m in metiers], dtype=np.int64))
+        return self._cles_departage
+
+    def ordre_demande(self):
+        """Indices des métiers par demande décroissante (ordre du catalogue à égalité), calculés une fois"""
+        if self._ordre_demande is None:
+            self._ordre_demande = np.argsort(-self.cles_departage()[0], kind='stable')
+        return self._ordre_demande
+
+    def classer_departage(self, scores, candidats=None):
+        """
+        Positions dans `scores` par score décroissant, puis demande décroissante,
+        puis identifiant croissant : un ordre total, indépendant de l'ordre du catalogue
+        """
+        demande, ids = self.cles_departage()
+        if candidats is not None:
+            demande, ids = demande[candidats], ids[candidats]
+        return np.lexsort((ids, -demande, -scores))
+
+    def classer_progressif(self, utilisateur, top_n, profil=PROFIL_DEFAUT, candidats=None, taille_tranche=256,
+                           echeance=None):
+        """
+        Classement par tranches de taille doublée, pour répondre dans un temps borné.
+        Les métiers partageant une compétence ou un logiciel avec l'utilisateur
+        sont scorés d'abord, puis les autres, chacun par demande décroissante.
+        Après chaque tranche, produit (indices, scores, exact, nb_scores) : les
+        meilleurs métiers trouvés (indices du catalogue, ordre de `classer`).
+        `exact` devient vrai dès qu'aucun métier restant ne peut entrer dans le
+        classement ; le résultat est alors celui de `scorer` puis `classer`.
+        Avec `echeance` (instant de time.perf_counter()), chaque tranche est
+        réduite au temps restant selon le coût par métier mesuré sur les
+        tranches précédentes (la première sert d'étalonnage si aucun coût n'est
+        encore connu) ; une tranche compte toujours au moins `top_n` métiers.
+        """
+        compile = self.compiler(profil)
+        competences, logiciels = self.indices_utilisateur(utilisateur)
+        communs_competences = self._communs(competences, self.postings_competences)
+        communs_logiciels = self._communs(logiciels, self.postings_logiciels)
+
+        ordre = self.ordre_demande()
+        if candidats is not None:
+            retenus = np.zeros(len(self), dtype=bool)
+            retenus[candidats] = True
+            ordre = ordre[retenus[ordre]]
+        recouvrement = (communs_competences[ordre] > 0) | (communs_logiciels[ordre] > 0)
+        nb_recouvrement = int(np.count_nonzero(recouvrement))
+        ordre = np.concatenate([ordre[recouvrement], ordre[~recouvrement]])
+
+        top_n = min(top_n, len(ordre))
+        indices = np.empty(0, dtype=np.intp)
+        scores = np.empty(0)
+        debut = 0
+        taille = taille_tranche
+        while True:
+            # Une tranche ne mélange pas les deux groupes : la borne est testée entre les deux
+            fin = debut + self._taille_tranche(taille, top_n, echeance)
+            if debut < nb_recouvrement:
+                fin = min(fin, nb_recouvrement)
+            tranche = ordre[debut:fin]
+            debut += len(tranche)
+            if len(tranche):
+                chrono = time.perf_counter()
+                scores_tranche = self._scorer_compile(compile, utilisateur, competences, communs_competences,
+                                                      communs_logiciels, tranche)
+                self._cout_metier = (time.perf_counter() - chrono) / len(tranche)
+                indices = np.concatenate([indices, tranche])
+                scores = np.concatenate([scores, scores_tranche])
+                garde = np.lexsort((indices, -scores))[:top_n]
+                indices, scores = indices[garde], scores[garde]
+
+            exact = debut >= len(ordre) or (
+                debut >= nb_recouvrement and len(indices) == top_n
+                and (top_n == 0 or scores[-1] > compile.borne_sans_recouvrement)
+            )
+            yield indices, scores, exact, debut
+            if exact:
+                return
+            taille *= 2
+
+    def _taille_tranche(self, taille, top_n, echeance):
+        """Taille de la prochaine tranche, réduite à ce que le temps restant permet de scorer"""
+        if echeance is None:
+            return taille
+        minimum = max(top_n, 1)
+        if self._cout_metier is None:
+            return max(minimum, taille // 8)
+        restant = echeance - time.perf_counter()
+        return max(minimum, min(taille, int(restant / self._cout_metier)))
+
+    def caracteristiques(self):
+        """
+        Secteur et compétences (logiciels compris) de chaque métier, calculés une fois :
+        (secteurs, debut, elements, types, taille_vocab). Les éléments du métier j sont
+        elements[debut[j]:debut[j + 1]], dans l'ordre du catalogue, sans doublon ;
+        types vaut TYPE_HARD, TYPE_SOFT ou TYPE_OUTIL. Les logiciels sont numérotés
+        après les compétences (voir `noms_elements`).
+        """
+        if self._caracteristiques is None:
+            decalage = len(self.vocab_competences)
+            elements, types, longueurs = [], [], []
+            for metier in self.catalogue.metiers:
+                vus = {}
+                for noms, vocab, base, type_element in ((metier['hard_skills'], self.vocab_competences, 0, TYPE_HARD),
+                                                        (metier['soft_skills'], self.vocab_competences, 0, TYPE_SOFT),
+                                                        (metier['tools'], self.vocab_logiciels, decalage, TYPE_OUTIL)):
+                    for nom in noms:
+                        vus.setdefault(base + vocab[nom], type_element)
+                elements.extend(vus)
+                types.extend(vus.values())
+                longueurs.append(len(vus))
+            debut = np.zeros(len(self) + 1, dtype=np.intp)
+            np.cumsum(longueurs, out=debut[1:])
+            secteurs = np.array([m['secteur_id'] for m in self.catalogue.metiers], dtype=np.int64)
+            self._caracteristiques = (secteurs, debut, np.array(elements, dtype=np.intp),
+                                      np.array(types, dtype=np.int8), decalage + len(self.vocab_logiciels))
+            self.noms_elements = list(self.vocab_competences) + list(self.vocab_logiciels)
+        return self._caracteristiques
+
+    def _compiler_apports(self, compile):
+        """
+        Pour chaque élément de métier, points de compétences qu'il apporte (proportion
+        et bonus de compétence clé) et points de logiciels, selon un profil compilé
+        """
+        parametres = compile.profil
+        _, debut, elements, types, taille_vocab = self.caracteristiques()
+        metier_element = np.repeat(np.arange(len(self)), np.diff(debut))
+        outil = types == TYPE_OUTIL
+        cles = np.zeros(taille_vocab)
+        cles[[k for k, _ in compile.bonus]] = parametres.bonus_competence_cle
+        compile.apports_elements = np.where(
+            outil, 0.0, parametres.poids_competences / self._nb_competences_sur[metier_element] + cles[elements])
+        compile.gains_logiciels_elements = np.where(
+            outil, parametres.poids_logiciels / self._nb_logiciels_sur[metier_element], 0.0)
+
+    def _plages(self, debut, metiers):
+        """Positions, dans `elements`, des éléments de plusieurs métiers mis bout à bout, et leurs longueurs"""
+        if len(metiers) <= 64:
+            # Peu de métiers : concaténer les plages précalculées est plus rapide
+            if self._plages_metiers is None:
+                self._plages_metiers = [np.arange(debut[j], debut[j + 1]) for j in range(len(self))]
+            plages = self._plages_metiers
+            return (np.concatenate([plages[j] for j in metiers.tolist()]) if len(metiers)
+                    else np.empty(0, dtype=np.intp)), debut[metiers + 1] - debut[metiers]
+        longueurs = debut[metiers + 1] - debut[metiers]
+        premiers = np.cumsum(longueurs) - longueurs
+        return np.arange(longueurs.sum()) - np.repeat(premiers - debut[metiers], longueurs), longueurs
+
+    def ecarts(self, utilisateur, metiers, profil=PROFIL_DEFAUT):
+        """
+        Compétences et logiciels manquants de plusieurs métiers (indices du catalogue),
+        en une passe. Renvoie (debut, elements, types, gains, partages) : les manques du
+        i-ème métier sont aux positions debut[i]:debut[i + 1], triés par gain de score
+        décroissant, puis par nombre de ces métiers qui les demandent aussi, puis dans
+        l'ordre du catalogue.
+        """
+        compile = self.compiler(profil)
+        parametres = compile.profil
+        _, debut, elements, types, taille_vocab = self.caracteristiques()
+        metiers = np.asarray(metiers, dtype=np.intp)
+        if compile.apports_elements is None:
+            self._compiler_apports(compile)
+
+        competences, logiciels = self.indices_utilisateur(utilisateur)
+        possedes = np.zeros(taille_vocab, dtype=bool)
+        possedes[list(competences)] = True
+        possedes[[len(self.vocab_competences) + l for l in logiciels]] = True
+
+        positions, longueurs = self._plages(debut, metiers)
+        tous = elements[positions]
+        rangs = np.repeat(np.arange(len(metiers)), longueurs)
+        acquis = possedes[tous]
+
+        # Score de compétences actuel de chaque métier (somme des apports acquis, plafonnée)
+        apports = compile.apports_elements[positions]
+        somme = np.bincount(rangs, weights=apports * acquis, minlength=len(metiers))
+        actuel = np.minimum(somme, parametres.poids_competences)
+
+        # Gain d'un élément manquant : écart de score de compétences (nul pour un
+        # logiciel) plus sa part du score de logiciels (nulle pour une compétence)
+        manquants = np.flatnonzero(~acquis)
+        rangs_manquants = rangs[manquants]
+        gains = (np.minimum(somme[rangs_manquants] + apports[manquants], parametres.poids_competences)
+                 - actuel[rangs_manquants] + compile.gains_logiciels_elements[positions[manquants]])
+        centiemes = np.rint(gains * 100).astype(np.int64)
+        elements_manquants = tous[manquants]
+        partages = np.bincount(elements_manquants, minlength=taille_vocab)[elements_manquants]
+
+        # Tri stable sur une clé composite : métier, gain décroissant, partage décroissant
+        ordre = np.argsort((rangs_manquants << 40) - (centiemes << 20) - partages, kind='stable')
+        debut_ecarts = np.searchsorted(rangs_manquants, np.arange(len(metiers) + 1))
+        return (debut_ecarts, elements_manquants[ordre], types[positions[manquants[ordre]]],
+                centiemes[ordre] / 100, partages[ordre])
+
+    def similarites(self, poids_secteur=0.5):
+        """
+        Matrice de similarité de tous les métiers, précalculée une fois, ou None
+        si le catalogue dépasse SIMILARITES_MAX_METIERS
+        """
+        if len(self) > SIMILARITES_MAX_METIERS:
+            return None
+        if poids_secteur not in self._similarites:
+            self._similarites[poids_secteur] = self.calculer_similarites(np.arange(len(self)), poids_secteur)
+        return self._similarites[poids_secteur]
+
+    def calculer_similarites(self, metiers, poids_secteur=0.5):
+        """
+        Similarité deux à deux de métiers (indices du catalogue) : même secteur
+        pondéré par `poids_secteur`, Jaccard des compétences pour le reste.
+        La matrice métiers x compétences n'est construite que par blocs de
+        SIMILARITES_BLOC_VOCAB compétences, limitées à celles de ces métiers ;
+        seul le résultat est alloué en entier.
+        """
+        secteurs, debut, elements, _, _ = self.caracteristiques()
+        positions, longueurs = self._plages(debut, metiers)
+        lignes = np.repeat(np.arange(len(metiers)), longueurs)
+        _, colonnes = np.unique(elements[positions], return_inverse=True)
+
+        # Comptes entiers en float32 : la somme des blocs est exacte
+        communes = np.zeros((len(metiers), len(metiers)), dtype=np.float32)
+        for premier in range(0, int(colonnes.max(initial=-1)) + 1, SIMILARITES_BLOC_VOCAB):
+            dans_bloc = (colonnes >= premier) & (colonnes < premier + SIMILARITES_BLOC_VOCAB)
+            bloc = np.zeros((len(metiers), SIMILARITES_BLOC_VOCAB), dtype=np.float32)
+            bloc[lignes[dans_bloc], colonnes[dans_bloc] - premier] = 1
+            communes += bloc @ bloc.T
+
+        # Combinaison par blocs de lignes, écrite directement dans le résultat float32
+        secteurs = secteurs[metiers]
+        similarites = np.empty_like(communes)
+        pas = max(1, TAILLE_BLOC_LOT // max(len(metiers), 1))
+        for i in range(0, len(metiers), pas):
+            lignes_bloc = slice(i, i + pas)
+            union = longueurs[lignes_bloc, None] + longueurs[None, :] - communes[lignes_bloc]
+            jaccard = communes[lignes_bloc] / np.maximum(union, 1)
+            meme_secteur = secteurs[lignes_bloc, None] == secteurs[None, :]
+            similarites[lignes_bloc] = poids_secteur * meme_secteur + (1 - poids_secteur) * jaccard
+        return similarites
+
+    def classer_diversifie(self, scores, top_n, diversite=0.3, max_par_secteur=None,
+                           candidats=None, poids_secteur=0.5):
+        """
+        Classement par pertinence marginale maximale (MMR) : chaque choix maximise
+        (1 - diversite) * score / 100 - diversite * similarité au plus proche métier
+        déjà retenu, avec au plus `max_par_secteur` métiers par secteur.
+        Seul un vivier des meilleurs scores est examiné ; il est agrandi si les
+        plafonds par secteur l'épuisent. Renvoie des positions dans `scores`.
+        """
+        n = len(scores)
+        top_n = min(top_n, n)
+        taille_vivier = max(5 * top_n, 50)
+        secteurs = self.caracteristiques()[0]
+        complete = self.similarites(poids_secteur)
+        while True:
+            vivier = classer(scores, taille_vivier)
+            metiers = vivier if candidats is None else candidats[vivier]
+            similarite = self.calculer_similarites(metiers, poids_secteur) if complete is None else None
+            pertinence = (1 - diversite) * scores[vivier] / 100
+            secteurs_vivier = secteurs[metiers]
+
+            choisis = []
+            proximite = np.zeros(len(vivier))
+            disponibles = np.ones(len(vivier), dtype=bool)
+            par_secteur = {}
+            while len(choisis) < top_n and disponibles.any():
+                valeurs = np.where(disponibles, pertinence - diversite * proximite, -np.inf)
+                k = int(np.argmax(valeurs))
+                choisis.append(k)
+                disponibles[k] = False
+                ligne = similarite[k] if complete is None else complete[metiers[k], metiers]
+                proximite = np.maximum(proximite, ligne)
+                if max_par_secteur is not None:
+                    secteur = secteurs_vivier[k]
+                    par_secteur[secteur] = par_secteur.get(secteur, 0) + 1
+                    if par_secteur[secteur] >= max_par_secteur:
+                        disponibles[secteurs_vivier == secteur] = False
+
+            if len(choisis) == top_n or taille_vivier >= n:
+                return vivier[choisis]
+            taille_vivier *= 4
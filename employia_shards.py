@@ -0,0 +1,166 @@
+import itertools
+import multiprocessing
+import threading
+import time
+from multiprocessing.connection import wait
+
+from employia_matching import repartager
+from employia_scoring import PROFIL_DEFAUT
+
+
+def _boucle_shard(db_path, partition, profil_scoring, connexion):
+    """Processus d'un shard : charge sa part du catalogue puis répond aux requêtes"""
+    from employia_catalogue import Catalogue
+    from employia_matching import EmployiaMatching
+
+    catalogue = Catalogue.depuis_base(db_path, partition=partition)
+    matching = EmployiaMatching(db_path, profil_scoring, catalogue=catalogue)
+    # Le moteur est compilé avant de se déclarer prêt
+    matching.moteur
+    connexion.send(('pret', len(catalogue)))
+
+    while True:
+        try:
+            message = connexion.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        requete_id, utilisateur, top_n, eligibilite_stricte = message
+        try:
+            recommandations = matching.recommander_metiers(utilisateur, top_n, eligibilite_stricte)
+            # Manques envoyés dans l'ordre du catalogue : 'partage' est recompté après la fusion
+            for r in recommandations:
+                matching.ordonner_manquantes(catalogue.get_metier(r['id']), r['competences_manquantes'])
+            connexion.send((requete_id, recommandations))
+        except Exception as e:
+            connexion.send((requete_id, e))
+    matching.fermer_connexion()
+
+
+class CoordinateurShards:
+    def __init__(self, db_path="employia.db", nb_shards=4, par='hash', timeout=0.5, profil_scoring=PROFIL_DEFAUT):
+        """
+        Recommandation répartie : le catalogue est découpé en `nb_shards` parts
+        (par hash de l'id ou par `secteur_id`), chacune servie par un processus.
+        Le coordinateur diffuse le profil, puis fusionne les top-k partiels ;
+        le 'partage' des compétences manquantes est recompté sur le top-k fusionné.
+        Tous les shards scorent avec le même `profil_scoring`.
+        """
+        self.db_path = db_path
+        self.profil_scoring = profil_scoring
+        self.nb_shards = nb_shards
+        self.par = par
+        self.timeout = timeout
+        self._contexte = multiprocessing.get_context('spawn')
+        self._shards = [None] * nb_shards
+        self._requetes = itertools.count()
+        self._verrou = threading.Lock()
+
+    def __enter__(self):
+        self.demarrer()
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+    def _lancer(self, numero):
+        """Démarre le processus d'un shard et renvoie (processus, connexion)"""
+        parent, enfant = self._contexte.Pipe()
+        processus = self._contexte.Process(
+            target=_boucle_shard,
+            args=(self.db_path, (numero, self.nb_shards, self.par), self.profil_scoring, enfant),
+            name=f"employia-shard-{numero}",
+            daemon=True
+        )
+        processus.start()
+        enfant.close()
+        return processus, parent
+
+    def demarrer(self, timeout=60):
+        """Démarre les shards absents ou arrêtés et attend qu'ils soient prêts"""
+        for numero, shard in enumerate(self._shards):
+            if shard is None or not shard[0].is_alive():
+                self._shards[numero] = self._lancer(numero)
+                processus, connexion = self._shards[numero]
+                try:
+                    pret = connexion.poll(timeout) and connexion.recv()[0] == 'pret'
+                except (EOFError, OSError):
+                    # Processus mort pendant son chargement : tube fermé
+                    pret = False
+                if not pret:
+                    raise RuntimeError(f"Le shard {numero} n'a pas démarré")
+
+    def shards_actifs(self):
+        """Numéros des shards dont le processus est vivant"""
+        return [n for n, s in enumerate(self._shards) if s is not None and s[0].is_alive()]
+
+    def recommander_metiers(self, utilisateur, top_n=5, eligibilite_stricte=False, timeout=None):
+        """
+        Diffuse la requête à tous les shards et fusionne les réponses reçues
+        avant l'échéance. Renvoie {'recommandations', 'complet', 'shards_manquants'}.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._verrou:
+            requete_id = next(self._requetes)
+            en_attente = {}
+            manquants = []
+            for numero, shard in enumerate(self._shards):
+                if shard is None or not shard[0].is_alive():
+                    manquants.append(numero)
+                    continue
+                try:
+                    shard[1].send((requete_id, utilisateur, top_n, eligibilite_stricte))
+                    en_attente[shard[1]] = numero
+                except (BrokenPipeError, OSError):
+                    manquants.append(numero)
+
+            resultats = []
+            echeance = time.monotonic() + timeout
+            while en_attente:
+                restant = echeance - time.monotonic()
+                if restant <= 0:
+                    break
+                for connexion in wait(list(en_attente), restant):
+                    numero = en_attente[connexion]
+                    try:
+                        reponse_id, reponse = connexion.recv()
+                    except (EOFError, OSError):
+                        manquants.append(numero)
+                        del en_attente[connexion]
+                        continue
+                    # Réponse tardive d'une requête précédente : on l'ignore
+                    if reponse_id != requete_id:
+                        continue
+                    del en_attente[connexion]
+                    if isinstance(reponse, Exception):
+                        manquants.append(numero)
+                    else:
+                        resultats.extend(reponse)
+            manquants.extend(en_attente.values())
+
+        # Même ordre qu'un classement global : score décroissant, puis ordre du catalogue
+        resultats.sort(key=lambda r: (-r['score'], r['id']))
+        resultats = resultats[:top_n]
+        repartager([r['competences_manquantes'] for r in resultats])
+        return {
+            'recommandations': resultats,
+            'complet': not manquants,
+            'shards_manquants': sorted(manquants)
+        }
+
+    def fermer(self):
+        """Arrête tous les shards"""
+        for numero, shard in enumerate(self._shards):
+            if shard is None:
+                continue
+            processus, connexion = shard
+            try:
+                connexion.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            processus.join(timeout=5)
+            if processus.is_alive():
+                processus.terminate()
+            connexion.close()
+            self._shards[numero] = None